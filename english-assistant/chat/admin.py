@@ -1,8 +1,15 @@
 from django.contrib import admin
+from django.contrib.auth.models import User
+from django.db.models import Q
 from django.urls import reverse
 from django.utils.html import format_html
 
+from grammar.models import Grammar
 from .models import Message
+from .search import search_filter
+
+# Users or grammar topics a search term may expand to before it is ignored
+SEARCH_RELATED_LIMIT = 100
 
 
 @admin.register(Message)
@@ -102,6 +109,36 @@ class MessageAdmin(admin.ModelAdmin):
         ),
     )
 
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Search the fields above with one indexed condition each: full text and
+        trigram search on the message, exact ids, and the ids of matching users
+        and grammar topics looked up first. ORing joined columns instead would
+        scan the whole message table.
+        """
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+
+        users = User.objects.filter(
+            Q(email__icontains=term)
+            | Q(first_name__icontains=term)
+            | Q(last_name__icontains=term)
+        ).values_list("id", flat=True)[:SEARCH_RELATED_LIMIT]
+        grammars = Grammar.objects.filter(title__icontains=term).values_list(
+            "id", flat=True
+        )[:SEARCH_RELATED_LIMIT]
+
+        matches = (
+            search_filter(term, "fts")
+            | search_filter(term, "substring")
+            | Q(response_id=term)
+            | Q(session_id=term)
+            | Q(user_id__in=list(users))
+            | Q(grammar_id__in=list(grammars))
+        )
+        return queryset.filter(matches), False
+
     def user_link(self, obj):
         """Create a link to the user admin page"""
         url = reverse("admin:auth_user_change", args=[obj.user.pk])
@@ -0,0 +1,143 @@
+"""
+Admission control for LLM turns.
+
+Each worker runs at most CHAT_MAX_CONCURRENT_TURNS model streams, and at most
+CHAT_MAX_CONCURRENT_TURNS_PER_USER for one user. Turns over the limits wait in
+a queue that is served round robin across users, so one user with many
+sockets cannot starve the others. Waiting turns are told their position, and
+once CHAT_ADMISSION_MAX_QUEUE turns are waiting new ones are rejected at once
+instead of adding to everyone's latency.
+"""
+
+import asyncio
+import weakref
+from collections import Counter, OrderedDict, deque
+
+from django.conf import settings
+
+
+class AdmissionRejected(Exception):
+    """Raised when a turn cannot be admitted, the client should retry later"""
+
+
+class Waiter:
+    def __init__(self, user_id, on_position=None):
+        self.user_id = user_id
+        self.on_position = on_position
+        self.future = asyncio.get_running_loop().create_future()
+        self.position = None
+
+
+class AdmissionController:
+    def __init__(self, limit=None, per_user_limit=None, max_queue=None):
+        self.limit = limit or settings.CHAT_MAX_CONCURRENT_TURNS
+        self.per_user_limit = (
+            per_user_limit or settings.CHAT_MAX_CONCURRENT_TURNS_PER_USER
+        )
+        if max_queue is None:
+            max_queue = settings.CHAT_ADMISSION_MAX_QUEUE
+        self.max_queue = max_queue
+        self.active = 0
+        self.active_by_user = Counter()
+        # Users with waiting turns in round robin order, each with a FIFO queue
+        self.queues = OrderedDict()
+
+    @property
+    def waiting(self) -> int:
+        return sum(len(queue) for queue in self.queues.values())
+
+    def has_room(self, user_id) -> bool:
+        return (
+            self.active < self.limit
+            and self.active_by_user[user_id] < self.per_user_limit
+        )
+
+    def admit(self, user_id):
+        self.active += 1
+        self.active_by_user[user_id] += 1
+
+    def release(self, user_id):
+        self.active -= 1
+        self.active_by_user[user_id] -= 1
+        if not self.active_by_user[user_id]:
+            del self.active_by_user[user_id]
+        self.dispatch()
+
+    def dispatch(self):
+        """Hand free slots to waiting turns, taking users in turn"""
+        while self.active < self.limit:
+            for user_id, queue in self.queues.items():
+                if self.active_by_user[user_id] < self.per_user_limit:
+                    break
+            else:
+                break
+            waiter = queue.popleft()
+            if queue:
+                self.queues.move_to_end(user_id)
+            else:
+                del self.queues[user_id]
+            self.admit(user_id)
+            waiter.future.set_result(None)
+        self.announce_positions()
+
+    def announce_positions(self):
+        """Send every waiting turn its place in the round robin order"""
+        position = 0
+        rounds = max((len(queue) for queue in self.queues.values()), default=0)
+        for index in range(rounds):
+            for queue in self.queues.values():
+                if index >= len(queue):
+                    continue
+                position += 1
+                waiter = queue[index]
+                if waiter.position != position and waiter.on_position:
+                    asyncio.ensure_future(waiter.on_position(position))
+                waiter.position = position
+
+    def forget(self, waiter: Waiter):
+        queue = self.queues.get(waiter.user_id)
+        if queue is None or waiter not in queue:
+            return
+        queue.remove(waiter)
+        if not queue:
+            del self.queues[waiter.user_id]
+        self.announce_positions()
+
+    async def acquire(self, user_id, on_position=None):
+        """Wait for a slot, or raise AdmissionRejected"""
+        if not self.queues and self.has_room(user_id):
+            self.admit(user_id)
+            return
+        if self.waiting >= self.max_queue:
+            raise AdmissionRejected("Too many turns are waiting")
+
+        waiter = Waiter(user_id, on_position)
+        self.queues.setdefault(user_id, deque()).append(waiter)
+        self.dispatch()
+        try:
+            await asyncio.wait_for(
+                asyncio.shield(waiter.future), settings.CHAT_ADMISSION_QUEUE_TIMEOUT
+            )
+        except BaseException as e:
+            if waiter.future.done():
+                # Admitted just as we gave up, hand the slot back
+                self.release(user_id)
+            else:
+                waiter.future.cancel()
+                self.forget(waiter)
+            if isinstance(e, asyncio.TimeoutError):
+                raise AdmissionRejected("Timed out waiting for a slot") from e
+            raise
+
+
+_controllers = weakref.WeakKeyDictionary()
+
+
+def get_controller() -> AdmissionController:
+    """Admission controller of this worker's event loop"""
+    loop = asyncio.get_running_loop()
+    controller = _controllers.get(loop)
+    if controller is None:
+        controller = AdmissionController()
+        _controllers[loop] = controller
+    return controller
@@ -0,0 +1,117 @@
+import hashlib
+import logging
+import re
+import unicodedata
+
+from django.conf import settings
+
+from reusable.cache import MISSING, LRUTTLCache
+from reusable.redis_client import get_async_redis, get_redis
+
+logger = logging.getLogger(__name__)
+
+REDIS_KEY = "chat:answer:{}"
+STATS_KEY = "chat:answer:stats"
+# Set of the answer keys cached for a grammar, so editing it clears them
+GRAMMAR_KEYS_KEY = "chat:answer:grammar:{}"
+
+_local_cache = LRUTTLCache(
+    maxsize=settings.CHAT_ANSWER_CACHE_SIZE, ttl=settings.CHAT_ANSWER_CACHE_TTL
+)
+
+
+def normalize_prompt(text: str) -> str:
+    """Normalize a question so trivially different phrasings share an entry"""
+    text = unicodedata.normalize("NFKC", text).casefold()
+    text = re.sub(r"\s+", " ", text).strip()
+    return text.rstrip(" ?!.")
+
+
+def answer_key(grammar_id, model: str, system_prompt: str, prompt: str) -> str:
+    # The system prompt is part of the key, so a process that still caches an
+    # edited grammar cannot serve answers to the new prompt, or the other way
+    raw = f"{grammar_id}:{model}:{system_prompt}\0{normalize_prompt(prompt)}"
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+async def record(field: str):
+    try:
+        await get_async_redis().hincrby(STATS_KEY, field, 1)
+    except Exception as e:
+        logger.warning(f"Could not record answer cache {field}: {e}")
+
+
+async def get_answer(grammar_id, model: str, system_prompt: str, prompt: str):
+    """Get a cached answer for a first-turn question, or None"""
+    key = answer_key(grammar_id, model, system_prompt, prompt)
+    answer = _local_cache.get(key)
+    if answer is MISSING:
+        try:
+            raw = await get_async_redis().get(REDIS_KEY.format(key))
+        except Exception as e:
+            logger.warning(f"Answer cache read failed: {e}")
+            raw = None
+        answer = raw.decode() if raw is not None else None
+        if answer is not None:
+            _local_cache.set(key, answer)
+
+    await record("hits" if answer is not None else "misses")
+    return answer
+
+
+async def set_answer(
+    grammar_id, model: str, system_prompt: str, prompt: str, answer: str
+):
+    """
+    Store the answer to a first-turn question in both cache tiers. ``model``
+    is the model that wrote the answer, which is not the primary's after a
+    failover.
+    """
+    key = answer_key(grammar_id, model, system_prompt, prompt)
+    _local_cache.set(key, answer)
+    ttl = settings.CHAT_ANSWER_CACHE_TTL
+    grammar_keys = GRAMMAR_KEYS_KEY.format(grammar_id)
+    try:
+        pipeline = get_async_redis().pipeline(transaction=False)
+        pipeline.set(REDIS_KEY.format(key), answer, ex=ttl)
+        pipeline.sadd(grammar_keys, key)
+        pipeline.expire(grammar_keys, ttl)
+        await pipeline.execute()
+    except Exception as e:
+        logger.warning(f"Answer cache write failed: {e}")
+
+
+def invalidate_grammar(grammar_id):
+    """
+    Drop the cached answers about a grammar whose prompt changed. The local
+    tier is not indexed by grammar, so it is cleared whole; other processes
+    stop using their entries as soon as they see the new prompt.
+    """
+    _local_cache.clear()
+    grammar_keys = GRAMMAR_KEYS_KEY.format(grammar_id)
+    try:
+        client = get_redis()
+        keys = [REDIS_KEY.format(key.decode()) for key in client.smembers(grammar_keys)]
+        client.delete(grammar_keys, *keys)
+    except Exception as e:
+        logger.warning(f"Answer cache invalidation failed for {grammar_id}: {e}")
+
+
+def get_stats() -> dict:
+    """Hit/miss counters shared by every worker"""
+    stats = {
+        field.decode(): int(value)
+        for field, value in get_redis().hgetall(STATS_KEY).items()
+    }
+    hits, misses = stats.get("hits", 0), stats.get("misses", 0)
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_ratio": round(hits / (hits + misses), 4) if hits + misses else 0.0,
+        "local_entries": len(_local_cache),
+    }
+
+
+def split_for_replay(answer: str) -> list:
+    """Split a cached answer into word-sized deltas like a live stream"""
+    return re.findall(r"\S+\s*|\s+", answer)
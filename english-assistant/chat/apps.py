@@ -0,0 +1,14 @@
+from django.apps import AppConfig
+
+
+class ChatConfig(AppConfig):
+    default_auto_field = "django.db.models.BigAutoField"
+    name = "chat"
+
+    def ready(self):
+        # Register every metric, /metrics/ is often served by a process that
+        # never imports the consumer or the LLM router
+        from . import metrics  # noqa: F401
+        from reusable import llm_clients, llm_router  # noqa: F401
+
+        from . import signals  # noqa: F401
@@ -0,0 +1,198 @@
+import asyncio
+import binascii
+import logging
+import re
+from datetime import datetime
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from . import tts_cache
+
+logger = logging.getLogger(__name__)
+
+TRANSCRIPTION_MODEL = "whisper-1"
+
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?:;])\s+|\n+")
+
+AUDIO_FORMATS = {"wav", "webm", "mp3", "m4a", "mp4", "ogg", "flac"}
+
+
+class AudioUploadError(Exception):
+    pass
+
+
+class AudioUpload:
+    """
+    A voice message assembled incrementally from binary WebSocket frames,
+    capped at ``CHAT_AUDIO_UPLOAD_MAX_BYTES``.
+    """
+
+    def __init__(self, extension: str = "wav", expected_size=None):
+        if extension not in AUDIO_FORMATS:
+            raise AudioUploadError(f"Unsupported audio format: {extension}")
+        self.max_bytes = settings.CHAT_AUDIO_UPLOAD_MAX_BYTES
+        if expected_size is not None:
+            try:
+                expected_size = int(expected_size)
+            except (TypeError, ValueError):
+                raise AudioUploadError("Invalid audio size.")
+            if expected_size > self.max_bytes:
+                raise AudioUploadError("Audio message is too large.")
+        self.extension = extension
+        self.chunks = []
+        self.size = 0
+
+    def append(self, chunk: bytes):
+        self.size += len(chunk)
+        if self.size > self.max_bytes:
+            self.chunks = []
+            raise AudioUploadError("Audio message is too large.")
+        self.chunks.append(chunk)
+
+    def getvalue(self) -> bytes:
+        """Join the chunks once and release them"""
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def audio_filename(user_id, extension: str = "wav") -> str:
+    """Generate the file name used for a user's voice message"""
+    return f"audio_{user_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}"
+
+
+def decode_data_url(data_url: str) -> bytes:
+    """Decode the base64 part of a ``data:audio/...;base64,...`` URL"""
+    return binascii.a2b_base64(data_url[data_url.index(",") + 1 :])
+
+
+async def adecode_data_url(data_url: str) -> bytes:
+    """Decode in a worker thread, not on the event loop or the shared DB thread"""
+    return await sync_to_async(decode_data_url, thread_sensitive=False)(data_url)
+
+
+async def transcribe(client, audio_bytes: bytes, filename: str) -> str:
+    """
+    Transcribe audio held in memory. The bytes are uploaded as a named buffer,
+    so nothing is written to disk and no copy of the payload is made.
+    """
+    transcript = await client.audio.transcriptions.create(
+        model=TRANSCRIPTION_MODEL, file=(filename, audio_bytes)
+    )
+    return transcript.text
+
+
+class SentenceSplitter:
+    """
+    Collect streamed text and hand out complete sentences. Sentences shorter
+    than ``min_chars`` are merged with the next one to avoid tiny TTS calls.
+    """
+
+    def __init__(self, min_chars=None):
+        if min_chars is None:
+            min_chars = settings.CHAT_TTS_MIN_SENTENCE_CHARS
+        self.min_chars = min_chars
+        self.buffer = ""
+
+    def feed(self, text: str) -> list:
+        self.buffer += text
+        sentences = []
+        start = 0
+        for match in SENTENCE_BOUNDARY.finditer(self.buffer):
+            sentence = self.buffer[start : match.start()].strip()
+            if len(sentence) >= self.min_chars:
+                sentences.append(sentence)
+                start = match.end()
+        self.buffer = self.buffer[start:]
+        return sentences
+
+    def flush(self):
+        """Return the trailing text that did not end with a boundary"""
+        sentence, self.buffer = self.buffer.strip(), ""
+        return sentence or None
+
+
+class SpeechPipeline:
+    """
+    Text-to-speech that runs while the answer is still streaming.
+
+    Every complete sentence is synthesized as soon as it is known, up to
+    ``CHAT_TTS_CONCURRENCY`` at a time, and the audio is sent back as binary
+    frames strictly in sentence order. The first audio therefore arrives about
+    one sentence after the first token instead of after the whole answer.
+    """
+
+    def __init__(self, client, send):
+        self.client = client
+        self.send = send
+        self.splitter = SentenceSplitter()
+        self.semaphore = asyncio.Semaphore(settings.CHAT_TTS_CONCURRENCY)
+        self.sentences = asyncio.Queue()
+        self.tasks = []
+        self.started_at = datetime.now()
+        self.first_audio_at = None
+        self.finished_at = None
+        self.sender = asyncio.ensure_future(self.send_in_order())
+
+    def feed(self, text: str):
+        for sentence in self.splitter.feed(text):
+            self.add_sentence(sentence)
+
+    def add_sentence(self, sentence: str):
+        chunks = asyncio.Queue()
+        task = asyncio.ensure_future(self.synthesize(sentence, chunks))
+        self.tasks.append(task)
+        self.sentences.put_nowait(chunks)
+
+    async def synthesize(self, sentence: str, chunks: asyncio.Queue):
+        try:
+            # Repeated sentences are served from the TTS cache
+            path = await tts_cache.aget(sentence)
+            if path is not None:
+                data = await sync_to_async(path.read_bytes, thread_sensitive=False)()
+                chunks.put_nowait(data)
+                return
+
+            parts = []
+            async with self.semaphore:
+                async with self.client.audio.speech.with_streaming_response.create(
+                    model=settings.CHAT_TTS_MODEL,
+                    voice=settings.CHAT_TTS_VOICE,
+                    input=sentence,
+                ) as response:
+                    async for chunk in response.iter_bytes(chunk_size=4096):
+                        parts.append(chunk)
+                        chunks.put_nowait(chunk)
+            await tts_cache.aput(sentence, b"".join(parts))
+        except Exception as e:
+            logger.warning(f"Speech synthesis failed for a sentence: {e}")
+        finally:
+            chunks.put_nowait(None)
+
+    async def send_in_order(self):
+        while True:
+            chunks = await self.sentences.get()
+            if chunks is None:
+                break
+            while True:
+                chunk = await chunks.get()
+                if chunk is None:
+                    break
+                if self.first_audio_at is None:
+                    self.first_audio_at = datetime.now()
+                await self.send(bytes_data=chunk)
+
+    async def finish(self):
+        """Synthesize the remaining text and wait until all audio is sent"""
+        sentence = self.splitter.flush()
+        if sentence:
+            self.add_sentence(sentence)
+        self.sentences.put_nowait(None)
+        await self.sender
+        self.finished_at = datetime.now()
+
+    async def cancel(self):
+        for task in self.tasks + [self.sender]:
+            task.cancel()
+        await asyncio.gather(*self.tasks, self.sender, return_exceptions=True)
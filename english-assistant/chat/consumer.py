@@ -1,19 +1,36 @@
+import asyncio
 import json
-import base64
-import os
+import time
+import uuid
+from contextlib import asynccontextmanager
 from datetime import datetime
+from urllib.parse import parse_qs
 
-import openai
-from openai import OpenAI
 from django.conf import settings
-from django.utils import timezone
 from django.contrib.auth.models import AnonymousUser
 from django.core.files.base import ContentFile
-from channels.generic.websocket import WebsocketConsumer
-
-# Import Grammar model
-from grammar.models import Grammar
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncWebsocketConsumer
+
+from grammar.cache import GENERAL_PROMPT, aget_grammar_entry
+from reusable import llm_clients, llm_router
+from user.models import Profile
+from . import (
+    admission,
+    answer_cache,
+    audio,
+    engagement,
+    metrics,
+    persistence,
+    quota,
+)
+from .memory import (
+    ConversationMemory,
+    load_conversation_state,
+    save_conversation_state,
+)
 from .models import Message
+from .streaming import FrameCoalescer
 
 # from log.models import Chat
 # from model.models import CachedModel
@@ -23,225 +40,306 @@ from .models import Message
 # from ai.tunning import get_answer_from_tuned_model
 
 
-class ChatConsumer(WebsocketConsumer):
-    def connect(self):
+class ChatConsumer(AsyncWebsocketConsumer):
+    # Answer being generated, cancelled by the cancel command or new input
+    turn_task = None
+    disconnected = False
+
+    async def connect(self):
         # Check if user is authenticated
         user = self.scope.get("user")
         if not user or isinstance(user, AnonymousUser):
-            self.close(code=4001)  # Custom close code for unauthorized
+            await self.close(code=4001)  # Custom close code for unauthorized
             return
 
         self.uid = self.scope["url_route"]["kwargs"]["uid"]
         self.grammar_id = self.uid
         self.user = user  # Store authenticated user
-
-        # Get the grammar from the database and add it to the conversation as context
-        self.grammar_context = self.get_grammar_context()
-        self.grammar_obj = self.get_grammar_object()
-        self.client = OpenAI(api_key=settings.OPENAI_API_KEY)
-        self.conversation = ""
+        self.user_timezone, word_limit = await self.get_profile_settings()
+        self.quota = quota.WordQuota(self.user.id, word_limit)
+
+        # Get the grammar and add it to the conversation as context
+        self.grammar_obj, self.grammar_context = await self.get_grammar()
+        # Chat answers go through the provider router, audio stays on OpenAI
+        self.client = llm_clients.get_async_client("openai")
+        self.router = llm_router.get_router()
+        self.admission = admission.get_controller()
         self.cached_model = None
         self.cd_model = None
-
-        # Generate session ID for this WebSocket connection
-        self.session_id = f"{self.user.id}_{self.grammar_id}_{datetime.now().strftime('%Y%m%d%H%M%S')}"
-
-        self.channel_layer.group_add(self.uid, self.channel_name)
-        self.accept()
+        self.audio_upload = None
+        self.turn_metrics = metrics.TurnMetrics()
+
+        # Generate session ID for this WebSocket connection, or resume the
+        # session the client reconnects with
+        query_params = parse_qs(self.scope.get("query_string", b"").decode())
+        requested_session_id = query_params.get("session_id", [None])[0]
+        self.session_id = self.get_session_id(requested_session_id)
+        # Context is kept per user and grammar, whatever the session, so any
+        # reconnect finds the state the previous socket saved
+        self.state_key = f"chat:conversation:{self.user.id}:{self.grammar_id}"
+
+        # Rehydrate the conversation so reconnects (to any worker) keep context
+        self.memory = ConversationMemory(self.summarize_conversation)
+        await self.restore_conversation()
+
+        await self.channel_layer.group_add(self.uid, self.channel_name)
+        await self.accept()
         # self.send_one_part_message(
         #     "Hi, I'm your English AI assistant. How can I help you today?"
         # )
 
-    def get_grammar_context(self) -> str:
+    def get_session_id(self, requested_session_id=None) -> str:
+        """Reuse the client's session ID if it belongs to this user and grammar"""
+        prefix = f"{self.user.id}_{self.grammar_id}_"
+        if requested_session_id and requested_session_id.startswith(prefix):
+            return requested_session_id
+        return f"{prefix}{datetime.now().strftime('%Y%m%d%H%M%S')}"
+
+    @database_sync_to_async
+    def get_profile_settings(self) -> tuple:
+        """Read the timezone and word quota once instead of on every turn"""
+        profile = (
+            Profile.objects.filter(user=self.user)
+            .values_list("timezone", "ai_word_count_limit")
+            .first()
+        )
+        if profile is None:
+            field = Profile._meta.get_field("ai_word_count_limit")
+            return "UTC", field.default
+        return profile
+
+    async def restore_conversation(self):
+        """Load conversation state from Redis, falling back to saved messages"""
+        if await load_conversation_state(self.memory, self.state_key):
+            return
+        for role, content in await self.get_recent_turns():
+            self.memory.add(role, content)
+
+    async def save_conversation(self):
+        """Persist conversation state so another worker can pick it up"""
+        await save_conversation_state(self.memory, self.state_key)
+
+    @database_sync_to_async
+    def get_recent_turns(self) -> list:
+        """Get the last messages of this user and grammar as (role, content)"""
+        if not self.grammar_id.isdigit():
+            return []
+        messages = (
+            Message.objects.filter(
+                user=self.user, grammar_id=int(self.grammar_id), deleted_at__isnull=True
+            )
+            .order_by("-created_at")
+            .values_list("sender_type", "content")[
+                : settings.CHAT_STATE_HISTORY_MESSAGES
+            ]
+        )
+        roles = {"user": "user", "ai": "assistant"}
+        return [(roles[sender], content) for sender, content in reversed(messages)]
+
+    async def get_grammar(self) -> tuple:
         """
-        Retrieve grammar from database and format it as context for the conversation.
+        Get the Grammar object and its prebuilt prompt for this conversation
+        from the grammar cache.
         """
         if not self.grammar_id:
             raise ValueError("Grammar ID is required")
         if not self.grammar_id.isdigit():
             raise ValueError("Grammar ID must be a valid integer")
         try:
-            grammar = Grammar.objects.filter(
-                id=int(self.grammar_id), deleted_at__isnull=True
-            ).first()
+            entry = await aget_grammar_entry(int(self.grammar_id))
+        except Exception as e:
+            print(f"Error retrieving grammar: {e}")
+            entry = None
 
-            if grammar:
-                context = f"""You are an English AI assistant specializing in the following grammar topic:
+        # If no specific grammar found, provide general context
+        return entry or (None, GENERAL_PROMPT)
 
-Grammar Topic: {grammar.title}
-Description: {grammar.description}
+    async def disconnect(self, close_code):
+        # Stop generating for a client that left, the partial answer is kept
+        self.disconnected = True
+        await self.cancel_turn()
 
-Please help users with questions related to this grammar topic. Provide clear explanations, examples, and corrections when needed. Always be encouraging and supportive in your responses.
+        if hasattr(self, "uid") and hasattr(self, "channel_name"):
+            await self.channel_layer.group_discard(self.uid, self.channel_name)
 
-Conversation History:
-"""
-                return context
+        if hasattr(self, "memory"):
+            await self.save_conversation()
+            await self.memory.close()
 
-            # If no specific grammar found or grammar_id is not a number, provide general context
-            return """You are an English AI assistant. Help users with grammar, vocabulary, pronunciation, and general English language questions. Provide clear explanations, examples, and corrections when needed. Always be encouraging and supportive in your responses.
+        if close_code == 4001:
+            print(f"WebSocket connection closed: Unauthorized access attempt")
 
-Conversation History:
-"""
-        except Exception as e:
-            print(f"Error retrieving grammar context: {e}")
-            return """You are an English AI assistant. Help users with grammar, vocabulary, pronunciation, and general English language questions. Provide clear explanations, examples, and corrections when needed. Always be encouraging and supportive in your responses.
+    async def send_complete_message(self):
+        await self.send(json.dumps({"error": False, "message": "completed."}))
 
-Conversation History:
-"""
+    async def send_error_message(self, message):
+        await self.send(json.dumps({"error": True, "message": message}))
 
-    def get_grammar_object(self):
-        """Get the Grammar object for this conversation"""
-        if not self.grammar_id or not self.grammar_id.isdigit():
-            return None
-        try:
-            return Grammar.objects.filter(
-                id=int(self.grammar_id), deleted_at__isnull=True
-            ).first()
-        except Exception as e:
-            print(f"Error retrieving grammar object: {e}")
-            return None
+    async def send_cancelled(self, response_id):
+        await self.send(
+            json.dumps({"error": False, "message": "cancelled.", "id": response_id})
+        )
 
-    def disconnect(self, close_code):
-        if hasattr(self, "uid") and hasattr(self, "channel_name"):
-            self.channel_layer.group_discard(self.uid, self.channel_name)
+    async def send_quota_exhausted(self, budget):
+        await self.send(
+            json.dumps(
+                {
+                    "error": True,
+                    "code": "quota_exhausted",
+                    "message": "You have used up your AI word quota.",
+                    "retry_after": budget.retry_after(),
+                }
+            )
+        )
 
-        if close_code == 4001:
-            print(f"WebSocket connection closed: Unauthorized access attempt")
+    async def send_overloaded(self):
+        await self.send(
+            json.dumps(
+                {
+                    "error": True,
+                    "code": "overloaded",
+                    "message": "The assistant is busy, please try again shortly.",
+                    "retry_after": settings.CHAT_ADMISSION_RETRY_AFTER,
+                }
+            )
+        )
+
+    async def send_queue_position(self, position: int):
+        await self.send(
+            json.dumps(
+                {"error": False, "message": "queued.", "queue_position": position}
+            )
+        )
 
-    def send_complete_message(self):
-        self.send(json.dumps({"error": False, "message": "completed."}))
+    @asynccontextmanager
+    async def llm_slot(self):
+        """Hold one of the worker's LLM slots while the answer streams"""
+        started = time.perf_counter()
+        try:
+            await self.admission.acquire(self.user.id, self.send_queue_position)
+        except admission.AdmissionRejected:
+            asyncio.ensure_future(metrics.rejected_turns_total.ainc())
+            raise
+        self.turn_metrics.observe(
+            metrics.admission_wait_seconds, time.perf_counter() - started
+        )
+        try:
+            yield
+        finally:
+            self.admission.release(self.user.id)
 
-    def send_one_part_message(self, message):
-        self.send(json.dumps({"error": False, "message": message}))
-        self.send_complete_message()
+    async def send_one_part_message(self, message):
+        await self.send(json.dumps({"error": False, "message": message}))
+        await self.send_complete_message()
 
     def get_model_answer(self, model: str, message: str) -> str:
         loaded_model = None
         if model == "gcc":
             pass
 
-    def convert_audio_to_text(self, audio_base64: str) -> tuple:
+    async def convert_audio_to_text(self, audio_base64: str) -> tuple:
         """Convert audio to text and return transcription with audio file"""
-        # Split to get the actual base64 part
-        header, audio_data = audio_base64.split(",", 1)
-        audio_bytes = base64.b64decode(audio_data)
-
-        # Generate unique filename for this audio
-        audio_filename = (
-            f"audio_{self.user.id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.wav"
+        audio_bytes = await audio.adecode_data_url(audio_base64)
+        return await self.transcribe_audio(audio_bytes)
+
+    async def transcribe_audio(self, audio_bytes: bytes, extension="wav") -> tuple:
+        """Transcribe in-memory audio and wrap it for saving to the model"""
+        filename = audio.audio_filename(self.user.id, extension)
+        started = time.perf_counter()
+        transcription = await audio.transcribe(self.client, audio_bytes, filename)
+        self.turn_metrics.observe(
+            metrics.whisper_seconds, time.perf_counter() - started
         )
 
-        # Save to temporary file for Whisper processing
-        temp_file_path = f"/tmp/{audio_filename}"
-        with open(temp_file_path, "wb") as f:
-            f.write(audio_bytes)
+        # ContentFile shares the buffer, the payload is not copied again
+        return transcription, ContentFile(audio_bytes, name=filename)
 
-        # Call OpenAI Whisper API to transcribe audio
-        with open(temp_file_path, "rb") as audio_file:
-            transcript = self.client.audio.transcriptions.create(
-                model="whisper-1", file=audio_file
-            )
-
-        # Create Django file object for saving to model
-        audio_file_obj = ContentFile(audio_bytes, name=audio_filename)
-
-        # Clean up temporary file
-        try:
-            os.remove(temp_file_path)
-        except OSError:
-            pass
-
-        return transcript.text, audio_file_obj
-
-    def save_user_message(
+    async def save_user_message(
         self, content, message_type="text", audio_file=None, transcription=None
     ):
-        """Save user message to database"""
+        """Queue user message for the database writer"""
         if not self.grammar_obj:
             print("Warning: No grammar object found, skipping message save")
             return None
 
-        try:
-            message = Message.create_user_message(
-                user=self.user,
-                grammar=self.grammar_obj,
-                content=content,
-                message_type=message_type,
-                session_id=self.session_id,
-                user_timezone=self.user.profile.timezone,
-                audio_file=audio_file,
-                transcription=transcription,
-            )
-            print(f"Saved user message: {message.id}")
-            return message
-        except Exception as e:
-            print(f"Error saving user message: {e}")
-            return None
+        if audio_file is not None:
+            audio_file = await persistence.store_audio(audio_file)
+        return await self.enqueue_message(
+            content=content,
+            message_type=message_type,
+            sender_type="user",
+            audio_file=audio_file,
+            transcription=transcription,
+        )
 
-    def save_ai_message(self, content, response_id=None):
-        """Save AI message to database"""
+    async def save_ai_message(self, content, response_id=None, truncated=False):
+        """Queue AI message for the database writer"""
         if not self.grammar_obj:
             print("Warning: No grammar object found, skipping message save")
             return None
 
-        try:
-            message = Message.create_ai_message(
-                user=self.user,
-                grammar=self.grammar_obj,
-                content=content,
-                response_id=response_id,
-                session_id=self.session_id,
-                user_timezone=self.user.profile.timezone,
-            )
-            print(f"Saved AI message: {message.id}")
-            return message
-        except Exception as e:
-            print(f"Error saving AI message: {e}")
-            return None
+        return await self.enqueue_message(
+            content=content,
+            sender_type="ai",
+            response_id=response_id,
+            truncated=truncated,
+        )
 
-    def thump_up(self, data: dict):
+    async def enqueue_message(self, **fields) -> str:
+        """Append a message record to the write-behind stream, timing it"""
+        started = time.perf_counter()
+        record = persistence.message_record(
+            user_id=self.user.id,
+            grammar_id=self.grammar_obj.id,
+            session_id=self.session_id,
+            user_timezone=self.user_timezone,
+            **fields,
+        )
+        await persistence.enqueue(record)
+        self.turn_metrics.observe(
+            metrics.db_save_seconds, time.perf_counter() - started
+        )
+        return record["record_id"]
+
+    async def thump_up(self, data: dict):
         """Handle thumbs up for a message"""
+        await self.record_engagement(data, "thumb_up")
+
+    async def thumb_down(self, data: dict):
+        """Handle thumbs down for a message"""
+        await self.record_engagement(data, "thumb_down")
+
+    async def record_engagement(self, data: dict, action: str):
+        """Count a click in Redis, or update the message if it is not buffered"""
         response_id = data.get("responseId")
         if not response_id:
-            print("No responseId provided for thumb up")
+            print(f"No responseId provided for {action}")
             return
 
+        if await engagement.arecord_response_click(self.user.id, response_id, action):
+            return
         try:
-            message = Message.objects.filter(
-                response_id=response_id, user=self.user, deleted_at__isnull=True
-            ).first()
-
-            if message:
-                message.thumb_up += 1
-                message.save(update_fields=["thumb_up", "updated_at"])
-                print(f"Thumb up added to message {message.id}")
+            if await self.apply_engagement(response_id, action):
+                print(f"{action} added to message {response_id}")
             else:
                 print(f"Message with response_id {response_id} not found")
         except Exception as e:
-            print(f"Error processing thumb up: {e}")
-
-    def thumb_down(self, data: dict):
-        """Handle thumbs down for a message"""
-        response_id = data.get("responseId")
-        if not response_id:
-            print("No responseId provided for thumb down")
-            return
+            print(f"Error processing {action}: {e}")
 
-        try:
-            message = Message.objects.filter(
+    @database_sync_to_async
+    def apply_engagement(self, response_id: str, action: str) -> int:
+        return engagement.apply_deltas(
+            Message.objects.filter(
                 response_id=response_id, user=self.user, deleted_at__isnull=True
-            ).first()
+            ),
+            **{action: 1},
+        )
 
-            if message:
-                message.thumb_down += 1
-                message.save(update_fields=["thumb_down", "updated_at"])
-                print(f"Thumb down added to message {message.id}")
-            else:
-                print(f"Message with response_id {response_id} not found")
-        except Exception as e:
-            print(f"Error processing thumb down: {e}")
+    async def receive(self, text_data=None, bytes_data=None):
+        if bytes_data is not None:
+            await self.receive_audio_chunk(bytes_data)
+            return
 
-    def receive(self, text_data=None, bytes_data=None):
         if text_data:
             # Parse the text_data to check if it's JSON
             try:
@@ -254,100 +352,423 @@ Conversation History:
                 print(f"Just pinging")
                 return
 
+            if "command" in data and data["command"] == "cancel":
+                if not await self.cancel_turn():
+                    print("Nothing to cancel")
+                return
+
             if "command" in data and data["command"] == "thumb-up":
                 # check if responseId is in data
                 if "responseId" not in data:
                     return
-                self.thump_up(data)
+                await self.thump_up(data)
                 return
 
             if "command" in data and data["command"] == "thumb-down":
                 # check if responseId is in data
                 if "responseId" not in data:
                     return
-                self.thumb_down(data)
+                await self.thumb_down(data)
                 return
 
-            # Check if the input is an audio payload
-            if "audio" in data:
-                print("Received audio data")
-                transcription, audio_file = self.convert_audio_to_text(data["audio"])
-
-                # Save user audio message
-                self.save_user_message(
-                    content=transcription,
-                    message_type="audio",
-                    audio_file=audio_file,
-                    transcription=transcription,
-                )
+            # Voice messages uploaded as binary frames between start and end
+            if "command" in data and data["command"] == "audio-start":
+                await self.start_audio_upload(data)
+                return
+
+            if "command" in data and data["command"] == "audio-end":
+                upload, self.audio_upload = self.audio_upload, None
+                if upload is None:
+                    await self.send_error_message("No audio upload in progress.")
+                    return
+                print(f"Received audio upload: {upload.size} bytes")
+                await self.start_turn(self.answer_audio_upload(upload, data))
+                return
 
-                self.send(json.dumps({"error": False, "audio_text": transcription}))
-                self.send_complete_message()
-
-                # Use transcription as the text_data for AI processing
-                text_data = transcription
-
-            elif "data" in data:
-                text_data = data["data"]
-                print(f"Received data: {text_data}")
-
-                # Save user text message
-                self.save_user_message(content=text_data, message_type="text")
-
-            print(f"User {self.user.email} message: {text_data}")
-            self.conversation += f"User ({self.user.email}): {text_data}\n"
-
-            answer = ""
-
-            # generate random response id
-            response_id = datetime.now().strftime("%Y%m%d%H%M%S")
-
-            response_stream = self.client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": f"You are an English AI assistant specializing in the following grammar topic: {self.grammar_context}",
-                    },
-                    # follow the max tokens limit
-                    {
-                        "role": "system",
-                        "content": f"You can only answer in 300 tokens",
-                    },
-                    {
-                        "role": "user",
-                        "content": self.conversation,
-                    },
-                ],
-                temperature=0,
-                max_tokens=300,  # Adjust based on desired response length
-                stream=True,
+            # New input supersedes the answer in progress
+            await self.start_turn(self.answer_input(text_data, data))
+
+    async def start_turn(self, coroutine):
+        """
+        Run a turn in the background, so cancel commands and new input are
+        received while the answer streams.
+        """
+        if await self.cancel_turn():
+            print("Answer superseded by new input")
+        self.turn_task = asyncio.ensure_future(self.run_turn(coroutine))
+
+    async def run_turn(self, coroutine):
+        try:
+            await coroutine
+        except asyncio.CancelledError:
+            # Cancelled before the answer started, there is nothing to keep
+            pass
+        except Exception as e:
+            print(f"Error answering user {self.user.id}: {e}")
+            if not self.disconnected:
+                await self.send_error_message("Could not answer, please try again.")
+
+    async def cancel_turn(self) -> bool:
+        """Stop the turn in progress and wait until its partial answer is saved"""
+        task, self.turn_task = self.turn_task, None
+        if task is None or task.done():
+            return False
+        task.cancel()
+        await asyncio.wait([task])
+        return True
+
+    async def answer_input(self, text_data: str, data: dict):
+        # Check if the input is an audio payload
+        if "audio" in data:
+            print("Received audio data")
+            audio_bytes = await audio.adecode_data_url(data["audio"])
+
+            # Use transcription as the text_data for AI processing
+            text_data = await self.handle_audio_message(audio_bytes)
+
+        elif "data" in data:
+            text_data = data["data"]
+            print(f"Received data: {text_data}")
+
+            # Save user text message
+            await self.save_user_message(content=text_data, message_type="text")
+
+        await self.answer_message(text_data, voice=bool(data.get("voice")))
+
+    async def answer_audio_upload(self, upload, data: dict):
+        text_data = await self.handle_audio_message(upload.getvalue(), upload.extension)
+        await self.answer_message(text_data, voice=bool(data.get("voice")))
+
+    async def start_audio_upload(self, data: dict):
+        """Begin assembling a voice message sent as binary frames"""
+        try:
+            self.audio_upload = audio.AudioUpload(
+                extension=data.get("format", "wav"), expected_size=data.get("size")
+            )
+        except audio.AudioUploadError as e:
+            self.audio_upload = None
+            await self.send_error_message(str(e))
+
+    async def receive_audio_chunk(self, chunk: bytes):
+        """Append a binary frame to the voice message being uploaded"""
+        if self.audio_upload is None:
+            await self.send_error_message("Send audio-start before audio data.")
+            return
+        try:
+            self.audio_upload.append(chunk)
+        except audio.AudioUploadError as e:
+            self.audio_upload = None
+            await self.send_error_message(str(e))
+
+    async def handle_audio_message(self, audio_bytes: bytes, extension="wav") -> str:
+        """Transcribe and save a voice message, then echo the transcription"""
+        transcription, audio_file = await self.transcribe_audio(audio_bytes, extension)
+
+        # Save user audio message
+        await self.save_user_message(
+            content=transcription,
+            message_type="audio",
+            audio_file=audio_file,
+            transcription=transcription,
+        )
+
+        await self.send(json.dumps({"error": False, "audio_text": transcription}))
+        await self.send_complete_message()
+        return transcription
+
+    async def answer_message(self, text_data: str, voice=False):
+        """
+        Answer the user's message, streaming it to the client. With ``voice``
+        the answer is also narrated sentence by sentence while it streams.
+        When the turn is cancelled the part already streamed is saved as a
+        truncated answer.
+        """
+        print(f"User {self.user.email} message: {text_data}")
+        budget = quota.TurnBudget(self.quota)
+        if not await budget.start():
+            await self.send_quota_exhausted(budget)
+            return
+        self.memory.add("user", text_data)
+
+        # Unique across users and retries, it also keys the queued message
+        response_id = uuid.uuid4().hex
+
+        # First questions of a topic repeat a lot, answer them from cache
+        cacheable = settings.CHAT_ANSWER_CACHE_ENABLED and self.is_first_turn()
+        cached = None
+        if cacheable:
+            cached = await answer_cache.get_answer(
+                self.grammar_id,
+                self.router.primary.model,
+                self.grammar_context,
+                text_data,
             )
 
-            for chunk in response_stream:
-                for choice in chunk.choices:
-                    part = choice.delta.content
-                    if not part:
-                        continue
-                    answer += part
-                    self.send(
-                        json.dumps({"error": False, "message": part, "id": response_id})
+        speech = audio.SpeechPipeline(self.client, self.send) if voice else None
+        parts = []
+        answer = None
+        cancelled = False
+        try:
+            if cached is not None:
+                answer = await self.replay_answer(
+                    cached, response_id, speech, budget, parts
+                )
+            else:
+                try:
+                    async with self.llm_slot():
+                        answer = await self.stream_answer(
+                            response_id, speech, budget, parts
+                        )
+                except admission.AdmissionRejected as e:
+                    print(f"Turn rejected for user {self.user.id}: {e}")
+                    if speech:
+                        await speech.cancel()
+                    await self.send_overloaded()
+                    return
+                if cacheable and answer and not budget.exhausted:
+                    await answer_cache.set_answer(
+                        self.grammar_id,
+                        self.answer_model,
+                        self.grammar_context,
+                        text_data,
+                        answer,
                     )
-            self.send_complete_message()
+        except asyncio.CancelledError:
+            # The upstream stream and the LLM slot are already released.
+            # The turn goes on to save its partial answer, so it is no longer
+            # being cancelled.
+            asyncio.current_task().uncancel()
+            cancelled = True
+            if answer is None:
+                answer = "".join(parts)
+            if speech:
+                await speech.cancel()
+        except BaseException:
+            if speech:
+                await speech.cancel()
+            raise
+        finally:
+            await budget.finish()
+
+        # Keep the answer before the final frames and the narration, which new
+        # input, a cancel command or a disconnect may still interrupt
+        if answer:
+            self.memory.add("assistant", answer)
+            await self.run_to_completion(
+                self.save_answer(
+                    answer, response_id, truncated=cancelled or budget.exhausted
+                )
+            )
 
-            # Save AI response message
-            self.save_ai_message(content=answer, response_id=response_id)
+        try:
+            if not self.disconnected:
+                if cancelled:
+                    await self.send_cancelled(response_id)
+                elif budget.exhausted:
+                    await self.send_quota_exhausted(budget)
+                await self.send_complete_message()
+                if speech and not cancelled:
+                    await self.finish_speech(speech, response_id)
+        except asyncio.CancelledError:
+            # The answer is saved whole, only its narration is cut short
+            asyncio.current_task().uncancel()
+            if speech:
+                await speech.cancel()
+            if not self.disconnected:
+                await self.send_cancelled(response_id)
+        if answer:
+            await self.record_turn_metrics(speech)
+
+    async def save_answer(self, answer: str, response_id: str, truncated=False):
+        """Queue the AI message and store the conversation it completes"""
+        await self.save_ai_message(
+            content=answer, response_id=response_id, truncated=truncated
+        )
+        await self.save_conversation()
 
-            self.conversation += f"AI assistant Answer: {answer}\n"
+    async def run_to_completion(self, coroutine):
+        """Await ``coroutine`` to the end, even if the turn is cancelled meanwhile"""
+        task = asyncio.ensure_future(coroutine)
+        while not task.done():
+            try:
+                await asyncio.shield(task)
+            except asyncio.CancelledError:
+                asyncio.current_task().uncancel()
+        return task.result()
+
+    async def record_turn_metrics(self, speech=None):
+        """Record the turn's timings into the shared metrics"""
+        if speech and speech.first_audio_at:
+            first_audio = speech.first_audio_at - speech.started_at
+            self.turn_metrics.observe(
+                metrics.tts_first_audio_seconds, first_audio.total_seconds()
+            )
+        await self.turn_metrics.record()
+
+    def is_first_turn(self) -> bool:
+        """Check if the message being answered opens the conversation"""
+        return (
+            len(self.memory.turns) == 1
+            and not self.memory.summary
+            and not self.memory.pending
+        )
+
+    async def stream_answer(
+        self, response_id: str, speech=None, budget=None, parts=None
+    ) -> str:
+        """
+        Stream the model's answer to the client and return the full text,
+        stopping early when the turn's word ``budget`` runs out. Deltas are
+        collected in ``parts``, which holds the partial answer if the turn is
+        cancelled. ``answer_model`` is set to the model that answered.
+        """
+        started = time.perf_counter()
+        options = {}
+        if settings.CHAT_LLM_STREAM_USAGE:
+            options["stream_options"] = {"include_usage": True}
+        response_stream = await self.router.stream(
+            self.build_prompt(),
+            temperature=0,
+            max_tokens=300,  # Adjust based on desired response length
+            **options,
+        )
+        # After a failover this is not the primary's model
+        self.answer_model = response_stream.provider.model
 
-    def stream_audio(self, text_data):
-        self.time_of_starting_audio = datetime.now()
-        response = self.client.audio.speech.with_streaming_response.create(
-            model="tts-1",
-            voice="alloy",
-            input=text_data,
+        parts = [] if parts is None else parts
+        first_token_at = None
+        coalescer = FrameCoalescer(self.send, response_id)
+        try:
+            async for part in response_stream:
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                parts.append(part)
+                await coalescer.add(part)
+                if speech:
+                    speech.feed(part)
+                if budget and not await budget.spend(part):
+                    # Stop generating upstream, the user cannot receive more
+                    await response_stream.close()
+                    break
+        except asyncio.CancelledError:
+            # Close the upstream stream now, not when the generator is collected
+            await response_stream.close()
+            if self.disconnected:
+                coalescer.close()
+            else:
+                # Send the buffered text, so the client shows what is saved
+                await coalescer.flush()
+            raise
+        except BaseException:
+            coalescer.close()
+            raise
+        await coalescer.flush()
+        self.observe_stream(started, first_token_at, len(parts), coalescer)
+        if first_token_at is not None:
+            self.observe_usage(response_stream.usage, first_token_at - started)
+        return "".join(parts)
+
+    def build_prompt(self) -> list:
+        """
+        The grammar's system prompt followed by the conversation, one message
+        per turn. The system prompt is byte-identical on every request about a
+        grammar, so providers serve it from their prompt cache.
+        """
+        return [
+            {"role": "system", "content": self.grammar_context},
+            *self.memory.as_messages(),
+        ]
+
+    def observe_stream(self, started, first_token_at, deltas, coalescer):
+        """Collect TTFT, stream duration, throughput and frame count"""
+        finished = time.perf_counter()
+        self.turn_metrics.observe(metrics.stream_seconds, finished - started)
+        self.turn_metrics.observe(metrics.frames_per_answer, coalescer.frames_sent)
+        if first_token_at is None:
+            return
+        self.turn_metrics.observe(metrics.ttft_seconds, first_token_at - started)
+        if deltas > 1 and finished > first_token_at:
+            self.turn_metrics.observe(
+                metrics.tokens_per_second, (deltas - 1) / (finished - first_token_at)
+            )
+
+    def observe_usage(self, usage, ttft):
+        """Count billed tokens and the prompt tokens served from cache"""
+        if usage is None:
+            return
+        details = usage.prompt_tokens_details
+        cached = details.cached_tokens if details else None
+        if cached is None:
+            # DeepSeek reports its context cache hits separately
+            cached = getattr(usage, "prompt_cache_hit_tokens", None)
+        cached = cached or 0
+        self.turn_metrics.count(metrics.prompt_tokens_total, usage.prompt_tokens)
+        self.turn_metrics.count(metrics.cached_prompt_tokens_total, cached)
+        self.turn_metrics.count(
+            metrics.completion_tokens_total, usage.completion_tokens
+        )
+        if cached:
+            self.turn_metrics.observe(metrics.cached_ttft_seconds, ttft)
+
+    async def replay_answer(
+        self, answer: str, response_id: str, speech=None, budget=None, parts=None
+    ) -> str:
+        """
+        Send a cached answer with the same frames as a live stream and return
+        the text sent, cut short at the words the turn's ``budget`` grants.
+        Sent deltas are collected in ``parts``.
+        """
+        started = time.perf_counter()
+        parts = [] if parts is None else parts
+        coalescer = FrameCoalescer(self.send, response_id)
+        try:
+            for part in answer_cache.split_for_replay(answer):
+                # The whole answer is known, so stop before the first word
+                # the budget does not cover
+                if budget and not await budget.spend(part):
+                    break
+                parts.append(part)
+                await coalescer.add(part)
+                if speech:
+                    speech.feed(part)
+        except asyncio.CancelledError:
+            if self.disconnected:
+                coalescer.close()
+            else:
+                await coalescer.flush()
+            raise
+        except BaseException:
+            coalescer.close()
+            raise
+        await coalescer.flush()
+        self.observe_stream(started, started, 0, coalescer)
+        return "".join(parts)
+
+    async def summarize_conversation(self, summary: str, turns: list) -> str:
+        """Fold turns evicted from the memory window into the running summary"""
+        return await self.router.complete(
+            ConversationMemory.summary_messages(summary, turns),
+            temperature=0,
+            max_tokens=settings.CHAT_MEMORY_SUMMARY_TOKENS,
+        )
+
+    async def stream_audio(self, text_data):
+        """Narrate a complete text, sending audio chunks as binary frames"""
+        speech = audio.SpeechPipeline(self.client, self.send)
+        speech.feed(text_data)
+        await self.finish_speech(speech)
+
+    async def finish_speech(self, speech, response_id=None):
+        """Wait for pending narration and record its timings"""
+        try:
+            await speech.finish()
+        finally:
+            await speech.cancel()
+        self.time_of_starting_audio = speech.started_at
+        self.first_byte_of_audio = speech.first_audio_at
+        self.time_of_ending_audio = speech.finished_at
+        await self.send(
+            json.dumps(
+                {"error": False, "message": "audio-completed.", "id": response_id}
+            )
         )
-        self.first_byte_of_audio = datetime.now()
-        for chunk in response.iter_bytes(chunk_size=1024):
-            self.send(chunk)  # Sending audio chunks directly
-        self.time_of_ending_audio = datetime.now()
@@ -0,0 +1,272 @@
+"""
+Thumbs up/down counters.
+
+Clicks are counted with atomic HINCRBY calls in a Redis hash and a periodic
+task folds them into Postgres with F() updates, so a burst of clicks on a hot
+message costs one UPDATE instead of a SELECT and an UPDATE per click. With
+CHAT_ENGAGEMENT_BUFFERED off, or when Redis is down, the F() update is applied
+directly.
+
+Pending fields are ``id:{message_id}:{action}`` for clicks on a known message
+and ``response:{user_id}:{response_id}:{action}`` for clicks sent over the
+WebSocket, whose message may still be waiting in the write-behind stream.
+Those are put back into the pending hash until their message is written, for
+at most CHAT_ENGAGEMENT_FLUSH_RETRIES flushes. Each snapshot of the pending
+hash gets a flush id that is committed with its updates, so a flush that
+crashed before cleaning up is never applied twice.
+"""
+
+import json
+import logging
+import uuid
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from redis.exceptions import ResponseError
+
+from reusable.redis_client import get_async_redis, get_redis
+from . import rollups
+from .models import EngagementFlush, Message
+
+logger = logging.getLogger(__name__)
+
+ACTIONS = ("thumb_up", "thumb_down")
+
+PENDING_KEY = "chat:engagement:pending"
+FLUSHING_KEY = "chat:engagement:flushing"
+RETRIES_KEY = "chat:engagement:retries"
+FLUSH_ID_FIELD = "flush_id"
+
+# Applied flushes are remembered this long, far past any crashed flush
+FLUSH_RECORD_TTL = timedelta(days=1)
+
+# Once the snapshot ARGV[1] is applied: requeue the unmatched clicks ARGV[3]
+# that have not been retried ARGV[2] times yet, forget the retries of the
+# matched fields ARGV[4] and delete the snapshot. Returns the dropped fields.
+FINISH_SCRIPT = """
+if redis.call('HGET', KEYS[1], 'flush_id') ~= ARGV[1] then
+    return 0
+end
+local dropped = 0
+for field, count in pairs(cjson.decode(ARGV[3])) do
+    if redis.call('HINCRBY', KEYS[3], field, 1) <= tonumber(ARGV[2]) then
+        redis.call('HINCRBY', KEYS[2], field, count)
+    else
+        redis.call('HDEL', KEYS[3], field)
+        dropped = dropped + 1
+    end
+end
+for _, field in ipairs(cjson.decode(ARGV[4])) do
+    redis.call('HDEL', KEYS[3], field)
+end
+redis.call('DEL', KEYS[1])
+return dropped
+"""
+
+# Clicks matched by (user, response_id) per UPDATE statement
+FLUSH_CHUNK_SIZE = 500
+
+
+def message_field(message_id, action: str) -> str:
+    return f"id:{message_id}:{action}"
+
+
+def response_field(user_id, response_id: str, action: str) -> str:
+    return f"response:{user_id}:{response_id}:{action}"
+
+
+def apply_deltas(queryset, thumb_up=0, thumb_down=0) -> int:
+    """
+    Atomically add to the counters of the messages in ``queryset`` and to
+    their daily statistics.
+    """
+    with transaction.atomic():
+        rollups.add_engagement(queryset, thumb_up, thumb_down)
+        return queryset.update(
+            thumb_up=F("thumb_up") + thumb_up,
+            thumb_down=F("thumb_down") + thumb_down,
+            updated_at=timezone.now(),
+        )
+
+
+def record_clicks(message_ids_and_actions: list):
+    """Count (message_id, action) clicks in one round trip"""
+    if settings.CHAT_ENGAGEMENT_BUFFERED:
+        try:
+            pipeline = get_redis().pipeline(transaction=False)
+            for message_id, action in message_ids_and_actions:
+                pipeline.hincrby(PENDING_KEY, message_field(message_id, action), 1)
+            pipeline.execute()
+            return
+        except Exception as e:
+            logger.warning(f"Could not buffer engagement, writing directly: {e}")
+
+    deltas = defaultdict(lambda: defaultdict(int))
+    for message_id, action in message_ids_and_actions:
+        deltas[message_id][action] += 1
+    with transaction.atomic():
+        for message_id, actions in deltas.items():
+            apply_deltas(Message.objects.filter(id=message_id), **actions)
+
+
+async def arecord_response_click(user_id, response_id: str, action: str) -> bool:
+    """Count a WebSocket click, returns False if it must be written directly"""
+    if not settings.CHAT_ENGAGEMENT_BUFFERED:
+        return False
+    try:
+        field = response_field(user_id, response_id, action)
+        await get_async_redis().hincrby(PENDING_KEY, field, 1)
+        return True
+    except Exception as e:
+        logger.warning(f"Could not buffer engagement, writing directly: {e}")
+        return False
+
+
+def pending_counts(message_id) -> dict:
+    """Clicks on a message that are not flushed to the database yet"""
+    fields = [message_field(message_id, action) for action in ACTIONS]
+    try:
+        values = get_redis().hmget(PENDING_KEY, fields)
+    except Exception as e:
+        logger.warning(f"Could not read pending engagement: {e}")
+        return dict.fromkeys(ACTIONS, 0)
+    return {action: int(value or 0) for action, value in zip(ACTIONS, values)}
+
+
+def chunked(items: list):
+    for start in range(0, len(items), FLUSH_CHUNK_SIZE):
+        stop = start + FLUSH_CHUNK_SIZE
+        yield items[start:stop]
+
+
+def read_snapshot(snapshot: dict):
+    """Sum the clicks of a pending hash per message and per response"""
+    by_message = defaultdict(lambda: defaultdict(int))
+    by_response = defaultdict(lambda: defaultdict(int))
+    for field, value in snapshot.items():
+        kind, *key, action = field.split(":")
+        if action not in ACTIONS:
+            continue
+        if kind == "id":
+            by_message[int(key[0])][action] += int(value)
+        elif kind == "response":
+            by_response[(int(key[0]), key[1])][action] += int(value)
+    return by_message, by_response
+
+
+def written_responses(responses: list) -> set:
+    """The (user_id, response_id) pairs whose message is in the database"""
+    written = set()
+    for chunk in chunked(responses):
+        match = Q()
+        for user_id, response_id in chunk:
+            match |= Q(user_id=user_id, response_id=response_id)
+        # Clicks on a deleted message are dropped, not retried
+        written.update(
+            Message.objects.filter(match).values_list("user_id", "response_id")
+        )
+    return written
+
+
+def apply_snapshot(flush_id: str, snapshot: dict):
+    """
+    Apply a snapshot once, returns the updated rows and the clicks of
+    responses whose message is not written yet.
+    """
+    by_message, by_response = read_snapshot(snapshot)
+
+    # Messages with the same deltas share one UPDATE
+    message_groups = defaultdict(list)
+    for message_id, actions in by_message.items():
+        message_groups[(actions["thumb_up"], actions["thumb_down"])].append(message_id)
+
+    updated = 0
+    with transaction.atomic():
+        # Claims the snapshot, a concurrent or repeated flush fails here
+        record = EngagementFlush.objects.create(flush_id=flush_id)
+
+        written = written_responses(list(by_response))
+        response_groups = defaultdict(list)
+        for (user_id, response_id), actions in by_response.items():
+            if (user_id, response_id) in written:
+                response_groups[(actions["thumb_up"], actions["thumb_down"])].append(
+                    Q(user_id=user_id, response_id=response_id)
+                )
+            else:
+                for action, count in actions.items():
+                    field = response_field(user_id, response_id, action)
+                    record.unmatched[field] = count
+
+        for (thumb_up, thumb_down), message_ids in message_groups.items():
+            queryset = Message.objects.filter(id__in=message_ids)
+            updated += apply_deltas(queryset, thumb_up, thumb_down)
+        for (thumb_up, thumb_down), conditions in response_groups.items():
+            for chunk in chunked(conditions):
+                match = Q()
+                for condition in chunk:
+                    match |= condition
+                queryset = Message.objects.filter(match, deleted_at__isnull=True)
+                updated += apply_deltas(queryset, thumb_up, thumb_down)
+        if record.unmatched:
+            record.save(update_fields=["unmatched"])
+    return updated, record.unmatched
+
+
+def flush() -> int:
+    """Fold the buffered clicks into the database, returns updated rows"""
+    client = get_redis()
+    # A flush that crashed leaves its snapshot behind, finish that one first.
+    # Renaming swaps the hash out atomically, new clicks land in a fresh one.
+    if not client.exists(FLUSHING_KEY):
+        try:
+            client.rename(PENDING_KEY, FLUSHING_KEY)
+        except ResponseError:
+            # Nothing was clicked since the last flush
+            return 0
+    client.hsetnx(FLUSHING_KEY, FLUSH_ID_FIELD, uuid.uuid4().hex)
+    snapshot = {
+        field.decode(): value.decode()
+        for field, value in client.hgetall(FLUSHING_KEY).items()
+    }
+    flush_id = snapshot.pop(FLUSH_ID_FIELD)
+
+    applied = EngagementFlush.objects.filter(flush_id=flush_id).first()
+    if applied is not None:
+        # Committed by a flush that crashed before cleaning up
+        updated, unmatched = 0, applied.unmatched
+    else:
+        try:
+            updated, unmatched = apply_snapshot(flush_id, snapshot)
+        except IntegrityError:
+            logger.info(f"Engagement flush {flush_id} is applied by another worker")
+            return 0
+
+    # Only WebSocket clicks are ever retried
+    matched = [
+        field
+        for field in snapshot
+        if field.startswith("response:") and field not in unmatched
+    ]
+    script = client.register_script(FINISH_SCRIPT)
+    dropped = script(
+        keys=[FLUSHING_KEY, PENDING_KEY, RETRIES_KEY],
+        args=[
+            flush_id,
+            settings.CHAT_ENGAGEMENT_FLUSH_RETRIES,
+            json.dumps(unmatched),
+            json.dumps(matched),
+        ],
+    )
+    if dropped:
+        logger.warning(
+            f"Dropped {dropped} click counts on messages that were never written"
+        )
+
+    EngagementFlush.objects.filter(
+        created_at__lt=timezone.now() - FLUSH_RECORD_TTL
+    ).delete()
+    return updated
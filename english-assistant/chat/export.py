@@ -0,0 +1,176 @@
+"""
+Chat history exports as JSON, NDJSON or CSV.
+
+Messages are read with ``iterator()`` in chunks of CHAT_EXPORT_CHUNK_SIZE and
+rendered one at a time into text chunks of about EXPORT_BUFFER_BYTES, so
+memory stays flat however long the history is. Views stream the chunks to
+the client; the export_chat_history task gzips them into media storage and
+emails a link.
+"""
+
+import csv
+import gzip
+import json
+import secrets
+import tempfile
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.handlers.asgi import ASGIRequest
+from django.utils import timezone
+from rest_framework.utils.encoders import JSONEncoder
+
+from .models import Message
+from .serializers import MessageSerializer
+
+EXPORT_FORMATS = {
+    "json": "application/json",
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+CSV_FIELDS = [
+    "id",
+    "created_at",
+    "sender_type",
+    "message_type",
+    "content",
+    "transcription",
+    "audio_duration",
+    "response_id",
+    "session_id",
+    "truncated",
+    "thumb_up",
+    "thumb_down",
+]
+
+EXPORT_BUFFER_BYTES = 64 * 1024
+
+
+def dumps(data) -> str:
+    """Encode like DRF's JSONRenderer, so the JSON export is unchanged"""
+    return json.dumps(data, cls=JSONEncoder, ensure_ascii=False, separators=(",", ":"))
+
+
+def export_messages(user, grammar):
+    return Message.objects.filter(
+        user=user, grammar=grammar, deleted_at__isnull=True
+    ).order_by("created_at", "id")
+
+
+def serialized(messages):
+    # One serializer for every message, as MessageSerializer(many=True) does
+    serializer = MessageSerializer()
+    messages = messages.select_related("user", "grammar")
+    for message in messages.iterator(chunk_size=settings.CHAT_EXPORT_CHUNK_SIZE):
+        yield serializer.to_representation(message)
+
+
+def render_json(grammar, messages):
+    header = {"grammar_topic": grammar.title, "export_date": timezone.now().isoformat()}
+    # The count is only known at the end, so it follows the messages
+    yield dumps(header)[:-1] + ',"messages":['
+    total = 0
+    for data in serialized(messages):
+        yield ("," if total else "") + dumps(data)
+        total += 1
+    yield f'],"total_messages":{total}}}'
+
+
+def render_ndjson(grammar, messages):
+    for data in serialized(messages):
+        yield dumps(data) + "\n"
+
+
+class Echo:
+    """A file-like object csv.writer writes rows back out of"""
+
+    def write(self, value):
+        return value
+
+
+def render_csv(grammar, messages):
+    writer = csv.writer(Echo())
+    yield writer.writerow(CSV_FIELDS)
+    rows = messages.values_list(*CSV_FIELDS).iterator(
+        chunk_size=settings.CHAT_EXPORT_CHUNK_SIZE
+    )
+    for row in rows:
+        yield writer.writerow(row)
+
+
+RENDERERS = {"json": render_json, "ndjson": render_ndjson, "csv": render_csv}
+
+
+def render(export_format: str, user, grammar):
+    """The export as text chunks of about EXPORT_BUFFER_BYTES"""
+    buffer = []
+    size = 0
+    for part in RENDERERS[export_format](grammar, export_messages(user, grammar)):
+        buffer.append(part)
+        size += len(part)
+        if size >= EXPORT_BUFFER_BYTES:
+            yield "".join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield "".join(buffer)
+
+
+async def aiter_chunks(chunks):
+    # Every chunk is produced in the same thread, as the database cursor needs
+    next_chunk = sync_to_async(next)
+    while (chunk := await next_chunk(chunks, None)) is not None:
+        yield chunk
+
+
+def streaming_content(request, chunks):
+    """
+    Iterate ``chunks`` the way the server consumes responses: Django turns a
+    sync iterator into a list under ASGI and an async one under WSGI.
+    """
+    if isinstance(request, ASGIRequest):
+        return aiter_chunks(chunks)
+    return chunks
+
+
+def filename(grammar, export_format: str) -> str:
+    return (
+        f"chat-history-{grammar.id}-{timezone.localdate().isoformat()}.{export_format}"
+    )
+
+
+def write_archive(user, grammar, export_format: str) -> str:
+    """Write a gzipped export to media storage, returns its storage name"""
+    # The random part keeps other users from guessing the public media URL
+    name = (
+        f"{settings.CHAT_EXPORT_DIR}/"
+        f"{secrets.token_urlsafe(16)}-{filename(grammar, export_format)}.gz"
+    )
+    with tempfile.TemporaryFile() as raw:
+        with gzip.GzipFile(fileobj=raw, mode="wb") as archive:
+            for chunk in render(export_format, user, grammar):
+                archive.write(chunk.encode())
+        raw.seek(0)
+        return default_storage.save(name, File(raw))
+
+
+def purge_archives() -> int:
+    """Delete archives older than CHAT_EXPORT_TTL, returns how many"""
+    if not default_storage.exists(settings.CHAT_EXPORT_DIR):
+        return 0
+    expired = timezone.now() - timedelta(seconds=settings.CHAT_EXPORT_TTL)
+    deleted = 0
+    _, files = default_storage.listdir(settings.CHAT_EXPORT_DIR)
+    for name in files:
+        path = f"{settings.CHAT_EXPORT_DIR}/{name}"
+        try:
+            if default_storage.get_modified_time(path) < expired:
+                default_storage.delete(path)
+                deleted += 1
+        except FileNotFoundError:
+            continue
+    return deleted
@@ -0,0 +1,269 @@
+import asyncio
+import json
+import statistics
+import time
+from types import SimpleNamespace
+
+from asgiref.testing import ApplicationCommunicator
+from channels.db import database_sync_to_async
+from channels.generic.websocket import WebsocketConsumer
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from chat.consumer import ChatConsumer
+from reusable.llm_router import LLMRouter, Provider
+
+STUB_ANSWER = (
+    "The present perfect connects the past with the present. We form it with "
+    "have or has and the past participle, for example: I have visited London."
+)
+
+
+def make_chunk(part):
+    """Build an object shaped like an OpenAI streaming chunk"""
+    return SimpleNamespace(
+        choices=[SimpleNamespace(delta=SimpleNamespace(content=part))], usage=None
+    )
+
+
+def split_tokens(text):
+    """Split the stub answer into small deltas, like the real API does"""
+    return [text[i : i + 3] for i in range(0, len(text), 3)]
+
+
+class AsyncStubStream:
+    def __init__(self, ttft, token_delay):
+        self.ttft = ttft
+        self.token_delay = token_delay
+
+    async def __aiter__(self):
+        await asyncio.sleep(self.ttft)
+        for part in split_tokens(STUB_ANSWER):
+            yield make_chunk(part)
+            await asyncio.sleep(self.token_delay)
+
+
+class AsyncStubLLM:
+    """Stands in for ``AsyncOpenAI`` with a fixed TTFT and token rate"""
+
+    def __init__(self, ttft, token_delay):
+        async def create(**kwargs):
+            return AsyncStubStream(ttft, token_delay)
+
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=create))
+
+
+def sync_stub_stream(ttft, token_delay):
+    time.sleep(ttft)
+    for part in split_tokens(STUB_ANSWER):
+        yield make_chunk(part)
+        time.sleep(token_delay)
+
+
+class BenchChatConsumer(ChatConsumer):
+    """ChatConsumer with the LLM stubbed and DB calls replaced by short sleeps"""
+
+    ttft = 0.3
+    token_delay = 0.01
+    db_latency = 0.002
+
+    async def connect(self):
+        await super().connect()
+        stub = AsyncStubLLM(self.ttft, self.token_delay)
+        self.router = LLMRouter([Provider(name="stub", model="stub", client=stub)])
+
+    async def fake_db_call(self, result=None):
+        await database_sync_to_async(time.sleep)(self.db_latency)
+        return result
+
+    async def get_grammar(self):
+        return await self.fake_db_call((None, "You are an English AI assistant."))
+
+    async def restore_conversation(self):
+        return await self.fake_db_call()
+
+    async def save_conversation(self):
+        return None
+
+    async def get_profile_settings(self):
+        return await self.fake_db_call(("UTC", 1000))
+
+    async def enqueue_message(self, **fields):
+        return await self.fake_db_call()
+
+    async def record_turn_metrics(self, speech=None):
+        self.turn_metrics.updates.clear()
+
+
+class SyncBaselineConsumer(WebsocketConsumer):
+    """Mirror of the previous sync consumer: one pool thread per streamed turn"""
+
+    ttft = 0.3
+    token_delay = 0.01
+    db_latency = 0.002
+
+    def connect(self):
+        time.sleep(self.db_latency)
+        self.accept()
+
+    def receive(self, text_data=None, bytes_data=None):
+        time.sleep(self.db_latency)
+        response_id = "bench"
+        for chunk in sync_stub_stream(self.ttft, self.token_delay):
+            part = chunk.choices[0].delta.content
+            self.send(json.dumps({"error": False, "message": part, "id": response_id}))
+        self.send(json.dumps({"error": False, "message": "completed."}))
+        time.sleep(self.db_latency)
+
+
+async def run_session(application, user, timeout):
+    """Open one socket, ask one question and time the streamed answer"""
+    scope = {
+        "type": "websocket",
+        "path": "/chat/1/",
+        "query_string": b"",
+        "headers": [],
+        "subprotocols": [],
+        "url_route": {"args": (), "kwargs": {"uid": "1"}},
+        "user": user,
+    }
+    communicator = ApplicationCommunicator(application, scope)
+    await communicator.send_input({"type": "websocket.connect"})
+    accepted = await communicator.receive_output(timeout)
+    if accepted["type"] != "websocket.accept":
+        raise RuntimeError(f"Connection was not accepted: {accepted}")
+
+    started = time.perf_counter()
+    await communicator.send_input(
+        {"type": "websocket.receive", "text": json.dumps({"data": "What is it?"})}
+    )
+    ttft = None
+    frames = 0
+    while True:
+        output = await communicator.receive_output(timeout)
+        payload = json.loads(output["text"])
+        if payload.get("message") == "completed.":
+            break
+        frames += 1
+        if ttft is None:
+            ttft = time.perf_counter() - started
+    total = time.perf_counter() - started
+
+    await communicator.send_input({"type": "websocket.disconnect", "code": 1000})
+    await communicator.wait(timeout)
+    return ttft, total, frames
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class Command(BaseCommand):
+    help = "Benchmark concurrent chat sessions against a stubbed LLM"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sessions", type=int, default=200, help="Concurrent WebSocket sessions"
+        )
+        parser.add_argument(
+            "--ttft", type=float, default=0.3, help="Stub time to first token (s)"
+        )
+        parser.add_argument(
+            "--token-delay",
+            type=float,
+            default=0.01,
+            help="Stub delay between streamed deltas (s)",
+        )
+        parser.add_argument(
+            "--db-latency",
+            type=float,
+            default=0.002,
+            help="Simulated duration of each short DB call (s)",
+        )
+        parser.add_argument(
+            "--timeout", type=float, default=600, help="Per-frame receive timeout (s)"
+        )
+        parser.add_argument(
+            "--flush-interval-ms",
+            type=int,
+            default=None,
+            help="Frame coalescing window (defaults to the setting)",
+        )
+        parser.add_argument(
+            "--skip-sync",
+            action="store_true",
+            help="Only run the async consumer",
+        )
+
+    def handle(self, *args, **options):
+        for consumer_class in (BenchChatConsumer, SyncBaselineConsumer):
+            consumer_class.ttft = options["ttft"]
+            consumer_class.token_delay = options["token_delay"]
+            consumer_class.db_latency = options["db_latency"]
+
+        user = User(id=1, username="bench", email="bench@example.com")
+        flush_interval = options["flush_interval_ms"]
+        if flush_interval is None:
+            flush_interval = settings.CHAT_STREAM_FLUSH_INTERVAL_MS
+        targets = [
+            ("async ChatConsumer, coalesced frames", BenchChatConsumer, flush_interval),
+            ("async ChatConsumer, frame per delta", BenchChatConsumer, 0),
+        ]
+        if not options["skip_sync"]:
+            targets.append(("sync baseline", SyncBaselineConsumer, 0))
+
+        in_memory_layer = {
+            "default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}
+        }
+        for label, consumer_class, interval in targets:
+            with override_settings(
+                CHANNEL_LAYERS=in_memory_layer,
+                CHAT_ANSWER_CACHE_ENABLED=False,
+                CHAT_STREAM_FLUSH_INTERVAL_MS=interval,
+                CHAT_LLM_HEALTH_INTERVAL=0,
+                CHAT_QUOTA_ENABLED=False,
+                # Every session belongs to the same bench user
+                CHAT_MAX_CONCURRENT_TURNS=options["sessions"],
+                CHAT_MAX_CONCURRENT_TURNS_PER_USER=options["sessions"],
+            ):
+                self.run_target(label, consumer_class, user, options)
+
+    def run_target(self, label, consumer_class, user, options):
+        application = consumer_class.as_asgi()
+        sessions = options["sessions"]
+
+        async def run_all():
+            started = time.perf_counter()
+            results = await asyncio.gather(
+                *(
+                    run_session(application, user, options["timeout"])
+                    for _ in range(sessions)
+                )
+            )
+            return results, time.perf_counter() - started
+
+        cpu_started = time.process_time()
+        results, wall = asyncio.run(run_all())
+        cpu = time.process_time() - cpu_started
+        ttfts = [ttft for ttft, _, _ in results]
+        totals = [total for _, total, _ in results]
+        frames = [count for _, _, count in results]
+
+        self.stdout.write(self.style.SUCCESS(f"{label}: {sessions} sessions"))
+        self.stdout.write(f"  wall time:        {wall:.2f} s")
+        self.stdout.write(f"  sessions/sec:     {sessions / wall:.1f}")
+        self.stdout.write(
+            f"  TTFT p50/p95/p99: {percentile(ttfts, 50):.3f} / "
+            f"{percentile(ttfts, 95):.3f} / {percentile(ttfts, 99):.3f} s"
+        )
+        self.stdout.write(
+            f"  turn p50/p95:     {statistics.median(totals):.3f} / "
+            f"{percentile(totals, 95):.3f} s"
+        )
+        self.stdout.write(f"  frames/answer:    {statistics.mean(frames):.1f}")
+        # Includes the benchmark's own client side, compare runs relatively
+        self.stdout.write(f"  CPU/session:      {cpu / sessions * 1000:.2f} ms")
@@ -0,0 +1,147 @@
+import random
+import statistics
+import time
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory, override_settings
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from chat.models import Message
+from chat.row_serializers import (
+    ChatHistoryRowSerializer,
+    ChatHistorySearchRowSerializer,
+    MessageRowSerializer,
+)
+from chat.search import HIGHLIGHT_START, HIGHLIGHT_STOP
+from chat.serializers import (
+    ChatHistorySearchSerializer,
+    ChatHistorySerializer,
+    MessageSerializer,
+)
+from grammar.models import Grammar
+
+TARGETS = [
+    ("history", ChatHistorySerializer, ChatHistoryRowSerializer),
+    ("history search", ChatHistorySearchSerializer, ChatHistorySearchRowSerializer),
+    ("all history", MessageSerializer, MessageRowSerializer),
+]
+
+
+def make_rows(count: int, audio_share: float, user, grammar) -> list:
+    """A page of message rows as ``.values()`` returns them, newest first"""
+    now = timezone.now()
+    rows = []
+    for index in range(count):
+        audio = random.random() < audio_share
+        sender_type = "user" if index % 2 else "ai"
+        created_at = now - timedelta(seconds=index * 7, microseconds=index)
+        rows.append(
+            {
+                "id": count - index,
+                "user_id": user.id,
+                "grammar_id": grammar.id,
+                "grammar__title": grammar.title,
+                "content": "[voice message]" if audio else f"Message {index} " * 20,
+                "transcription": f"Spoken message {index}" if audio else None,
+                "message_type": "audio" if audio else "text",
+                "sender_type": sender_type,
+                "audio_file": f"chat_audio/2026/01/01/{index}.wav" if audio else "",
+                "audio_duration": 2.5 if audio else None,
+                "response_id": f"resp-{index}" if sender_type == "ai" else None,
+                "session_id": "bench-session",
+                "user_timezone": "UTC",
+                "truncated": False,
+                "thumb_up": index % 3,
+                "thumb_down": index % 2,
+                "created_at": created_at,
+                "updated_at": created_at,
+                "rank": 0.5 / (index + 1),
+                "headline": f"{HIGHLIGHT_START}Message{HIGHLIGHT_STOP} {index} <b>",
+            }
+        )
+    return rows
+
+
+def make_message(row: dict, user, grammar) -> Message:
+    """The model instance the ORM would load for ``row``"""
+    fields = {
+        name: value
+        for name, value in row.items()
+        if name not in ("grammar__title", "rank", "headline")
+    }
+    message = Message(**fields)
+    message.user = user
+    message.grammar = grammar
+    message.rank = row["rank"]
+    message.headline = row["headline"]
+    return message
+
+
+def time_per_page(serialize, iterations: int) -> float:
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        serialize()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the DRF serializers of the history endpoints with the row "
+        "serializers on an in-memory page, and check their output is identical"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=200, help="Rows per page")
+        parser.add_argument(
+            "--iterations", type=int, default=50, help="Pages serialized per target"
+        )
+        parser.add_argument(
+            "--audio-share",
+            type=float,
+            default=0.2,
+            help="Share of voice messages on the page",
+        )
+
+    def handle(self, *args, **options):
+        random.seed(0)
+        user = User(
+            id=1,
+            username="bench@example.com",
+            email="bench@example.com",
+            first_name="Bench",
+            last_name="User",
+        )
+        grammar = Grammar(id=1, title="Present Perfect")
+        rows = make_rows(options["rows"], options["audio_share"], user, grammar)
+        messages = [make_message(row, user, grammar) for row in rows]
+
+        with override_settings(ALLOWED_HOSTS=["testserver"]):
+            request = Request(RequestFactory().get("/api/v1/cht/history/1/"))
+            request.user = user
+            for label, serializer_class, row_serializer_class in TARGETS:
+                self.run_target(
+                    label,
+                    lambda: serializer_class(
+                        messages, many=True, context={"request": request}
+                    ).data,
+                    lambda: row_serializer_class(user, request).serialize(rows),
+                    options,
+                )
+
+    def run_target(self, label, serialize_drf, serialize_rows, options):
+        renderer = JSONRenderer()
+        if renderer.render(serialize_drf()) != renderer.render(serialize_rows()):
+            raise CommandError(f"{label}: the row serializer output differs")
+
+        drf = time_per_page(serialize_drf, options["iterations"])
+        fast = time_per_page(serialize_rows, options["iterations"])
+        self.stdout.write(self.style.SUCCESS(f"{label} ({options['rows']} rows)"))
+        self.stdout.write(f"  DRF serializer:  {drf * 1000:8.2f} ms per page")
+        self.stdout.write(f"  row serializer:  {fast * 1000:8.2f} ms per page")
+        self.stdout.write(f"  speedup:         {drf / fast:8.1f}x, output identical")
@@ -0,0 +1,379 @@
+import asyncio
+import base64
+import io
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import wave
+from collections import Counter
+from dataclasses import dataclass, field
+
+import uvicorn
+import websockets
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework_simplejwt.tokens import AccessToken
+
+from chat.management.commands.bench_chat_consumer import percentile
+from grammar.models import Grammar
+from reusable.stub_llm import StubLLMServer
+
+PROMPTS = [
+    "What is the present perfect?",
+    "Can you give me three examples?",
+    "When should I use the past simple instead?",
+    "Is 'I have seen him yesterday' correct?",
+    "Give me a short exercise to practice.",
+]
+
+END_MESSAGES = ("completed.", "cancelled.", "audio-completed.")
+
+
+def silent_wav(seconds=1.0, rate=16000) -> bytes:
+    """A mono 16-bit WAV of silence, sent as the scripted voice message"""
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes(bytes(int(seconds * rate) * 2))
+    return buffer.getvalue()
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port: int, timeout: float) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1):
+                return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+@dataclass
+class SessionResult:
+    connect_time: float = None
+    ttfts: list = field(default_factory=list)
+    turn_times: list = field(default_factory=list)
+    frames: int = 0
+    errors: Counter = field(default_factory=Counter)
+
+
+async def run_turn(ws, payload: dict, result: SessionResult):
+    """Send one message and read frames until its answer is complete"""
+    sent = time.perf_counter()
+    await ws.send(json.dumps(payload))
+    answered = False
+    while True:
+        frame = await ws.recv()
+        result.frames += 1
+        if isinstance(frame, bytes):
+            continue
+        data = json.loads(frame)
+        message = data.get("message")
+        if data.get("error"):
+            result.errors[data.get("code", "error")] += 1
+            # Errors before the answer, or without a code, end the turn
+            if not answered or "code" not in data:
+                return
+            continue
+        if "id" in data and message not in END_MESSAGES:
+            if not answered:
+                result.ttfts.append(time.perf_counter() - sent)
+                answered = True
+            continue
+        # Voice turns finish with their narration, and a voice message is
+        # echoed with a completed frame of its own before the answer starts
+        end = "audio-completed." if payload.get("voice") else "completed."
+        if answered and message == end:
+            result.turn_times.append(time.perf_counter() - sent)
+            return
+
+
+async def run_session(url: str, options: dict, audio_payload: str, delay: float):
+    """Connect, play the turn script and collect the session's timings"""
+    result = SessionResult()
+    await asyncio.sleep(delay)
+    started = time.perf_counter()
+    try:
+        ws = await websockets.connect(
+            url, open_timeout=options["timeout"], max_size=None
+        )
+    except Exception as e:
+        result.errors[f"connect {type(e).__name__}"] += 1
+        return result
+    result.connect_time = time.perf_counter() - started
+
+    async with ws:
+        for turn in range(options["turns"]):
+            audio_every = options["audio_every"]
+            if audio_every and (turn + 1) % audio_every == 0:
+                payload = {"audio": audio_payload}
+            else:
+                payload = {"data": PROMPTS[turn % len(PROMPTS)]}
+            if options["voice"]:
+                payload["voice"] = True
+            try:
+                await asyncio.wait_for(
+                    run_turn(ws, payload, result), options["timeout"]
+                )
+            except asyncio.TimeoutError:
+                result.errors["turn timeout"] += 1
+                break
+            except websockets.ConnectionClosed as e:
+                result.errors[f"closed {e.rcvd.code if e.rcvd else 'abnormally'}"] += 1
+                break
+            if options["think_time"]:
+                await asyncio.sleep(options["think_time"])
+    return result
+
+
+class Command(BaseCommand):
+    help = (
+        "Load test the ASGI application with concurrent WebSocket chats against "
+        "a local stub LLM server"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sessions", type=int, default=50, help="Concurrent WebSocket sessions"
+        )
+        parser.add_argument(
+            "--users",
+            type=int,
+            default=None,
+            help="Distinct users the sessions are spread over (default: one each)",
+        )
+        parser.add_argument(
+            "--turns", type=int, default=3, help="Messages sent by each session"
+        )
+        parser.add_argument(
+            "--audio-every",
+            type=int,
+            default=0,
+            help="Send every Nth message as a voice message (0: text only)",
+        )
+        parser.add_argument(
+            "--voice", action="store_true", help="Ask for narrated answers"
+        )
+        parser.add_argument(
+            "--think-time", type=float, default=0, help="Pause between turns (s)"
+        )
+        parser.add_argument(
+            "--ramp", type=float, default=0, help="Spread the connects over (s)"
+        )
+        parser.add_argument(
+            "--timeout", type=float, default=60, help="Connect and per-turn timeout (s)"
+        )
+        parser.add_argument(
+            "--grammar", type=int, default=None, help="Grammar to chat about"
+        )
+        parser.add_argument(
+            "--ttft", type=float, default=0.3, help="Stub time to first token (s)"
+        )
+        parser.add_argument(
+            "--token-delay",
+            type=float,
+            default=0.02,
+            help="Stub delay between streamed deltas (s)",
+        )
+        parser.add_argument(
+            "--error-rate",
+            type=float,
+            default=0,
+            help="Share of stub requests failing with a 500 error",
+        )
+        parser.add_argument(
+            "--workers", type=int, default=1, help="uvicorn workers of the target"
+        )
+        parser.add_argument(
+            "--url",
+            default=None,
+            help=(
+                "Test a running server (e.g. ws://127.0.0.1:9080) instead of "
+                "starting one. Its LLM base URLs must point at the stub."
+            ),
+        )
+        parser.add_argument(
+            "--stub-port",
+            type=int,
+            default=0,
+            help="Port of the stub LLM server (default: any free port)",
+        )
+
+    def handle(self, *args, **options):
+        grammar = self.get_grammar(options["grammar"])
+        tokens = self.mint_tokens(options["users"] or options["sessions"])
+
+        stub = StubLLMServer(
+            ttft=options["ttft"],
+            token_delay=options["token_delay"],
+            error_rate=options["error_rate"],
+        )
+        stub_server, stub_url = self.start_stub(stub, options["stub_port"])
+        self.stdout.write(f"Stub LLM server at {stub_url}")
+
+        process = None
+        base_url = options["url"]
+        try:
+            if base_url is None:
+                process, base_url = self.start_target(stub_url, options)
+            base_url = base_url.rstrip("/")
+            urls = [
+                f"{base_url}/chat/{grammar.id}/?token={tokens[i % len(tokens)]}"
+                for i in range(options["sessions"])
+            ]
+            audio_payload = "data:audio/wav;base64," + base64.b64encode(
+                silent_wav()
+            ).decode("ascii")
+            results, wall = asyncio.run(self.run_all(urls, options, audio_payload))
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait(timeout=30)
+            stub_server.should_exit = True
+
+        self.report(results, wall, stub, options)
+
+    def get_grammar(self, grammar_id):
+        grammars = Grammar.objects.filter(deleted_at__isnull=True)
+        if grammar_id is not None:
+            grammars = grammars.filter(id=grammar_id)
+        grammar = grammars.order_by("id").first()
+        if grammar is None:
+            raise CommandError("No grammar to chat about, create one first")
+        return grammar
+
+    def mint_tokens(self, count: int) -> list:
+        """Access tokens for ``count`` load test users, created if missing"""
+        tokens = []
+        for index in range(count):
+            email = f"loadtest-{index}@example.com"
+            user, created = User.objects.get_or_create(
+                username=email, defaults={"email": email}
+            )
+            if created:
+                user.set_unusable_password()
+                user.save(update_fields=["password"])
+            tokens.append(str(AccessToken.for_user(user)))
+        return tokens
+
+    def start_stub(self, stub: StubLLMServer, port: int) -> tuple:
+        """Serve the stub from a background thread on its own event loop"""
+        sock = socket.socket()
+        sock.bind(("127.0.0.1", port))
+        server = uvicorn.Server(
+            uvicorn.Config(stub, log_level="warning", lifespan="off")
+        )
+        thread = threading.Thread(
+            target=server.run, kwargs={"sockets": [sock]}, daemon=True
+        )
+        thread.start()
+        port = sock.getsockname()[1]
+        if not wait_for_port(port, timeout=10):
+            raise CommandError("The stub LLM server did not start")
+        return server, f"http://127.0.0.1:{port}/v1"
+
+    def start_target(self, stub_url: str, options: dict) -> tuple:
+        """Run the ASGI application under uvicorn with its LLMs on the stub"""
+        port = free_port()
+        env = {
+            **os.environ,
+            "OPENAI_BASE_URL": stub_url,
+            "DEEPSEEK_BASE_URL": stub_url,
+            "METIS_BASE_URL": stub_url,
+            # Measure streamed answers, not cache hits or quota rejections
+            "CHAT_ANSWER_CACHE_ENABLED": "false",
+            "CHAT_QUOTA_ENABLED": "false",
+        }
+        process = subprocess.Popen(
+            [
+                sys.executable,
+                "-m",
+                "uvicorn",
+                "english-assistant.asgi:application",
+                "--host",
+                "127.0.0.1",
+                "--port",
+                str(port),
+                "--workers",
+                str(options["workers"]),
+                "--log-level",
+                "warning",
+            ],
+            cwd=settings.BASE_DIR,
+            env=env,
+        )
+        if not wait_for_port(port, timeout=60):
+            process.terminate()
+            raise CommandError("The ASGI application did not start")
+        self.stdout.write(f"ASGI application at ws://127.0.0.1:{port}")
+        return process, f"ws://127.0.0.1:{port}"
+
+    async def run_all(self, urls: list, options: dict, audio_payload: str) -> tuple:
+        step = options["ramp"] / len(urls) if urls else 0
+        started = time.perf_counter()
+        results = await asyncio.gather(
+            *(
+                run_session(url, options, audio_payload, index * step)
+                for index, url in enumerate(urls)
+            )
+        )
+        return results, time.perf_counter() - started
+
+    def report(self, results: list, wall: float, stub: StubLLMServer, options):
+        connects = [r.connect_time for r in results if r.connect_time is not None]
+        ttfts = [ttft for r in results for ttft in r.ttfts]
+        turn_times = [turn for r in results for turn in r.turn_times]
+        frames = sum(r.frames for r in results)
+        errors = sum((r.errors for r in results), Counter())
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{options['sessions']} sessions x {options['turns']} turns "
+                f"in {wall:.2f} s"
+            )
+        )
+        self.stdout.write(f"  connected:          {len(connects)}/{len(results)}")
+        if connects:
+            self.stdout.write(
+                f"  connect p50/p95/p99: {percentile(connects, 50):.3f} / "
+                f"{percentile(connects, 95):.3f} / {percentile(connects, 99):.3f} s"
+            )
+        self.stdout.write(
+            f"  turns answered:     {len(turn_times)}/"
+            f"{options['sessions'] * options['turns']}"
+        )
+        if ttfts:
+            self.stdout.write(
+                f"  TTFT p50/p95/p99:   {percentile(ttfts, 50):.3f} / "
+                f"{percentile(ttfts, 95):.3f} / {percentile(ttfts, 99):.3f} s"
+            )
+        if turn_times:
+            self.stdout.write(
+                f"  turn p50/p95:       {statistics.median(turn_times):.3f} / "
+                f"{percentile(turn_times, 95):.3f} s"
+            )
+        self.stdout.write(f"  frames/sec:         {frames / wall:.1f}")
+        self.stdout.write(
+            f"  stub requests:      {stub.requests} ({stub.errors} failed on purpose)"
+        )
+        if errors:
+            self.stdout.write(self.style.WARNING("  errors:"))
+            for kind, count in errors.most_common():
+                self.stdout.write(f"    {kind}: {count}")
+        else:
+            self.stdout.write("  errors:             none")
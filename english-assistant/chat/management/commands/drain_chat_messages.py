@@ -0,0 +1,50 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from chat import persistence
+
+
+class Command(BaseCommand):
+    help = "Write chat messages queued in the Redis stream to the database"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=None, help="Records per bulk insert"
+        )
+        parser.add_argument(
+            "--block-ms",
+            type=int,
+            default=1000,
+            help=(
+                "How long to wait for new records before polling again, "
+                "below REDIS_SOCKET_TIMEOUT"
+            ),
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Drain what is queued and exit instead of running forever",
+        )
+
+    def handle(self, *args, **options):
+        if options["once"]:
+            written = persistence.drain_all(options["batch_size"])
+            self.stdout.write(f"Wrote {written} messages")
+            return
+
+        # Run as the only drainer, the Celery task skips while we hold the lock
+        timeout = settings.CHAT_WRITE_BEHIND_LOCK_TIMEOUT
+        lock = persistence.get_redis().lock(persistence.LOCK_KEY, timeout=timeout)
+        self.stdout.write("Waiting for the drain lock...")
+        lock.acquire()
+        self.stdout.write("Draining chat messages, press Ctrl+C to stop")
+        try:
+            while True:
+                written = persistence.drain(options["batch_size"], options["block_ms"])
+                if written:
+                    self.stdout.write(f"Wrote {written} messages")
+                lock.extend(timeout, replace_ttl=True)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            lock.release()
@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from chat import rollups
+
+
+class Command(BaseCommand):
+    help = "Rebuild the daily chat statistics from the messages"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=settings.CHAT_STATS_RECONCILE_DAYS,
+            help="How many past days to rebuild",
+        )
+        parser.add_argument(
+            "--all", action="store_true", help="Rebuild the whole history"
+        )
+
+    def handle(self, *args, **options):
+        written = rollups.reconcile(None if options["all"] else options["days"])
+        self.stdout.write(f"Wrote {written} daily statistics rows")
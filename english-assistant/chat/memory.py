@@ -0,0 +1,208 @@
+import asyncio
+import json
+import logging
+import zlib
+from collections import deque
+from dataclasses import dataclass
+
+from django.conf import settings
+
+from reusable.redis_client import get_async_redis
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PROMPT = (
+    "You maintain a short running summary of a conversation between an English "
+    "learner and an AI assistant. Merge the new messages into the existing "
+    "summary. Keep the learner's goals, mistakes and the explanations already "
+    "given. Answer with the updated summary only."
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate, roughly four characters per token for English"""
+    return len(text) // 4 + 1
+
+
+def truncate_to_tokens(text: str, max_tokens: int, keep_tail: bool = False) -> str:
+    """Cut text down to roughly ``max_tokens`` tokens"""
+    max_chars = max_tokens * 4
+    if len(text) <= max_chars:
+        return text
+    return text[-max_chars:] if keep_tail else text[:max_chars]
+
+
+@dataclass
+class Turn:
+    role: str  # "user" or "assistant"
+    content: str
+    tokens: int
+
+
+class ConversationMemory:
+    """
+    Rolling conversation memory with a hard token budget.
+
+    The last ``keep_turns`` messages are kept verbatim. Older messages are
+    folded into a running summary by ``summarize``, an async callable taking
+    the current summary and the evicted turns. Summarization runs as a
+    background task so it never delays the answer that is being streamed.
+    """
+
+    def __init__(
+        self, summarize, token_budget=None, keep_turns=None, summary_tokens=None
+    ):
+        self.summarize = summarize
+        self.token_budget = token_budget or settings.CHAT_MEMORY_TOKEN_BUDGET
+        self.keep_turns = keep_turns or settings.CHAT_MEMORY_KEEP_TURNS
+        self.summary_tokens = summary_tokens or settings.CHAT_MEMORY_SUMMARY_TOKENS
+        self.turns = deque()
+        self.turn_tokens = 0
+        self.summary = ""
+        self.pending = []
+        self._summary_task = None
+
+    @property
+    def window_budget(self) -> int:
+        """Tokens available for verbatim turns after reserving the summary"""
+        return max(self.token_budget - self.summary_tokens, 1)
+
+    def add(self, role: str, content: str):
+        """Append a turn and evict the oldest ones beyond the budget"""
+        turn = Turn(role, content, estimate_tokens(content))
+        self.turns.append(turn)
+        self.turn_tokens += turn.tokens
+        self.evict()
+
+    def evict(self):
+        # Always keep the newest turn, it is the message being answered
+        while len(self.turns) > 1 and (
+            len(self.turns) > self.keep_turns or self.turn_tokens > self.window_budget
+        ):
+            turn = self.turns.popleft()
+            self.turn_tokens -= turn.tokens
+            self.pending.append(turn)
+
+        if self.pending:
+            self.schedule_summary()
+
+    def schedule_summary(self):
+        if self._summary_task and not self._summary_task.done():
+            # The running task picks up whatever is pending when it loops
+            return
+        self._summary_task = asyncio.ensure_future(self.fold_pending())
+
+    def transcript_summary(self, turns: list) -> str:
+        """The summary followed by ``turns`` verbatim, keeping the most recent text"""
+        text = "\n".join([self.summary] + [f"{t.role}: {t.content}" for t in turns])
+        return truncate_to_tokens(text.strip(), self.summary_tokens, keep_tail=True)
+
+    async def fold_pending(self):
+        """
+        Fold evicted turns into the running summary until none are left. A
+        batch stays pending until its summary is assigned, so a cancelled
+        summarization leaves it in the saved state.
+        """
+        while self.pending:
+            batch = list(self.pending)
+            try:
+                summary = await self.summarize(self.summary, batch)
+            except Exception as e:
+                logger.warning(f"Conversation summarization failed: {e}")
+                # Keep the most recent evicted text rather than losing it
+                summary = self.transcript_summary(batch)
+            self.summary = truncate_to_tokens(summary or "", self.summary_tokens)
+            # Turns evicted meanwhile are folded in the next round
+            del self.pending[: len(batch)]
+
+    async def close(self):
+        """Cancel a pending summarization, e.g. when the socket disconnects"""
+        if self._summary_task and not self._summary_task.done():
+            self._summary_task.cancel()
+
+    def to_bytes(self) -> bytes:
+        """Serialize the memory compactly for storage in Redis"""
+        state = {
+            "s": self.summary,
+            "t": [[turn.role[0], turn.content] for turn in self.turns],
+            "p": [[turn.role[0], turn.content] for turn in self.pending],
+        }
+        return zlib.compress(json.dumps(state, separators=(",", ":")).encode())
+
+    def restore(self, data: bytes):
+        """Load state produced by ``to_bytes`` into this memory"""
+        state = json.loads(zlib.decompress(data))
+        roles = {"u": "user", "a": "assistant"}
+        self.summary = state.get("s", "")
+        self.turns.clear()
+        self.turn_tokens = 0
+        for role, content in state.get("t", []):
+            self.add(roles[role], content)
+        self.pending.extend(
+            Turn(roles[role], content, estimate_tokens(content))
+            for role, content in state.get("p", [])
+        )
+        if self.pending:
+            self.schedule_summary()
+
+    def as_messages(self) -> list:
+        """
+        Chat messages for the summary and the verbatim turns, one message per
+        turn with its own role. They follow the system prompt, so the prompt
+        stays a stable prefix across turns.
+        """
+        messages = []
+        # Turns still being summarized are sent as text within the summary budget
+        summary = (
+            self.transcript_summary(self.pending) if self.pending else self.summary
+        )
+        if summary:
+            messages.append(
+                {
+                    "role": "system",
+                    "content": f"Summary of the earlier conversation: {summary}",
+                }
+            )
+
+        budget = self.window_budget
+        for turn in self.turns:
+            content = turn.content
+            if turn.tokens > budget:
+                # A single oversized message is trimmed to what still fits
+                content = truncate_to_tokens(content, budget, keep_tail=True)
+            messages.append({"role": turn.role, "content": content})
+        return messages
+
+    @staticmethod
+    def summary_messages(summary: str, turns: list) -> list:
+        """Build the chat messages used to fold ``turns`` into ``summary``"""
+        transcript = "\n".join(f"{turn.role}: {turn.content}" for turn in turns)
+        return [
+            {"role": "system", "content": SUMMARY_PROMPT},
+            {
+                "role": "user",
+                "content": f"Current summary:\n{summary or '(empty)'}\n\n"
+                f"New messages:\n{transcript}",
+            },
+        ]
+
+
+async def load_conversation_state(memory: ConversationMemory, key: str) -> bool:
+    """Rehydrate ``memory`` from Redis, returns False when nothing was stored"""
+    try:
+        data = await get_async_redis().get(key)
+        if not data:
+            return False
+        memory.restore(data)
+        return True
+    except Exception as e:
+        logger.warning(f"Could not load conversation state {key}: {e}")
+        return False
+
+
+async def save_conversation_state(memory: ConversationMemory, key: str):
+    """Store ``memory`` in Redis, refreshing the state TTL"""
+    try:
+        await get_async_redis().set(key, memory.to_bytes(), ex=settings.CHAT_STATE_TTL)
+    except Exception as e:
+        logger.warning(f"Could not save conversation state {key}: {e}")
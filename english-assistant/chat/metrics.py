@@ -0,0 +1,66 @@
+from reusable.metrics import Counter, Histogram, aapply_updates
+
+whisper_seconds = Histogram(
+    "chat_whisper_seconds", "Time spent transcribing a voice message"
+)
+db_save_seconds = Histogram(
+    "chat_db_save_seconds", "Time spent queueing a chat message for the database"
+)
+ttft_seconds = Histogram(
+    "chat_ttft_seconds", "Time from starting an answer to its first token"
+)
+stream_seconds = Histogram(
+    "chat_stream_seconds", "Time from starting an answer to its last token"
+)
+tokens_per_second = Histogram(
+    "chat_tokens_per_second",
+    "Streamed deltas per second after the first token",
+    buckets=(5, 10, 20, 30, 50, 75, 100, 150, 200, 300),
+)
+frames_per_answer = Histogram(
+    "chat_frames_per_answer",
+    "WebSocket frames sent for one answer",
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500),
+)
+tts_first_audio_seconds = Histogram(
+    "chat_tts_first_audio_seconds", "Time from starting narration to its first audio"
+)
+admission_wait_seconds = Histogram(
+    "chat_admission_wait_seconds", "Time a turn waited for an LLM slot"
+)
+cached_ttft_seconds = Histogram(
+    "chat_cached_ttft_seconds",
+    "Time to the first token of answers whose prompt prefix was cached",
+)
+turns_total = Counter("chat_turns_total", "Answered chat turns")
+rejected_turns_total = Counter(
+    "chat_rejected_turns_total", "Turns rejected because the worker was overloaded"
+)
+
+prompt_tokens_total = Counter(
+    "chat_prompt_tokens_total", "Prompt tokens billed for chat answers"
+)
+cached_prompt_tokens_total = Counter(
+    "chat_cached_prompt_tokens_total",
+    "Prompt tokens of chat answers served from the provider's prefix cache",
+)
+completion_tokens_total = Counter(
+    "chat_completion_tokens_total", "Completion tokens billed for chat answers"
+)
+
+
+class TurnMetrics:
+    """Observations collected during one chat turn and recorded together"""
+
+    def __init__(self):
+        self.updates = []
+
+    def observe(self, histogram: Histogram, value: float):
+        self.updates.extend(histogram.updates(value))
+
+    def count(self, counter: Counter, amount=1):
+        self.updates.extend(counter.updates(amount))
+
+    async def record(self):
+        updates, self.updates = self.updates + turns_total.updates(), []
+        await aapply_updates(updates)
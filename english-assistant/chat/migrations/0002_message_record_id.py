@@ -0,0 +1,24 @@
+# Generated by Django 5.1 on 2026-10-17 23:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("chat", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="message",
+            name="record_id",
+            field=models.UUIDField(
+                blank=True,
+                editable=False,
+                help_text="Write-behind record identifier, makes redelivery idempotent",
+                null=True,
+                unique=True,
+            ),
+        ),
+    ]
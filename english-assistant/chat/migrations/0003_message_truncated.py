@@ -0,0 +1,21 @@
+# Generated by Django 5.1 on 2026-10-17 23:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("chat", "0002_message_record_id"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="message",
+            name="truncated",
+            field=models.BooleanField(
+                default=False,
+                help_text="AI answer was cut short by a cancel or the word quota",
+            ),
+        ),
+    ]
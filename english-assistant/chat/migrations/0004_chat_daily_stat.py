@@ -0,0 +1,111 @@
+# Generated by Django 5.1 on 2026-10-18 00:01
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDate
+
+
+def backfill_daily_stats(apps, schema_editor):
+    """Count the existing messages, later writes update the rows themselves"""
+    Message = apps.get_model("chat", "Message")
+    ChatDailyStat = apps.get_model("chat", "ChatDailyStat")
+    rows = (
+        Message.objects.filter(deleted_at__isnull=True)
+        .annotate(day=TruncDate("created_at"))
+        .values("user_id", "grammar_id", "day")
+        .annotate(
+            user_messages=Count("id", filter=Q(sender_type="user")),
+            ai_messages=Count("id", filter=Q(sender_type="ai")),
+            text_messages=Count("id", filter=Q(message_type="text")),
+            audio_messages=Count("id", filter=Q(message_type="audio")),
+            thumbs_up=Sum("thumb_up", default=0),
+            thumbs_down=Sum("thumb_down", default=0),
+        )
+        .order_by()
+    )
+    ChatDailyStat.objects.bulk_create(
+        (
+            ChatDailyStat(
+                user_id=row["user_id"],
+                grammar_id=row["grammar_id"],
+                day=row["day"],
+                user_messages=row["user_messages"],
+                ai_messages=row["ai_messages"],
+                text_messages=row["text_messages"],
+                audio_messages=row["audio_messages"],
+                thumb_up=row["thumbs_up"],
+                thumb_down=row["thumbs_down"],
+            )
+            for row in rows.iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("chat", "0003_message_truncated"),
+        ("grammar", "0001_initial"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ChatDailyStat",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "day",
+                    models.DateField(
+                        help_text="Day the messages were sent, in TIME_ZONE"
+                    ),
+                ),
+                ("user_messages", models.IntegerField(default=0)),
+                ("ai_messages", models.IntegerField(default=0)),
+                ("text_messages", models.IntegerField(default=0)),
+                ("audio_messages", models.IntegerField(default=0)),
+                ("thumb_up", models.IntegerField(default=0)),
+                ("thumb_down", models.IntegerField(default=0)),
+                (
+                    "grammar",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="chat_daily_stats",
+                        to="grammar.grammar",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="chat_daily_stats",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["user", "day"], name="chat_chatda_user_id_88cd67_idx"
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("user", "grammar", "day"), name="chat_daily_stat_unique"
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(backfill_daily_stats, migrations.RunPython.noop),
+    ]
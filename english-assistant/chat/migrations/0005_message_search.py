@@ -0,0 +1,106 @@
+# Generated by Django 5.1 on 2026-10-18 00:05
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+import django.db.models.functions.text
+from django.contrib.postgres.operations import AddIndexConcurrently, TrigramExtension
+from django.db import migrations
+
+BACKFILL_BATCH_SIZE = 5000
+
+# The document SearchVector("content", "transcription", config="english")
+# builds, in the configuration chat.search queries with
+DOCUMENT = (
+    "to_tsvector('english'::regconfig, "
+    "COALESCE({row}content, '') || ' ' || COALESCE({row}transcription, ''))"
+)
+
+CREATE_TRIGGER = f"""
+CREATE FUNCTION chat_message_search_vector() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector := {DOCUMENT.format(row="NEW.")};
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER chat_message_search_vector
+    BEFORE INSERT OR UPDATE OF content, transcription, search_vector
+    ON chat_message
+    FOR EACH ROW EXECUTE FUNCTION chat_message_search_vector();
+"""
+
+DROP_TRIGGER = """
+DROP TRIGGER IF EXISTS chat_message_search_vector ON chat_message;
+DROP FUNCTION IF EXISTS chat_message_search_vector();
+"""
+
+
+def backfill_search_vector(apps, schema_editor):
+    """
+    Fill the column of existing rows in short transactions of
+    BACKFILL_BATCH_SIZE rows, so no batch holds row locks for long. Rows
+    written meanwhile are already covered by the trigger.
+    """
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT COALESCE(MAX(id), 0) FROM chat_message")
+        (last_id,) = cursor.fetchone()
+        for start in range(0, last_id, BACKFILL_BATCH_SIZE):
+            cursor.execute(
+                f"UPDATE chat_message SET search_vector = {DOCUMENT.format(row='')} "
+                "WHERE id > %s AND id <= %s AND search_vector IS NULL",
+                [start, start + BACKFILL_BATCH_SIZE],
+            )
+
+
+class Migration(migrations.Migration):
+    # Every step commits on its own: adding the nullable column only touches
+    # the catalog, the backfill runs in batches and the GIN indexes are built
+    # without locking the table against writes
+    atomic = False
+
+    dependencies = [
+        ("chat", "0004_chat_daily_stat"),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name="message",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False,
+                help_text="Full text search document of the content and transcription",
+                null=True,
+            ),
+        ),
+        migrations.RunSQL(CREATE_TRIGGER, DROP_TRIGGER),
+        migrations.RunPython(backfill_search_vector, migrations.RunPython.noop),
+        AddIndexConcurrently(
+            model_name="message",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["search_vector"], name="chat_message_search_idx"
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="message",
+            index=django.contrib.postgres.indexes.GinIndex(
+                django.contrib.postgres.indexes.OpClass(
+                    django.db.models.functions.text.Upper("content"),
+                    name="gin_trgm_ops",
+                ),
+                name="chat_message_content_trgm",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="message",
+            index=django.contrib.postgres.indexes.GinIndex(
+                django.contrib.postgres.indexes.OpClass(
+                    django.db.models.functions.text.Upper("transcription"),
+                    name="gin_trgm_ops",
+                ),
+                name="chat_message_transcr_trgm",
+            ),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.1 on 2026-10-18 00:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("chat", "0006_message_created_at"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="EngagementFlush",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("flush_id", models.CharField(max_length=32, unique=True)),
+                (
+                    "unmatched",
+                    models.JSONField(
+                        default=dict,
+                        help_text="WebSocket clicks whose message was not written yet, to requeue",
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+        ),
+    ]
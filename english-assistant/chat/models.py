@@ -1,10 +1,20 @@
-from django.db import models
 from django.contrib.auth.models import User
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVectorField
+from django.db import models, transaction
+from django.db.models.functions import Upper
+from django.utils import timezone
 
 from reusable.models import BaseModel
 from grammar.models import Grammar
 
 
+class MessageManager(models.Manager):
+    def get_queryset(self):
+        # The search document is only ever read by Postgres itself
+        return super().get_queryset().defer("search_vector")
+
+
 class Message(BaseModel):
     """Model to store chat messages between users and AI assistant"""
 
@@ -73,6 +83,27 @@ class Message(BaseModel):
     user_timezone = models.CharField(
         max_length=50, default="UTC", help_text="User's timezone when message was sent"
     )
+    record_id = models.UUIDField(
+        null=True,
+        blank=True,
+        unique=True,
+        editable=False,
+        help_text="Write-behind record identifier, makes redelivery idempotent",
+    )
+    truncated = models.BooleanField(
+        default=False,
+        help_text="AI answer was cut short by a cancel or the word quota",
+    )
+
+    # Set when the message is queued, not when the write-behind drainer saves it
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
+
+    # Search document, kept up to date by a database trigger (migration 0005)
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False,
+        help_text="Full text search document of the content and transcription",
+    )
 
     # Engagement metrics
     thumb_up = models.IntegerField(default=0, help_text="Number of thumbs up received")
@@ -80,6 +111,8 @@ class Message(BaseModel):
         default=0, help_text="Number of thumbs down received"
     )
 
+    objects = MessageManager()
+
     class Meta:
         ordering = ["-created_at"]
         indexes = [
@@ -87,6 +120,15 @@ class Message(BaseModel):
             models.Index(fields=["response_id"]),
             models.Index(fields=["session_id"]),
             models.Index(fields=["sender_type", "-created_at"]),
+            GinIndex(fields=["search_vector"], name="chat_message_search_idx"),
+            GinIndex(
+                OpClass(Upper("content"), name="gin_trgm_ops"),
+                name="chat_message_content_trgm",
+            ),
+            GinIndex(
+                OpClass(Upper("transcription"), name="gin_trgm_ops"),
+                name="chat_message_transcr_trgm",
+            ),
         ]
 
     def __str__(self):
@@ -117,7 +159,7 @@ class Message(BaseModel):
     @classmethod
     def create_user_message(cls, user, grammar, content, message_type="text", **kwargs):
         """Create a user message"""
-        return cls.objects.create(
+        return cls.create_counted(
             user=user,
             grammar=grammar,
             content=content,
@@ -129,7 +171,7 @@ class Message(BaseModel):
     @classmethod
     def create_ai_message(cls, user, grammar, content, response_id=None, **kwargs):
         """Create an AI message"""
-        return cls.objects.create(
+        return cls.create_counted(
             user=user,
             grammar=grammar,
             content=content,
@@ -138,3 +180,66 @@ class Message(BaseModel):
             response_id=response_id,
             **kwargs,
         )
+
+    @classmethod
+    def create_counted(cls, **fields):
+        """Create a message and count it in the daily statistics"""
+        from .rollups import add_messages
+
+        with transaction.atomic():
+            message = cls.objects.create(**fields)
+            add_messages([message])
+        return message
+
+
+class ChatDailyStat(models.Model):
+    """
+    Messages and engagement of one user on one grammar topic on one day,
+    kept up to date as messages are written so statistics never scan them.
+    """
+
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="chat_daily_stats"
+    )
+    grammar = models.ForeignKey(
+        Grammar, on_delete=models.CASCADE, related_name="chat_daily_stats"
+    )
+    day = models.DateField(help_text="Day the messages were sent, in TIME_ZONE")
+
+    user_messages = models.IntegerField(default=0)
+    ai_messages = models.IntegerField(default=0)
+    text_messages = models.IntegerField(default=0)
+    audio_messages = models.IntegerField(default=0)
+    thumb_up = models.IntegerField(default=0)
+    thumb_down = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "grammar", "day"], name="chat_daily_stat_unique"
+            )
+        ]
+        indexes = [models.Index(fields=["user", "day"])]
+
+    def __str__(self):
+        return (
+            f"Chat stats of user {self.user_id} on grammar {self.grammar_id}"
+            f" - {self.day}"
+        )
+
+
+class EngagementFlush(models.Model):
+    """
+    A snapshot of buffered clicks applied by engagement.flush(), written in
+    the same transaction as its counter updates so it is never applied twice.
+    """
+
+    flush_id = models.CharField(max_length=32, unique=True)
+    unmatched = models.JSONField(
+        default=dict,
+        help_text="WebSocket clicks whose message was not written yet, to requeue",
+    )
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"Engagement flush {self.flush_id}"
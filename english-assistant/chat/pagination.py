@@ -0,0 +1,119 @@
+import base64
+import json
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class ChatHistoryPagination(PageNumberPagination):
+    """
+    Custom pagination for chat history.
+
+    Pages are numbered by default. With ``?paginate=cursor``, or a ``before``
+    or ``after`` cursor, pages are keyed on (created_at, id) instead: no
+    COUNT(*) and no OFFSET, so every page costs the same however deep it is.
+    ``before`` returns older messages and ``after`` newer ones, newest first
+    either way. Pages are lists of ``.values()`` rows with at least ``id``
+    and ``created_at``.
+    """
+
+    page_size = 50
+    page_size_query_param = "page_size"
+    max_page_size = 200
+
+    cursor_mode_query_param = "paginate"
+    before_query_param = "before"
+    after_query_param = "after"
+    invalid_cursor_message = "Invalid cursor"
+
+    def is_cursor_request(self, request) -> bool:
+        params = request.query_params
+        return (
+            params.get(self.cursor_mode_query_param) == "cursor"
+            or self.before_query_param in params
+            or self.after_query_param in params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_mode = self.is_cursor_request(request)
+        if not self.cursor_mode:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        page_size = self.get_page_size(request)
+        before = self.decode_cursor(request.query_params.get(self.before_query_param))
+        after = self.decode_cursor(request.query_params.get(self.after_query_param))
+
+        if after is not None:
+            created_at, pk = after
+            queryset = queryset.filter(
+                Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk)
+            ).order_by("created_at", "id")
+        else:
+            if before is not None:
+                created_at, pk = before
+                queryset = queryset.filter(
+                    Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk)
+                )
+            queryset = queryset.order_by("-created_at", "-id")
+
+        # One extra row tells whether there is another page
+        page = list(queryset[: page_size + 1])
+        has_more = len(page) > page_size
+        page = page[:page_size]
+        if after is not None:
+            page.reverse()
+
+        # Paging forward from a cursor, the cursor's message lies behind us
+        has_older = has_more if after is None else True
+        has_newer = has_more if after is not None else before is not None
+        self.next_cursor = None
+        self.previous_cursor = None
+        if page and has_older:
+            self.next_cursor = self.encode_cursor(page[-1])
+        if page and has_newer:
+            self.previous_cursor = self.encode_cursor(page[0])
+        return page
+
+    def get_paginated_response(self, data):
+        if not self.cursor_mode:
+            return super().get_paginated_response(data)
+        return Response(
+            {
+                "next": self.cursor_link(self.before_query_param, self.next_cursor),
+                "previous": self.cursor_link(
+                    self.after_query_param, self.previous_cursor
+                ),
+                "results": data,
+            }
+        )
+
+    def cursor_link(self, param, cursor):
+        if cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.page_query_param)
+        url = remove_query_param(url, self.before_query_param)
+        url = remove_query_param(url, self.after_query_param)
+        return replace_query_param(url, param, cursor)
+
+    @staticmethod
+    def encode_cursor(row) -> str:
+        position = json.dumps([row["created_at"].isoformat(), row["id"]])
+        return base64.urlsafe_b64encode(position.encode()).decode("ascii")
+
+    def decode_cursor(self, cursor):
+        if cursor is None:
+            return None
+        try:
+            created_at, pk = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            created_at = parse_datetime(created_at)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if created_at is None or not isinstance(pk, int):
+            raise NotFound(self.invalid_cursor_message)
+        return created_at, pk
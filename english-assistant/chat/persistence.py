@@ -0,0 +1,181 @@
+"""
+Write-behind persistence of chat messages.
+
+The consumer appends message records to a Redis stream and moves on, a single
+drainer (Celery task or the drain_chat_messages command) inserts them in stream
+order with bulk_create. Records are acknowledged only after they are committed,
+so a crashed drainer redelivers them, and the unique ``record_id`` makes the
+redelivery a no-op. Each record carries the time it was queued as its
+``created_at``, so history reads in the order messages were sent, whether a
+record was drained late or written directly while Redis was unreachable.
+"""
+
+import json
+import logging
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from redis.exceptions import ResponseError
+
+from reusable.redis_client import get_async_redis, get_redis
+from . import rollups
+from .models import Message
+
+logger = logging.getLogger(__name__)
+
+STREAM_KEY = "chat:messages:stream"
+GROUP = "chat-writers"
+CONSUMER = "drainer"
+LOCK_KEY = "chat:messages:drain-lock"
+
+
+def message_record(**fields) -> dict:
+    """Build a message record with a fresh idempotency key, stamped now"""
+    return {
+        "record_id": uuid.uuid4().hex,
+        "created_at": timezone.now().isoformat(),
+        **fields,
+    }
+
+
+def _store_audio(audio_file) -> str:
+    name = Message._meta.get_field("audio_file").generate_filename(
+        None, audio_file.name
+    )
+    return default_storage.save(name, audio_file)
+
+
+async def store_audio(audio_file) -> str:
+    """Save an uploaded voice message to storage and return its name"""
+    return await sync_to_async(_store_audio, thread_sensitive=False)(audio_file)
+
+
+async def enqueue(record: dict):
+    """
+    Append a record to the stream, writing it directly if Redis is down. The
+    direct write may overtake older records still queued, its ``created_at``
+    keeps it in place all the same.
+    """
+    try:
+        await get_async_redis().xadd(STREAM_KEY, {"data": json.dumps(record)})
+    except Exception as e:
+        logger.warning(f"Could not queue message {record['record_id']}: {e}")
+        await sync_to_async(persist_records)([record])
+
+
+def build_message(record: dict) -> Message:
+    # Records queued before they carried a timestamp get the drain time
+    created_at = record.get("created_at")
+    return Message(
+        record_id=uuid.UUID(record["record_id"]),
+        user_id=record["user_id"],
+        grammar_id=record["grammar_id"],
+        content=record["content"],
+        message_type=record.get("message_type", "text"),
+        sender_type=record["sender_type"],
+        response_id=record.get("response_id"),
+        session_id=record.get("session_id"),
+        user_timezone=record.get("user_timezone") or "UTC",
+        audio_file=record.get("audio_file"),
+        transcription=record.get("transcription"),
+        truncated=record.get("truncated", False),
+        created_at=parse_datetime(created_at) if created_at else timezone.now(),
+    )
+
+
+def persist_records(records: list) -> int:
+    """
+    Insert records in order, skipping those that were already written, and
+    count the new messages in the daily statistics.
+    """
+    messages = [build_message(record) for record in records]
+    # Records written by an earlier delivery were counted back then
+    written_ids = set(
+        Message.objects.filter(
+            record_id__in=[message.record_id for message in messages]
+        ).values_list("record_id", flat=True)
+    )
+    messages = [message for message in messages if message.record_id not in written_ids]
+    if not messages:
+        return len(records)
+    try:
+        with transaction.atomic():
+            Message.objects.bulk_create(messages, ignore_conflicts=True)
+            rollups.add_messages(messages)
+        return len(records)
+    except IntegrityError as e:
+        # A deleted user or grammar fails the whole batch, retry one by one
+        logger.warning(f"Batch insert failed, inserting one by one: {e}")
+
+    written = len(written_ids)
+    for message in messages:
+        try:
+            with transaction.atomic():
+                Message.objects.bulk_create([message], ignore_conflicts=True)
+                rollups.add_messages([message])
+            written += 1
+        except IntegrityError as e:
+            logger.error(f"Dropping message record {message.record_id}: {e}")
+    return written
+
+
+def ensure_group(client):
+    try:
+        client.xgroup_create(STREAM_KEY, GROUP, id="0", mkstream=True)
+    except ResponseError as e:
+        if "BUSYGROUP" not in str(e):
+            raise
+
+
+def drain(batch_size=None, block_ms=None) -> int:
+    """
+    Write one batch of queued records and return how many were consumed.
+    Entries left unacknowledged by a crashed run are retried before new ones,
+    which keeps stream order.
+    """
+    client = get_redis()
+    ensure_group(client)
+    batch_size = batch_size or settings.CHAT_WRITE_BEHIND_BATCH_SIZE
+
+    # Our own pending entries first ("0"), then new ones (">")
+    entries = client.xreadgroup(GROUP, CONSUMER, {STREAM_KEY: "0"}, count=batch_size)
+    if not entries or not entries[0][1]:
+        entries = client.xreadgroup(
+            GROUP, CONSUMER, {STREAM_KEY: ">"}, count=batch_size, block=block_ms
+        )
+    if not entries or not entries[0][1]:
+        return 0
+
+    ids, records = [], []
+    for entry_id, fields in entries[0][1]:
+        ids.append(entry_id)
+        records.append(json.loads(fields[b"data"]))
+    persist_records(records)
+
+    pipeline = client.pipeline()
+    pipeline.xack(STREAM_KEY, GROUP, *ids)
+    pipeline.xdel(STREAM_KEY, *ids)
+    pipeline.execute()
+    return len(ids)
+
+
+def drain_all(batch_size=None) -> int:
+    """Drain the stream until it is empty, unless another drainer is running"""
+    lock = get_redis().lock(LOCK_KEY, timeout=settings.CHAT_WRITE_BEHIND_LOCK_TIMEOUT)
+    if not lock.acquire(blocking=False):
+        return 0
+    try:
+        drained = 0
+        while True:
+            count = drain(batch_size)
+            if not count:
+                return drained
+            drained += count
+            lock.extend(settings.CHAT_WRITE_BEHIND_LOCK_TIMEOUT, replace_ttl=True)
+    finally:
+        lock.release()
@@ -0,0 +1,133 @@
+"""
+Per-user AI word quotas.
+
+Each user has a token bucket in Redis holding up to
+``Profile.ai_word_count_limit`` words, refilled evenly over CHAT_QUOTA_PERIOD
+seconds. A turn reserves words up front, counts the words of the answer as it
+streams, reserves more in chunks when it runs past the reservation and refunds
+what it did not use. Buckets are updated by Lua scripts so concurrent turns
+of one user never overspend. When Redis is unavailable turns are not limited.
+"""
+
+import logging
+import math
+
+from django.conf import settings
+
+from reusable.redis_client import get_async_redis
+
+logger = logging.getLogger(__name__)
+
+BUCKET_KEY = "chat:quota:words:{}"
+
+# Refill, then take up to ARGV[3] words (a negative amount refunds them).
+# Returns the words granted and the words left, as a string to keep fractions.
+TAKE_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local amount = tonumber(ARGV[3])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local granted = amount
+if amount > 0 then
+    granted = math.max(0, math.min(amount, math.floor(tokens)))
+end
+tokens = math.min(capacity, tokens - granted)
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 60)
+return {granted, tostring(tokens)}
+"""
+
+
+class WordCounter:
+    """Count words in text that arrives in arbitrary pieces"""
+
+    def __init__(self):
+        self.in_word = False
+
+    def feed(self, text: str) -> int:
+        words = 0
+        for char in text:
+            if char.isspace():
+                self.in_word = False
+            elif not self.in_word:
+                self.in_word = True
+                words += 1
+        return words
+
+
+class WordQuota:
+    def __init__(self, user_id, limit: int):
+        self.key = BUCKET_KEY.format(user_id)
+        self.capacity = limit
+        self.rate = limit / settings.CHAT_QUOTA_PERIOD
+        self.remaining = float(limit)
+
+    async def take(self, words: int) -> int:
+        """Take up to ``words`` from the bucket and return how many were granted"""
+        if self.capacity <= 0:
+            return 0
+        try:
+            script = get_async_redis().register_script(TAKE_SCRIPT)
+            granted, remaining = await script(
+                keys=[self.key], args=[self.capacity, self.rate, words]
+            )
+        except Exception as e:
+            logger.warning(f"Could not update word quota {self.key}: {e}")
+            return words
+        self.remaining = float(remaining)
+        return int(granted)
+
+    async def refund(self, words: int):
+        if words > 0:
+            await self.take(-words)
+
+    def retry_after(self, words: int) -> int:
+        """Seconds until ``words`` are available again"""
+        if self.rate <= 0:
+            return settings.CHAT_QUOTA_PERIOD
+        return math.ceil(max(0, words - self.remaining) / self.rate)
+
+
+class TurnBudget:
+    """Words one answer may use, reserved in chunks while it streams"""
+
+    def __init__(self, quota: WordQuota):
+        self.quota = quota
+        self.counter = WordCounter()
+        self.reserved = 0
+        self.used = 0
+        self.exhausted = False
+
+    async def start(self) -> bool:
+        """Reserve words for the answer, False if the quota is spent"""
+        if not settings.CHAT_QUOTA_ENABLED:
+            return True
+        self.reserved = await self.quota.take(settings.CHAT_QUOTA_RESERVE_WORDS)
+        self.exhausted = self.reserved <= 0
+        return not self.exhausted
+
+    async def spend(self, text: str) -> bool:
+        """Count the words of ``text``, False once the quota is spent"""
+        if not settings.CHAT_QUOTA_ENABLED:
+            return True
+        self.used += self.counter.feed(text)
+        while self.used > self.reserved:
+            granted = await self.quota.take(settings.CHAT_QUOTA_CHUNK_WORDS)
+            if not granted:
+                self.exhausted = True
+                return False
+            self.reserved += granted
+        return True
+
+    async def finish(self):
+        """Give back the reserved words the answer did not use"""
+        unused, self.reserved = self.reserved - self.used, self.used
+        await self.quota.refund(unused)
+
+    def retry_after(self) -> int:
+        return self.quota.retry_after(settings.CHAT_QUOTA_RESERVE_WORDS)
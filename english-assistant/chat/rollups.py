@@ -0,0 +1,206 @@
+"""
+Daily chat statistics per user and grammar topic.
+
+ChatDailyStat rows are updated with F() increments in the same transaction
+that writes messages, soft deletes them or counts their thumbs up/down, so
+the statistics endpoint sums a few rows per day instead of scanning the
+user's history. The rows are derived data: ``reconcile`` recomputes recent
+days from the messages and repairs any drift, including increments that
+raced a previous reconcile.
+"""
+
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import ChatDailyStat, Message
+
+COUNTERS = (
+    "user_messages",
+    "ai_messages",
+    "text_messages",
+    "audio_messages",
+    "thumb_up",
+    "thumb_down",
+)
+
+
+def message_deltas(message: Message) -> dict:
+    return {
+        f"{message.sender_type}_messages": 1,
+        f"{message.message_type}_messages": 1,
+        "thumb_up": message.thumb_up,
+        "thumb_down": message.thumb_down,
+    }
+
+
+def apply(deltas: dict):
+    """
+    Add counter deltas to the rows keyed by (user_id, grammar_id, day). Call
+    inside the transaction of the change being counted.
+    """
+    deltas = {
+        key: counters for key, counters in deltas.items() if any(counters.values())
+    }
+    if not deltas:
+        return
+    ChatDailyStat.objects.bulk_create(
+        [
+            ChatDailyStat(user_id=user_id, grammar_id=grammar_id, day=day)
+            for user_id, grammar_id, day in deltas
+        ],
+        ignore_conflicts=True,
+    )
+    # A fixed order keeps concurrent writers from deadlocking
+    for (user_id, grammar_id, day), counters in sorted(deltas.items()):
+        ChatDailyStat.objects.filter(
+            user_id=user_id, grammar_id=grammar_id, day=day
+        ).update(
+            **{
+                name: F(name) + value
+                for name, value in counters.items()
+                if value and name in COUNTERS
+            }
+        )
+
+
+def add_messages(messages: list):
+    """Count newly written messages"""
+    deltas = defaultdict(lambda: defaultdict(int))
+    for message in messages:
+        key = (
+            message.user_id,
+            message.grammar_id,
+            timezone.localdate(message.created_at),
+        )
+        for name, value in message_deltas(message).items():
+            deltas[key][name] += value
+    apply(deltas)
+
+
+def queryset_deltas(queryset) -> dict:
+    """Counters of the live messages in ``queryset`` per rollup key, in one query"""
+    rows = (
+        queryset.filter(deleted_at__isnull=True)
+        .annotate(day=TruncDate("created_at"))
+        .values("user_id", "grammar_id", "day")
+        .annotate(
+            user_messages=Count("id", filter=Q(sender_type="user")),
+            ai_messages=Count("id", filter=Q(sender_type="ai")),
+            text_messages=Count("id", filter=Q(message_type="text")),
+            audio_messages=Count("id", filter=Q(message_type="audio")),
+            messages=Count("id"),
+            thumbs_up=Sum("thumb_up"),
+            thumbs_down=Sum("thumb_down"),
+        )
+        .order_by()
+    )
+    deltas = {}
+    for row in rows:
+        key = (row["user_id"], row["grammar_id"], row["day"])
+        deltas[key] = {
+            "user_messages": row["user_messages"],
+            "ai_messages": row["ai_messages"],
+            "text_messages": row["text_messages"],
+            "audio_messages": row["audio_messages"],
+            "thumb_up": row["thumbs_up"] or 0,
+            "thumb_down": row["thumbs_down"] or 0,
+            "messages": row["messages"],
+        }
+    return deltas
+
+
+def remove_messages(queryset) -> dict:
+    """Uncount the messages in ``queryset`` before they are soft deleted"""
+    deltas = queryset_deltas(queryset)
+    apply(
+        {
+            key: {name: -counters[name] for name in COUNTERS}
+            for key, counters in deltas.items()
+        }
+    )
+    return deltas
+
+
+def add_engagement(queryset, thumb_up=0, thumb_down=0):
+    """Count thumbs up/down added to every live message in ``queryset``"""
+    apply(
+        {
+            key: {
+                "thumb_up": thumb_up * counters["messages"],
+                "thumb_down": thumb_down * counters["messages"],
+            }
+            for key, counters in queryset_deltas(queryset).items()
+        }
+    )
+
+
+def reconcile(days=None) -> int:
+    """
+    Rebuild the rollups of the last ``days`` days (all of them with None) from
+    the messages, returns the number of rows written.
+    """
+    messages = Message.objects.all()
+    stats = ChatDailyStat.objects.all()
+    if days is not None:
+        first_day = timezone.localdate() - timedelta(days=days)
+        start = timezone.make_aware(datetime.combine(first_day, time.min))
+        messages = messages.filter(created_at__gte=start)
+        stats = stats.filter(day__gte=first_day)
+
+    with transaction.atomic():
+        rows = [
+            ChatDailyStat(
+                user_id=user_id,
+                grammar_id=grammar_id,
+                day=day,
+                **{name: counters[name] for name in COUNTERS},
+            )
+            for (user_id, grammar_id, day), counters in queryset_deltas(
+                messages
+            ).items()
+        ]
+        stats.delete()
+        ChatDailyStat.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def summarize(user, grammar_id=None, day_from=None, day_to=None) -> dict:
+    """Statistics of ``user`` over a range of days, in one aggregate query"""
+    stats = ChatDailyStat.objects.filter(user=user)
+    if grammar_id:
+        stats = stats.filter(grammar_id=grammar_id)
+    if day_from:
+        stats = stats.filter(day__gte=day_from)
+    if day_to:
+        stats = stats.filter(day__lte=day_to)
+
+    # Today and the six days before it
+    recent_from = timezone.localdate() - timedelta(days=6)
+    has_messages = Q(user_messages__gt=0) | Q(ai_messages__gt=0)
+    totals = stats.aggregate(
+        # Positional aggregates are named like user_messages__sum
+        *(Sum(name, default=0) for name in COUNTERS),
+        grammar_topics=Count("grammar", distinct=True, filter=has_messages),
+        recent_activity=Sum(
+            F("user_messages") + F("ai_messages"),
+            filter=Q(day__gte=recent_from),
+            default=0,
+        ),
+    )
+    return {
+        "total_messages": totals["user_messages__sum"] + totals["ai_messages__sum"],
+        "user_messages": totals["user_messages__sum"],
+        "ai_messages": totals["ai_messages__sum"],
+        "text_messages": totals["text_messages__sum"],
+        "audio_messages": totals["audio_messages__sum"],
+        "grammar_topics_discussed": totals["grammar_topics"],
+        "total_thumbs_up": totals["thumb_up__sum"],
+        "total_thumbs_down": totals["thumb_down__sum"],
+        "engagement_score": totals["thumb_up__sum"] - totals["thumb_down__sum"],
+        "recent_activity_7_days": totals["recent_activity"],
+    }
@@ -0,0 +1,188 @@
+"""
+Read-only serializers for ``.values()`` rows of the history endpoints.
+
+Pages of up to 200 messages spend most of their time in DRF's field
+machinery: a field lookup and ``to_representation`` call per value, the
+SerializerMethodFields and the model properties, all repeated for every
+row. These serializers read plain dicts instead and work out once per
+request what is the same for every row, like the user's display name. Their
+output is identical to ChatHistorySerializer, ChatHistorySearchSerializer
+and MessageSerializer, which remain in use for single messages.
+"""
+
+from django.utils import timezone
+from django.utils.html import escape
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
+
+from .models import Message
+from .search import HIGHLIGHT_START, HIGHLIGHT_STOP
+
+AI_NAME = "AI Assistant"
+
+datetime_field = serializers.DateTimeField()
+
+
+def display_content(row: dict) -> str:
+    """Same as Message.display_content"""
+    if row["message_type"] == "audio" and row["transcription"]:
+        return row["transcription"]
+    return row["content"]
+
+
+class RowSerializer:
+    """Serializes ``.values(*fields)`` rows of messages sent by ``user``"""
+
+    fields = ()
+
+    def __init__(self, user, request=None):
+        self.user = user
+        self.request = request
+        self.storage = Message._meta.get_field("audio_file").storage
+        # DRF looks the current timezone up again for every value
+        self.timezone = datetime_field.default_timezone()
+        self.iso_datetimes = (
+            api_settings.DATETIME_FORMAT is not None
+            and api_settings.DATETIME_FORMAT.lower() == ISO_8601
+        )
+
+    def datetime(self, value):
+        """Same as DRF's DateTimeField"""
+        if not value:
+            return None
+        if not (self.iso_datetimes and self.timezone and timezone.is_aware(value)):
+            return datetime_field.to_representation(value)
+        value = value.astimezone(self.timezone).isoformat()
+        if value.endswith("+00:00"):
+            value = value[:-6] + "Z"
+        return value
+
+    def audio_file(self, name):
+        """Same as DRF's FileField with the request in the context"""
+        if not name:
+            return None
+        url = self.storage.url(name)
+        if self.request is not None:
+            return self.request.build_absolute_uri(url)
+        return url
+
+    def serialize(self, rows) -> list:
+        return [self.to_representation(row) for row in rows]
+
+    def to_representation(self, row: dict) -> dict:
+        raise NotImplementedError
+
+
+class ChatHistoryRowSerializer(RowSerializer):
+    fields = (
+        "id",
+        "content",
+        "transcription",
+        "message_type",
+        "sender_type",
+        "audio_file",
+        "audio_duration",
+        "created_at",
+    )
+
+    def __init__(self, user, request=None):
+        super().__init__(user, request)
+        # ChatHistorySerializer.get_user_name for the user's own messages
+        if user.first_name or user.last_name:
+            self.user_name = f"{user.first_name} {user.last_name}".strip()
+        else:
+            self.user_name = user.email.split("@")[0]
+
+    def to_representation(self, row: dict) -> dict:
+        created_at = row["created_at"]
+        audio_duration = row["audio_duration"]
+        return {
+            "id": row["id"],
+            "user_name": AI_NAME if row["sender_type"] == "ai" else self.user_name,
+            "display_content": display_content(row),
+            "message_type": row["message_type"],
+            "sender_type": row["sender_type"],
+            "audio_file": self.audio_file(row["audio_file"]),
+            "audio_duration": (
+                float(audio_duration) if audio_duration is not None else None
+            ),
+            "formatted_date": created_at.strftime("%Y-%m-%d %H:%M:%S"),
+            "created_at": self.datetime(created_at),
+        }
+
+
+class ChatHistorySearchRowSerializer(ChatHistoryRowSerializer):
+    fields = ChatHistoryRowSerializer.fields + ("rank", "headline")
+
+    def to_representation(self, row: dict) -> dict:
+        data = super().to_representation(row)
+        data["rank"] = float(row["rank"]) if row["rank"] is not None else None
+        data["headline"] = (
+            escape(row["headline"])
+            .replace(HIGHLIGHT_START, "<mark>")
+            .replace(HIGHLIGHT_STOP, "</mark>")
+        )
+        return data
+
+
+class MessageRowSerializer(RowSerializer):
+    fields = (
+        "id",
+        "user_id",
+        "grammar_id",
+        "grammar__title",
+        "content",
+        "message_type",
+        "sender_type",
+        "audio_file",
+        "audio_duration",
+        "transcription",
+        "response_id",
+        "session_id",
+        "user_timezone",
+        "truncated",
+        "thumb_up",
+        "thumb_down",
+        "created_at",
+        "updated_at",
+    )
+
+    def __init__(self, user, request=None):
+        super().__init__(user, request)
+        # MessageSerializer.get_user_name
+        if user.first_name or user.last_name:
+            self.user_name = f"{user.first_name} {user.last_name}".strip()
+        else:
+            self.user_name = user.email
+
+    def to_representation(self, row: dict) -> dict:
+        audio_duration = row["audio_duration"]
+        return {
+            "id": row["id"],
+            "user": row["user_id"],
+            "user_email": self.user.email,
+            "user_name": self.user_name,
+            "grammar": row["grammar_id"],
+            "grammar_title": row["grammar__title"],
+            "content": row["content"],
+            "display_content": display_content(row),
+            "message_type": row["message_type"],
+            "sender_type": row["sender_type"],
+            "audio_file": self.audio_file(row["audio_file"]),
+            "audio_duration": (
+                float(audio_duration) if audio_duration is not None else None
+            ),
+            "transcription": row["transcription"],
+            "response_id": row["response_id"],
+            "session_id": row["session_id"],
+            "user_timezone": row["user_timezone"],
+            "truncated": row["truncated"],
+            "thumb_up": row["thumb_up"],
+            "thumb_down": row["thumb_down"],
+            "engagement_score": row["thumb_up"] - row["thumb_down"],
+            "is_user_message": row["sender_type"] == "user",
+            "is_ai_message": row["sender_type"] == "ai",
+            "is_audio_message": row["message_type"] == "audio",
+            "created_at": self.datetime(row["created_at"]),
+            "updated_at": self.datetime(row["updated_at"]),
+        }
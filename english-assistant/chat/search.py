@@ -0,0 +1,60 @@
+"""
+Indexed search over chat messages.
+
+``Message.search_vector`` is a stored tsvector of the content and the
+transcription, written by a database trigger and covered by a GIN index, so
+full text search ranks and highlights matches without reading unrelated rows. Substring
+search keeps the old ``icontains`` semantics, served by trigram GIN indexes on
+UPPER(content) and UPPER(transcription), the expression Django compares.
+"""
+
+from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank
+from django.db.models import F, Q, Value
+from django.db.models.functions import Coalesce, NullIf
+
+SEARCH_CONFIG = "english"
+SEARCH_MODES = ("substring", "fts")
+DEFAULT_SEARCH_MODE = "substring"
+
+# Control characters cannot come from ts_headline itself, so the serializer
+# can escape the snippet and then turn these into <mark> tags
+HIGHLIGHT_START = "\x02"
+HIGHLIGHT_STOP = "\x03"
+
+
+def search_query(term: str) -> SearchQuery:
+    """Parse ``term`` like a web search box: quotes, OR and -exclusions"""
+    return SearchQuery(term, config=SEARCH_CONFIG, search_type="websearch")
+
+
+def search_filter(term: str, mode: str = DEFAULT_SEARCH_MODE) -> Q:
+    """A filter on Message matching ``term``, backed by a GIN index in every mode"""
+    if mode == "fts":
+        return Q(search_vector=search_query(term))
+    return Q(content__icontains=term) | Q(transcription__icontains=term)
+
+
+def search_messages(queryset, term: str, mode: str = DEFAULT_SEARCH_MODE):
+    """
+    Filter ``queryset`` to the messages matching ``term``. Full text results
+    are ordered by rank and annotated with ``rank`` and a ``headline``
+    snippet of the displayed text.
+    """
+    queryset = queryset.filter(search_filter(term, mode))
+    if mode != "fts":
+        return queryset
+
+    query = search_query(term)
+    return queryset.annotate(
+        rank=SearchRank(F("search_vector"), query),
+        headline=SearchHeadline(
+            # Same text as Message.display_content
+            Coalesce(NullIf("transcription", Value("")), "content"),
+            query,
+            config=SEARCH_CONFIG,
+            start_sel=HIGHLIGHT_START,
+            stop_sel=HIGHLIGHT_STOP,
+            max_words=35,
+            min_words=15,
+        ),
+    ).order_by("-rank", "-created_at")
@@ -1,6 +1,9 @@
+from django.conf import settings
+from django.utils.html import escape
 from rest_framework import serializers
 
 from .models import Message
+from .search import HIGHLIGHT_START, HIGHLIGHT_STOP
 
 
 class MessageSerializer(serializers.ModelSerializer):
@@ -34,6 +37,7 @@ class MessageSerializer(serializers.ModelSerializer):
             "response_id",
             "session_id",
             "user_timezone",
+            "truncated",
             "thumb_up",
             "thumb_down",
             "engagement_score",
@@ -125,6 +129,24 @@ class ChatHistorySerializer(serializers.ModelSerializer):
         return obj.created_at.strftime("%Y-%m-%d %H:%M:%S")
 
 
+class ChatHistorySearchSerializer(ChatHistorySerializer):
+    """Chat history with the rank and highlighted snippet of a full text search"""
+
+    rank = serializers.FloatField(read_only=True)
+    headline = serializers.SerializerMethodField()
+
+    class Meta(ChatHistorySerializer.Meta):
+        fields = ChatHistorySerializer.Meta.fields + ["rank", "headline"]
+
+    def get_headline(self, obj):
+        """Escape the snippet and mark the matched words"""
+        return (
+            escape(obj.headline)
+            .replace(HIGHLIGHT_START, "<mark>")
+            .replace(HIGHLIGHT_STOP, "</mark>")
+        )
+
+
 class MessageEngagementSerializer(serializers.ModelSerializer):
     """Serializer for updating message engagement (thumbs up/down)"""
 
@@ -139,3 +161,24 @@ class MessageEngagementSerializer(serializers.ModelSerializer):
         if data.get("thumb_down", 0) < 0:
             raise serializers.ValidationError("Thumb down count cannot be negative")
         return data
+
+
+class EngagementActionSerializer(serializers.Serializer):
+    """One thumbs up/down click"""
+
+    message_id = serializers.IntegerField()
+    action = serializers.ChoiceField(choices=["thumb_up", "thumb_down"])
+
+
+class BatchEngagementSerializer(serializers.Serializer):
+    """Many thumbs up/down clicks sent in one request"""
+
+    actions = EngagementActionSerializer(many=True, allow_empty=False)
+
+    def validate_actions(self, value):
+        """Bound the batch size"""
+        if len(value) > settings.CHAT_ENGAGEMENT_BATCH_MAX:
+            raise serializers.ValidationError(
+                f"At most {settings.CHAT_ENGAGEMENT_BATCH_MAX} actions per request"
+            )
+        return value
@@ -0,0 +1,12 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from grammar.models import Grammar
+from .answer_cache import invalidate_grammar
+
+
+@receiver(post_save, sender=Grammar)
+@receiver(post_delete, sender=Grammar)
+def invalidate_answer_cache(sender, instance, **kwargs):
+    """Answers cached for a grammar were written for its previous prompt"""
+    invalidate_grammar(instance.pk)
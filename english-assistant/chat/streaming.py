@@ -0,0 +1,69 @@
+import asyncio
+import json
+
+from django.conf import settings
+
+
+class FrameCoalescer:
+    """
+    Buffer streamed text deltas and send them as fewer, larger frames.
+
+    The buffer is flushed once it holds ``max_bytes`` or ``interval_ms`` after
+    its first delta arrived, whichever comes first. The very first delta is
+    sent right away so coalescing never delays time to first token. Frames
+    keep the usual ``{"error": false, "message": ..., "id": ...}`` shape.
+    With an interval of 0 every delta is sent as its own frame.
+    """
+
+    def __init__(self, send, response_id, interval_ms=None, max_bytes=None):
+        self.send = send
+        self.response_id = response_id
+        if interval_ms is None:
+            interval_ms = settings.CHAT_STREAM_FLUSH_INTERVAL_MS
+        self.interval = interval_ms / 1000
+        if max_bytes is None:
+            max_bytes = settings.CHAT_STREAM_FLUSH_BYTES
+        self.max_bytes = max_bytes
+        self.parts = []
+        self.size = 0
+        self.frames_sent = 0
+        self._timer = None
+        self._lock = asyncio.Lock()
+
+    async def add(self, part: str):
+        self.parts.append(part)
+        self.size += len(part.encode())
+        if self.interval <= 0 or self.size >= self.max_bytes or not self.frames_sent:
+            await self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.ensure_future(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.interval)
+        self._timer = None
+        await self.flush()
+
+    def close(self):
+        """Drop whatever is buffered and stop the pending timer flush"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self.parts = []
+        self.size = 0
+
+    async def flush(self):
+        """Send whatever is buffered as one frame"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self.parts:
+            return
+        message = "".join(self.parts)
+        self.parts = []
+        self.size = 0
+        # Keep frames in order when a timer flush and a size flush overlap
+        async with self._lock:
+            await self.send(
+                json.dumps({"error": False, "message": message, "id": self.response_id})
+            )
+            self.frames_sent += 1
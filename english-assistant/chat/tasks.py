@@ -0,0 +1,81 @@
+import logging
+
+from urllib.parse import urljoin
+
+from celery import shared_task
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files.storage import default_storage
+
+from grammar.models import Grammar
+from user.tasks import send_email_to_user
+from . import engagement, export, persistence, rollups, tts_cache
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def evict_tts_cache():
+    """Keep the TTS cache under TTS_CACHE_MAX_BYTES"""
+    deleted = tts_cache.evict()
+    logger.info(f"TTS cache eviction removed {deleted} files")
+    return deleted
+
+
+@shared_task
+def drain_message_stream():
+    """Write queued chat messages to the database"""
+    written = persistence.drain_all()
+    if written:
+        logger.info(f"Wrote {written} queued chat messages")
+    return written
+
+
+@shared_task
+def flush_engagement():
+    """Fold buffered thumbs up/down clicks into the database"""
+    # WebSocket clicks match messages by response_id, write queued ones first.
+    # Clicks on messages still queued are retried by the next flush.
+    persistence.drain_all()
+    updated = engagement.flush()
+    if updated:
+        logger.info(f"Flushed engagement of {updated} messages")
+    return updated
+
+
+@shared_task
+def reconcile_chat_stats(days=None):
+    """Rebuild the recent daily chat statistics from the messages"""
+    if days is None:
+        days = settings.CHAT_STATS_RECONCILE_DAYS
+    written = rollups.reconcile(days)
+    logger.info(f"Reconciled {written} daily chat statistics rows")
+    return written
+
+
+@shared_task
+def export_chat_history(user_id, grammar_id, export_format, base_url):
+    """Write a gzipped chat history export and email the user a link to it"""
+    user = User.objects.get(id=user_id)
+    grammar = Grammar.objects.get(id=grammar_id)
+    name = export.write_archive(user, grammar, export_format)
+    url = urljoin(base_url, default_storage.url(name))
+    logger.info(f"Exported chat history of user {user_id} to {name}")
+
+    hours = settings.CHAT_EXPORT_TTL // 3600
+    send_email_to_user.delay(
+        user_id,
+        f"Your chat history export: {grammar.title}",
+        f"Your chat history for {grammar.title} is ready to download:\n\n"
+        f"{url}\n\nThe link works for {hours} hours.",
+    )
+    return name
+
+
+@shared_task
+def purge_chat_exports():
+    """Delete chat history exports older than CHAT_EXPORT_TTL"""
+    deleted = export.purge_archives()
+    if deleted:
+        logger.info(f"Deleted {deleted} expired chat history exports")
+    return deleted
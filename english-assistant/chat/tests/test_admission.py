@@ -0,0 +1,141 @@
+import asyncio
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from chat import admission
+from chat.admission import AdmissionController, AdmissionRejected
+from .utils import settle
+
+
+@override_settings(CHAT_ADMISSION_QUEUE_TIMEOUT=5)
+class AdmissionControllerTests(SimpleTestCase):
+    async def queue_turn(self, controller, user_id, admitted, on_position=None):
+        task = asyncio.ensure_future(controller.acquire(user_id, on_position))
+        task.add_done_callback(
+            lambda task: task.cancelled()
+            or task.exception()
+            or admitted.append(user_id)
+        )
+        await settle()
+        return task
+
+    async def test_admits_at_once_below_the_limits(self):
+        controller = AdmissionController(limit=2, per_user_limit=1, max_queue=10)
+        await controller.acquire("a")
+        await controller.acquire("b")
+        self.assertEqual(controller.active, 2)
+        self.assertEqual(controller.waiting, 0)
+
+    async def test_dispatches_round_robin_across_users(self):
+        controller = AdmissionController(limit=1, per_user_limit=2, max_queue=10)
+        await controller.acquire("holder")
+        admitted = []
+        for user_id in ("a", "a", "a", "b"):
+            await self.queue_turn(controller, user_id, admitted)
+        self.assertEqual(controller.waiting, 4)
+
+        for _ in range(4):
+            controller.release(admitted[-1] if admitted else "holder")
+            await settle()
+        # One user's backlog does not hold back the next user
+        self.assertEqual(admitted, ["a", "b", "a", "a"])
+        self.assertEqual(controller.waiting, 0)
+
+    async def test_per_user_limit_lets_other_users_pass(self):
+        controller = AdmissionController(limit=3, per_user_limit=1, max_queue=10)
+        await controller.acquire("a")
+        admitted = []
+        await self.queue_turn(controller, "a", admitted)
+        await self.queue_turn(controller, "b", admitted)
+        self.assertEqual(admitted, ["b"])
+        self.assertEqual(controller.waiting, 1)
+
+        controller.release("a")
+        await settle()
+        self.assertEqual(admitted, ["b", "a"])
+
+    async def test_rejects_when_the_queue_is_full(self):
+        controller = AdmissionController(limit=1, per_user_limit=1, max_queue=1)
+        await controller.acquire("a")
+        waiting = await self.queue_turn(controller, "b", [])
+        with self.assertRaises(AdmissionRejected):
+            await controller.acquire("c")
+        waiting.cancel()
+        await settle()
+
+    @override_settings(CHAT_ADMISSION_QUEUE_TIMEOUT=0.01)
+    async def test_timeout_rejects_and_leaves_the_queue(self):
+        controller = AdmissionController(limit=1, per_user_limit=1, max_queue=10)
+        await controller.acquire("a")
+        with self.assertRaises(AdmissionRejected):
+            await controller.acquire("b")
+        self.assertEqual(controller.waiting, 0)
+        self.assertEqual(controller.active, 1)
+
+    async def test_cancel_while_waiting_leaves_the_queue(self):
+        controller = AdmissionController(limit=1, per_user_limit=1, max_queue=10)
+        await controller.acquire("a")
+        task = await self.queue_turn(controller, "b", [])
+        task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+        self.assertEqual(controller.waiting, 0)
+
+        controller.release("a")
+        self.assertEqual(controller.active, 0)
+
+    async def test_timeout_just_as_admitted_hands_the_slot_back(self):
+        controller = AdmissionController(limit=1, per_user_limit=1, max_queue=10)
+        await controller.acquire("a")
+
+        async def wait_for(awaitable, timeout):
+            controller.release("a")
+            raise asyncio.TimeoutError
+
+        with mock.patch.object(admission.asyncio, "wait_for", wait_for):
+            with self.assertRaises(AdmissionRejected):
+                await controller.acquire("b")
+        self.assertEqual(controller.active, 0)
+        self.assertEqual(controller.waiting, 0)
+        self.assertFalse(controller.active_by_user)
+
+    async def test_cancel_just_as_admitted_hands_the_slot_back(self):
+        controller = AdmissionController(limit=1, per_user_limit=1, max_queue=10)
+        await controller.acquire("a")
+
+        async def wait_for(awaitable, timeout):
+            controller.release("a")
+            raise asyncio.CancelledError
+
+        with mock.patch.object(admission.asyncio, "wait_for", wait_for):
+            with self.assertRaises(asyncio.CancelledError):
+                await controller.acquire("b")
+        self.assertEqual(controller.active, 0)
+        self.assertEqual(controller.waiting, 0)
+
+    async def test_announces_round_robin_positions(self):
+        controller = AdmissionController(limit=1, per_user_limit=2, max_queue=10)
+        await controller.acquire("holder")
+        positions = {}
+        tasks = {}
+        for name, user_id in (("a1", "a"), ("a2", "a"), ("b1", "b")):
+
+            async def on_position(position, name=name):
+                positions.setdefault(name, []).append(position)
+
+            tasks[name] = await self.queue_turn(controller, user_id, [], on_position)
+        self.assertEqual(positions, {"a1": [1], "a2": [2, 3], "b1": [2]})
+
+        controller.release("holder")
+        await settle()
+        self.assertEqual(positions["b1"], [2, 1])
+        self.assertEqual(positions["a2"], [2, 3, 2])
+
+        tasks["b1"].cancel()
+        await settle()
+        self.assertEqual(positions["a2"], [2, 3, 2, 1])
+
+        tasks["a2"].cancel()
+        controller.release("a")
+        await settle()
@@ -0,0 +1,66 @@
+from django.test import TestCase
+
+from chat import answer_cache
+from chat.answer_cache import GRAMMAR_KEYS_KEY, STATS_KEY
+from grammar.models import Grammar
+from reusable.redis_client import get_redis
+from .utils import RedisTestMixin
+
+PROMPT = "You are an English AI assistant."
+
+
+class AnswerCacheTests(RedisTestMixin, TestCase):
+    redis_keys = [STATS_KEY]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.grammar = Grammar.objects.create(title="Phrasal verbs", description="")
+
+    def setUp(self):
+        super().setUp()
+        answer_cache._local_cache.clear()
+        self.addCleanup(answer_cache.invalidate_grammar, self.grammar.id)
+
+    async def get(self, question: str, model="primary-model", system_prompt=PROMPT):
+        return await answer_cache.get_answer(
+            self.grammar.id, model, system_prompt, question
+        )
+
+    async def set(self, question: str, answer: str, model="primary-model"):
+        await answer_cache.set_answer(self.grammar.id, model, PROMPT, question, answer)
+
+    async def test_hit_after_set(self):
+        self.assertIsNone(await self.get("What is a phrasal verb?"))
+        await self.set("What is a phrasal verb?", "A verb with a particle.")
+        self.assertEqual(
+            await self.get("  what is a PHRASAL verb "), "A verb with a particle."
+        )
+        self.assertEqual(answer_cache.get_stats()["hits"], 1)
+
+    async def test_shared_through_redis(self):
+        await self.set("What is a phrasal verb?", "A verb with a particle.")
+        answer_cache._local_cache.clear()
+        self.assertEqual(
+            await self.get("What is a phrasal verb?"), "A verb with a particle."
+        )
+
+    async def test_keyed_by_the_answering_model_and_system_prompt(self):
+        await self.set("What is a phrasal verb?", "From the backup.", "backup-model")
+        self.assertIsNone(await self.get("What is a phrasal verb?"))
+        self.assertIsNone(
+            await self.get(
+                "What is a phrasal verb?", "backup-model", system_prompt="Edited."
+            )
+        )
+        self.assertEqual(
+            await self.get("What is a phrasal verb?", "backup-model"),
+            "From the backup.",
+        )
+
+    async def test_saving_the_grammar_clears_its_answers(self):
+        await self.set("What is a phrasal verb?", "A verb with a particle.")
+        self.grammar.description = "Verbs followed by particles"
+        await self.grammar.asave()
+
+        self.assertIsNone(await self.get("What is a phrasal verb?"))
+        self.assertFalse(get_redis().exists(GRAMMAR_KEYS_KEY.format(self.grammar.id)))
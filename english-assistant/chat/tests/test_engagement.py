@@ -0,0 +1,143 @@
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from chat import engagement
+from chat.engagement import (
+    FLUSH_ID_FIELD,
+    FLUSHING_KEY,
+    PENDING_KEY,
+    RETRIES_KEY,
+    message_field,
+    response_field,
+)
+from chat.models import ChatDailyStat, EngagementFlush, Message
+from grammar.models import Grammar
+from reusable.redis_client import get_redis
+from .utils import RedisTestMixin
+
+
+@override_settings(CHAT_ENGAGEMENT_BUFFERED=True, CHAT_ENGAGEMENT_FLUSH_RETRIES=2)
+class FlushTests(RedisTestMixin, TestCase):
+    redis_keys = [PENDING_KEY, FLUSHING_KEY, RETRIES_KEY]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("clicker", "clicker@example.com")
+        cls.grammar = Grammar.objects.create(title="Past simple", description="")
+
+    def setUp(self):
+        super().setUp()
+        self.redis = get_redis()
+
+    def message(self, **fields) -> Message:
+        return Message.objects.create(
+            user=self.user,
+            grammar=self.grammar,
+            content="An answer",
+            sender_type="ai",
+            **fields,
+        )
+
+    def click(self, field: str, count=1):
+        self.redis.hincrby(PENDING_KEY, field, count)
+
+    def counts(self, message: Message) -> tuple:
+        message.refresh_from_db()
+        return message.thumb_up, message.thumb_down
+
+    def pending(self) -> dict:
+        return {
+            field.decode(): int(value)
+            for field, value in self.redis.hgetall(PENDING_KEY).items()
+        }
+
+    def test_applies_clicks_to_counters_and_statistics(self):
+        message = self.message(response_id="r-1")
+        engagement.record_clicks([(message.id, "thumb_up"), (message.id, "thumb_up")])
+        self.click(response_field(self.user.id, "r-1", "thumb_down"))
+
+        self.assertEqual(engagement.flush(), 2)
+        self.assertEqual(self.counts(message), (2, 1))
+        stat = ChatDailyStat.objects.get(user=self.user, grammar=self.grammar)
+        self.assertEqual((stat.thumb_up, stat.thumb_down), (2, 1))
+        self.assertFalse(self.redis.exists(PENDING_KEY, FLUSHING_KEY))
+
+    def test_nothing_to_flush(self):
+        self.assertEqual(engagement.flush(), 0)
+
+    def test_clicks_on_unwritten_messages_are_requeued(self):
+        field = response_field(self.user.id, "r-queued", "thumb_up")
+        self.click(field, 3)
+
+        engagement.flush()
+        self.assertEqual(self.pending(), {field: 3})
+
+        # The write-behind drainer writes the message before the next flush
+        message = self.message(response_id="r-queued")
+        engagement.flush()
+        self.assertEqual(self.counts(message), (3, 0))
+        self.assertEqual(self.pending(), {})
+        self.assertFalse(self.redis.exists(RETRIES_KEY))
+
+    def test_clicks_are_dropped_after_the_retry_limit(self):
+        field = response_field(self.user.id, "r-never", "thumb_down")
+        self.click(field)
+
+        for _ in range(2):
+            engagement.flush()
+            self.assertEqual(self.pending(), {field: 1})
+        with self.assertLogs("chat.engagement", "WARNING"):
+            engagement.flush()
+        self.assertEqual(self.pending(), {})
+        self.assertFalse(self.redis.exists(RETRIES_KEY))
+
+    def test_clicks_on_deleted_messages_are_dropped(self):
+        message = self.message(response_id="r-gone", deleted_at=timezone.now())
+        self.click(response_field(self.user.id, "r-gone", "thumb_up"))
+
+        self.assertEqual(engagement.flush(), 0)
+        self.assertEqual(self.counts(message), (0, 0))
+        self.assertEqual(self.pending(), {})
+
+    def test_snapshot_committed_before_a_crash_is_not_applied_twice(self):
+        message = self.message(response_id="r-2")
+        self.click(message_field(message.id, "thumb_up"), 2)
+        unmatched = response_field(self.user.id, "r-later", "thumb_up")
+        self.click(unmatched)
+
+        # Apply the snapshot but die before cleaning up Redis
+        self.redis.rename(PENDING_KEY, FLUSHING_KEY)
+        self.redis.hset(FLUSHING_KEY, FLUSH_ID_FIELD, "crashed")
+        snapshot = {
+            field.decode(): value.decode()
+            for field, value in self.redis.hgetall(FLUSHING_KEY).items()
+        }
+        del snapshot[FLUSH_ID_FIELD]
+        engagement.apply_snapshot("crashed", snapshot)
+        self.click(message_field(message.id, "thumb_down"))
+
+        self.assertEqual(engagement.flush(), 0)
+        self.assertEqual(self.counts(message), (2, 0))
+        # The unmatched click recorded with the snapshot is still retried
+        self.assertEqual(
+            self.pending(), {message_field(message.id, "thumb_down"): 1, unmatched: 1}
+        )
+        self.assertFalse(self.redis.exists(FLUSHING_KEY))
+
+        self.message(response_id="r-later")
+        engagement.flush()
+        self.assertEqual(self.counts(message), (2, 1))
+        self.assertEqual(Message.objects.get(response_id="r-later").thumb_up, 1)
+
+    def test_flush_records_are_purged(self):
+        old = EngagementFlush.objects.create(flush_id="old")
+        EngagementFlush.objects.filter(pk=old.pk).update(
+            created_at=timezone.now() - engagement.FLUSH_RECORD_TTL * 2
+        )
+        message = self.message()
+        self.click(message_field(message.id, "thumb_up"))
+
+        engagement.flush()
+        self.assertFalse(EngagementFlush.objects.filter(flush_id="old").exists())
+        self.assertEqual(EngagementFlush.objects.count(), 1)
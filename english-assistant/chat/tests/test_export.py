@@ -0,0 +1,142 @@
+import csv
+import gzip
+import io
+import json
+import os
+import tempfile
+import time
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.files.storage import default_storage
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from chat import export
+from chat.models import Message
+from grammar.models import Grammar
+
+
+class ExportTestMixin:
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("exporter", "exporter@example.com")
+        cls.grammar = Grammar.objects.create(title="Reported speech", description="")
+        other_user = User.objects.create_user("other", "other@example.com")
+        cls.messages = [
+            Message.objects.create(
+                user=cls.user,
+                grammar=cls.grammar,
+                content=f'He said "{index}", then left',
+                sender_type="user" if index % 2 else "ai",
+            )
+            for index in range(5)
+        ]
+        Message.objects.create(
+            user=cls.user,
+            grammar=cls.grammar,
+            content="Deleted",
+            sender_type="user",
+            deleted_at=timezone.now(),
+        )
+        Message.objects.create(
+            user=other_user, grammar=cls.grammar, content="Not mine", sender_type="user"
+        )
+
+    def render(self, export_format: str) -> str:
+        return "".join(export.render(export_format, self.user, self.grammar))
+
+    def contents(self) -> list:
+        return [message.content for message in self.messages]
+
+
+class RenderTests(ExportTestMixin, TestCase):
+    def test_json_export(self):
+        data = json.loads(self.render("json"))
+        self.assertEqual(data["grammar_topic"], self.grammar.title)
+        self.assertEqual(data["total_messages"], 5)
+        self.assertEqual([row["content"] for row in data["messages"]], self.contents())
+
+    def test_empty_json_export(self):
+        Message.objects.all().delete()
+        data = json.loads(self.render("json"))
+        self.assertEqual((data["messages"], data["total_messages"]), ([], 0))
+
+    def test_ndjson_export(self):
+        rows = [json.loads(line) for line in self.render("ndjson").splitlines()]
+        self.assertEqual([row["content"] for row in rows], self.contents())
+        self.assertEqual(rows[0]["id"], self.messages[0].id)
+
+    def test_csv_export(self):
+        rows = list(csv.reader(io.StringIO(self.render("csv"))))
+        self.assertEqual(rows[0], export.CSV_FIELDS)
+        content = export.CSV_FIELDS.index("content")
+        self.assertEqual([row[content] for row in rows[1:]], self.contents())
+
+    def test_chunks_are_buffered(self):
+        with mock.patch.object(export, "EXPORT_BUFFER_BYTES", 100):
+            chunks = list(export.render("ndjson", self.user, self.grammar))
+        self.assertGreater(len(chunks), 1)
+        self.assertTrue(all(len(chunk) >= 100 for chunk in chunks[:-1]))
+        self.assertEqual("".join(chunks), self.render("ndjson"))
+
+
+class ExportViewTests(ExportTestMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = reverse("chat:export-chat-history", args=[self.grammar.id])
+
+    def test_streams_the_export(self):
+        response = self.client.get(self.url, {"export_format": "ndjson"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        self.assertIn(".ndjson", response["Content-Disposition"])
+        body = b"".join(response.streaming_content).decode()
+        self.assertEqual(body, self.render("ndjson"))
+
+    def test_unknown_format(self):
+        response = self.client.get(self.url, {"export_format": "xml"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_post_exports_in_the_background(self):
+        with mock.patch("chat.tasks.export_chat_history.delay") as delay:
+            response = self.client.post(f"{self.url}?export_format=csv")
+        self.assertEqual(response.status_code, 202)
+        delay.assert_called_once_with(
+            self.user.id, self.grammar.id, "csv", "http://testserver/"
+        )
+
+
+class ArchiveTests(ExportTestMixin, TestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_archive_is_gzipped_under_a_random_name(self):
+        first = export.write_archive(self.user, self.grammar, "json")
+        second = export.write_archive(self.user, self.grammar, "json")
+        self.assertNotEqual(first, second)
+        self.assertTrue(first.endswith(".json.gz"))
+        with default_storage.open(first) as archive:
+            data = json.loads(gzip.decompress(archive.read()))
+        self.assertEqual(data["total_messages"], 5)
+
+    @override_settings(CHAT_EXPORT_TTL=3600)
+    def test_purge_deletes_expired_archives(self):
+        expired = export.write_archive(self.user, self.grammar, "csv")
+        fresh = export.write_archive(self.user, self.grammar, "csv")
+        two_hours_ago = time.time() - 7200
+        os.utime(default_storage.path(expired), (two_hours_ago, two_hours_ago))
+
+        self.assertEqual(export.purge_archives(), 1)
+        self.assertFalse(default_storage.exists(expired))
+        self.assertTrue(default_storage.exists(fresh))
+
+    def test_purge_without_archives(self):
+        self.assertEqual(export.purge_archives(), 0)
@@ -0,0 +1,206 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+from django.test import SimpleTestCase, override_settings
+
+from reusable.llm_router import CircuitBreaker, LLMRouter, Provider, ProviderError
+
+
+def chunk(text: str):
+    return SimpleNamespace(
+        choices=[SimpleNamespace(delta=SimpleNamespace(content=text))], usage=None
+    )
+
+
+class FakeStream:
+    def __init__(self, parts: list, delay: float):
+        self.parts = parts
+        self.delay = delay
+        self.closed = False
+
+    async def __aiter__(self):
+        await asyncio.sleep(self.delay)
+        for part in self.parts:
+            yield chunk(part)
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeClient:
+    """Answers chat completions with ``parts`` after ``delay`` seconds"""
+
+    def __init__(self, parts=("Hello", " there"), delay=0.0, error=None):
+        self.parts = list(parts)
+        self.delay = delay
+        self.error = error
+        self.streams = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+        self.models = SimpleNamespace(list=self.list_models)
+
+    async def create(self, **kwargs):
+        if self.error is not None:
+            raise self.error
+        stream = FakeStream(self.parts, self.delay)
+        self.streams.append(stream)
+        return stream
+
+    async def list_models(self):
+        if self.error is not None:
+            raise self.error
+        return []
+
+
+def provider(name: str, **client_options) -> Provider:
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    return Provider(
+        name=name,
+        model=f"{name}-model",
+        client=FakeClient(**client_options),
+        breaker=breaker,
+    )
+
+
+def open_breaker(breaker: CircuitBreaker):
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+
+
+def half_open_breaker(breaker: CircuitBreaker):
+    open_breaker(breaker)
+    breaker.opened_at = time.monotonic() - breaker.reset_timeout
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    def setUp(self):
+        self.breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+
+    def test_opens_after_repeated_failures(self):
+        self.breaker.record_failure()
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, "open")
+        self.assertFalse(self.breaker.allow())
+
+    def test_success_resets_the_failure_count(self):
+        self.breaker.record_failure()
+        self.breaker.record_success()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, "closed")
+
+    def test_half_open_lets_one_probe_through(self):
+        half_open_breaker(self.breaker)
+        self.assertTrue(self.breaker.allow())
+        self.assertFalse(self.breaker.allow())
+
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, "closed")
+
+    def test_failed_probe_reopens(self):
+        half_open_breaker(self.breaker)
+        self.breaker.allow()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, "open")
+
+    def test_cancelled_probe_lets_another_through(self):
+        half_open_breaker(self.breaker)
+        self.breaker.allow()
+        self.breaker.record_cancelled()
+        self.assertTrue(self.breaker.allow())
+
+    def test_health_check_half_opens_an_open_breaker(self):
+        open_breaker(self.breaker)
+        self.breaker.record_healthy()
+        self.assertEqual(self.breaker.state, "half_open")
+
+
+@override_settings(CHAT_LLM_SLOW_TTFT_MS=5000)
+class LLMRouterTests(SimpleTestCase):
+    def router(self, *providers, hedge_after=0, first_token_timeout=1) -> LLMRouter:
+        return LLMRouter(
+            list(providers),
+            hedge_after=hedge_after,
+            first_token_timeout=first_token_timeout,
+        )
+
+    async def answer(self, router: LLMRouter):
+        response = await router.stream([{"role": "user", "content": "Hi"}])
+        text = "".join([part async for part in response])
+        return response.provider.name, text
+
+    async def test_answers_from_the_primary(self):
+        router = self.router(provider("primary"), provider("backup"))
+        self.assertEqual(await self.answer(router), ("primary", "Hello there"))
+        self.assertEqual(router.providers[1].client.streams, [])
+
+    async def test_fails_over_before_the_first_token(self):
+        primary = provider("primary", error=RuntimeError("Bad gateway"))
+        router = self.router(primary, provider("backup"))
+        with self.assertLogs("reusable.llm_router", "WARNING"):
+            self.assertEqual(await self.answer(router), ("backup", "Hello there"))
+        self.assertEqual(primary.breaker.failures, 1)
+
+    async def test_open_breaker_is_skipped(self):
+        primary, backup = provider("primary"), provider("backup")
+        open_breaker(primary.breaker)
+        router = self.router(primary, backup)
+        self.assertEqual((await self.answer(router))[0], "backup")
+        self.assertEqual(primary.client.streams, [])
+
+    async def test_every_breaker_open_still_tries(self):
+        primary = provider("primary")
+        open_breaker(primary.breaker)
+        self.assertEqual((await self.answer(self.router(primary)))[0], "primary")
+
+    async def test_no_provider_answers(self):
+        router = self.router(
+            provider("primary", error=RuntimeError("down")),
+            provider("backup", error=RuntimeError("down")),
+        )
+        with self.assertLogs("reusable.llm_router", "WARNING"):
+            with self.assertRaises(ProviderError):
+                await router.stream([])
+
+    async def test_first_token_timeout_fails_over(self):
+        router = self.router(
+            provider("primary", delay=1), provider("backup"), first_token_timeout=0.05
+        )
+        with self.assertLogs("reusable.llm_router", "WARNING"):
+            self.assertEqual((await self.answer(router))[0], "backup")
+
+    async def test_slow_start_is_hedged(self):
+        primary, backup = provider("primary", delay=0.5), provider("backup")
+        router = self.router(primary, backup, hedge_after=0.02)
+        self.assertEqual((await self.answer(router))[0], "backup")
+        # The losing attempt is cancelled without being counted as a failure
+        self.assertEqual(primary.breaker.failures, 0)
+        self.assertEqual(backup.breaker.state, "closed")
+
+    async def test_hedge_loser_is_closed(self):
+        primary, backup = provider("primary", delay=0.05), provider("backup", delay=1)
+        router = self.router(primary, backup, hedge_after=0.02)
+        self.assertEqual((await self.answer(router))[0], "primary")
+        self.assertEqual([stream.closed for stream in backup.client.streams], [True])
+
+    async def test_cancelled_probe_does_not_wedge_the_breaker(self):
+        primary, backup = provider("primary", delay=0.5), provider("backup")
+        half_open_breaker(primary.breaker)
+        router = self.router(primary, backup, hedge_after=0.02)
+
+        # The probe loses the hedge race and is cancelled
+        self.assertEqual((await self.answer(router))[0], "backup")
+        self.assertFalse(primary.breaker.probing)
+
+        primary.client.delay = 0
+        self.assertEqual((await self.answer(router))[0], "primary")
+        self.assertEqual(primary.breaker.state, "closed")
+
+    async def test_health_check_lets_an_open_provider_probe(self):
+        primary = provider("primary")
+        open_breaker(primary.breaker)
+        router = self.router(primary, provider("backup"))
+
+        await router.check_health()
+        self.assertEqual((await self.answer(router))[0], "primary")
+        self.assertEqual(primary.breaker.state, "closed")
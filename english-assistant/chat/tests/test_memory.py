@@ -0,0 +1,128 @@
+import asyncio
+
+from django.test import SimpleTestCase
+
+from chat.memory import ConversationMemory
+from .utils import settle
+
+
+class ConversationMemoryTests(SimpleTestCase):
+    def setUp(self):
+        self.summarized = []
+
+    async def summarize(self, summary, turns):
+        self.summarized.append([turn.content for turn in turns])
+        return " ".join(filter(None, [summary] + [turn.content for turn in turns]))
+
+    def memory(self, **options):
+        options.setdefault("token_budget", 1000)
+        options.setdefault("keep_turns", 4)
+        options.setdefault("summary_tokens", 100)
+        return ConversationMemory(self.summarize, **options)
+
+    async def test_evicts_beyond_keep_turns_into_the_summary(self):
+        memory = self.memory(keep_turns=2)
+        for content in ("one", "two", "three", "four"):
+            memory.add("user", content)
+        self.assertEqual([turn.content for turn in memory.turns], ["three", "four"])
+
+        await settle()
+        self.assertEqual(memory.summary, "one two")
+        self.assertEqual(memory.pending, [])
+        self.assertEqual(memory.turn_tokens, sum(t.tokens for t in memory.turns))
+
+    async def test_evicts_beyond_the_token_budget(self):
+        # 60 tokens for turns once the summary's 40 are reserved
+        memory = self.memory(token_budget=100, summary_tokens=40)
+        for content in ("a" * 80, "b" * 80, "c" * 80):
+            memory.add("user", content)
+        self.assertEqual(len(memory.turns), 2)
+        self.assertLessEqual(memory.turn_tokens, memory.window_budget)
+        await settle()
+        self.assertEqual(self.summarized, [["a" * 80]])
+
+    async def test_keeps_the_newest_turn_however_large(self):
+        memory = self.memory(token_budget=50, summary_tokens=10)
+        memory.add("user", "short")
+        memory.add("assistant", "x" * 1000)
+        self.assertEqual([turn.role for turn in memory.turns], ["assistant"])
+
+        # It is trimmed to the window when sent to the model
+        content = memory.as_messages()[-1]["content"]
+        self.assertEqual(len(content), memory.window_budget * 4)
+        await settle()
+
+    async def test_turns_evicted_while_summarizing_are_folded_too(self):
+        gate = asyncio.Event()
+
+        async def summarize(summary, turns):
+            await gate.wait()
+            return await self.summarize(summary, turns)
+
+        memory = ConversationMemory(
+            summarize, token_budget=1000, keep_turns=1, summary_tokens=100
+        )
+        memory.add("user", "one")
+        memory.add("assistant", "two")
+        await settle()
+        memory.add("user", "three")
+        gate.set()
+        await settle()
+        self.assertEqual(memory.summary, "one two")
+        self.assertEqual(self.summarized, [["one"], ["two"]])
+
+    async def test_failed_summary_keeps_the_evicted_text(self):
+        async def summarize(summary, turns):
+            raise RuntimeError("provider down")
+
+        memory = ConversationMemory(
+            summarize, token_budget=1000, keep_turns=1, summary_tokens=100
+        )
+        memory.add("user", "one")
+        memory.add("assistant", "two")
+        with self.assertLogs("chat.memory", "WARNING"):
+            await settle()
+        self.assertIn("user: one", memory.summary)
+
+    def gated_memory(self, gate):
+        async def summarize(summary, turns):
+            await gate.wait()
+            return await self.summarize(summary, turns)
+
+        return ConversationMemory(
+            summarize, token_budget=1000, keep_turns=1, summary_tokens=100
+        )
+
+    async def test_turns_being_summarized_stay_in_the_prompt(self):
+        gate = asyncio.Event()
+        memory = self.gated_memory(gate)
+        memory.add("user", "one")
+        memory.add("assistant", "two")
+        await settle()
+        self.assertEqual(
+            memory.as_messages()[0]["content"],
+            "Summary of the earlier conversation: user: one",
+        )
+
+        gate.set()
+        await settle()
+        self.assertEqual(
+            memory.as_messages()[0]["content"],
+            "Summary of the earlier conversation: one",
+        )
+
+    async def test_cancelled_summary_keeps_the_turns_in_the_saved_state(self):
+        memory = self.gated_memory(asyncio.Event())
+        memory.add("user", "one")
+        memory.add("assistant", "two")
+        await settle()
+        await memory.close()
+        await settle()
+        self.assertEqual([turn.content for turn in memory.pending], ["one"])
+
+        restored = self.memory(keep_turns=1)
+        restored.restore(memory.to_bytes())
+        self.assertEqual([turn.content for turn in restored.pending], ["one"])
+        self.assertEqual([turn.content for turn in restored.turns], ["two"])
+        await settle()
+        self.assertEqual(restored.summary, "one")
@@ -0,0 +1,119 @@
+import base64
+import json
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.test import APIClient
+
+from chat.models import Message
+from chat.pagination import ChatHistoryPagination
+from grammar.models import Grammar
+
+
+class ChatHistoryPaginationCursorTests(SimpleTestCase):
+    def setUp(self):
+        self.pagination = ChatHistoryPagination()
+
+    def cursor(self, value) -> str:
+        return base64.urlsafe_b64encode(json.dumps(value).encode()).decode()
+
+    def test_cursor_round_trip(self):
+        created_at = datetime(2026, 1, 15, 14, 30, 25, 123456, tzinfo=dt_timezone.utc)
+        cursor = self.pagination.encode_cursor({"created_at": created_at, "id": 42})
+        self.assertEqual(self.pagination.decode_cursor(cursor), (created_at, 42))
+
+    def test_cursor_is_url_safe(self):
+        created_at = datetime(2026, 1, 15, tzinfo=dt_timezone.utc)
+        cursor = self.pagination.encode_cursor({"created_at": created_at, "id": 1})
+        self.assertRegex(cursor, r"^[A-Za-z0-9_=-]+$")
+
+    def test_missing_cursor_decodes_to_none(self):
+        self.assertIsNone(self.pagination.decode_cursor(None))
+
+    def test_invalid_cursors_are_not_found(self):
+        for cursor in (
+            "not a cursor",
+            base64.urlsafe_b64encode(b"not json").decode(),
+            self.cursor(["yesterday", 1]),
+            self.cursor(["2026-01-15T14:30:25+00:00", "1"]),
+            self.cursor(["2026-01-15T14:30:25+00:00"]),
+        ):
+            with self.subTest(cursor=cursor):
+                with self.assertRaises(NotFound):
+                    self.pagination.decode_cursor(cursor)
+
+
+class CursorPaginationViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("reader", "reader@example.com")
+        cls.grammar = Grammar.objects.create(title="Present perfect", description="")
+        now = timezone.now()
+        # Two messages share a timestamp, the id breaks the tie
+        times = [now - timedelta(minutes=minutes) for minutes in (5, 4, 3, 3, 1)]
+        cls.ids = [
+            Message.objects.create(
+                user=cls.user,
+                grammar=cls.grammar,
+                content=f"Message {index}",
+                sender_type="user",
+                created_at=created_at,
+            ).id
+            for index, created_at in enumerate(times)
+        ]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = reverse("chat:chat-history-list", args=[self.grammar.id])
+
+    def get(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_next_links_walk_the_history_newest_first(self):
+        page = self.get(self.url, paginate="cursor", page_size=2)
+        self.assertNotIn("count", page)
+        self.assertIsNone(page["previous"])
+        seen = []
+        while True:
+            seen += [row["id"] for row in page["results"]]
+            if not page["next"]:
+                break
+            page = self.get(page["next"])
+        self.assertEqual(seen, self.ids[::-1])
+
+    def test_previous_link_returns_the_newer_page(self):
+        first = self.get(self.url, paginate="cursor", page_size=2)
+        second = self.get(first["next"])
+        self.assertEqual(self.get(second["previous"])["results"], first["results"])
+
+    def test_polling_after_the_newest_message_finds_new_ones(self):
+        first = self.get(self.url, paginate="cursor", page_size=2)
+        newer = Message.objects.create(
+            user=self.user, grammar=self.grammar, content="New", sender_type="ai"
+        )
+        page = self.get(self.url, after=self.cursor_of(first))
+        self.assertEqual([row["id"] for row in page["results"]], [newer.id])
+
+    def cursor_of(self, page) -> str:
+        row = page["results"][0]
+        return ChatHistoryPagination.encode_cursor(
+            {"created_at": parse_datetime(row["created_at"]), "id": row["id"]}
+        )
+
+    def test_invalid_cursor_is_not_found(self):
+        response = self.client.get(self.url, {"before": "garbage"})
+        self.assertEqual(response.status_code, 404)
+
+    def test_page_numbers_remain_the_default(self):
+        page = self.get(self.url, page_size=2, page=3)
+        self.assertEqual(page["count"], 5)
+        self.assertEqual([row["id"] for row in page["results"]], self.ids[:1])
@@ -0,0 +1,115 @@
+import json
+from datetime import timedelta
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.utils import timezone
+
+from chat import persistence
+from chat.models import ChatDailyStat, Message
+from chat.persistence import GROUP, LOCK_KEY, STREAM_KEY, message_record
+from grammar.models import Grammar
+from reusable.redis_client import get_redis
+from .utils import RedisTestMixin
+
+
+class PersistenceTestMixin:
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("writer", "writer@example.com")
+        cls.grammar = Grammar.objects.create(title="Conditionals", description="")
+
+    def record(self, content="Hello", **fields) -> dict:
+        return message_record(
+            user_id=self.user.id,
+            grammar_id=self.grammar.id,
+            content=content,
+            sender_type="user",
+            **fields,
+        )
+
+    def user_messages(self) -> int:
+        stat = ChatDailyStat.objects.get(user=self.user, grammar=self.grammar)
+        return stat.user_messages
+
+
+class PersistRecordsTests(PersistenceTestMixin, TestCase):
+    def test_writes_records_with_their_queue_time(self):
+        record = self.record()
+        record["created_at"] = (timezone.now() - timedelta(minutes=5)).isoformat()
+
+        self.assertEqual(persistence.persist_records([record]), 1)
+        message = Message.objects.get(record_id=record["record_id"])
+        self.assertEqual(message.created_at.isoformat(), record["created_at"])
+        self.assertEqual(self.user_messages(), 1)
+
+    def test_redelivered_records_are_written_and_counted_once(self):
+        first, second = self.record("one"), self.record("two")
+        persistence.persist_records([first])
+
+        self.assertEqual(persistence.persist_records([first, second]), 2)
+        self.assertEqual(Message.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(self.user_messages(), 2)
+
+    def test_records_without_a_timestamp_get_the_drain_time(self):
+        record = self.record()
+        del record["created_at"]
+        before = timezone.now()
+
+        persistence.persist_records([record])
+        message = Message.objects.get(record_id=record["record_id"])
+        self.assertGreaterEqual(message.created_at, before)
+
+    async def test_enqueue_writes_directly_when_redis_is_down(self):
+        record = self.record()
+        client = mock.AsyncMock()
+        client.xadd.side_effect = ConnectionError("Redis is down")
+        with mock.patch.object(persistence, "get_async_redis", return_value=client):
+            with self.assertLogs("chat.persistence", "WARNING"):
+                await persistence.enqueue(record)
+        self.assertTrue(
+            await Message.objects.filter(record_id=record["record_id"]).aexists()
+        )
+
+
+class DrainTests(RedisTestMixin, PersistenceTestMixin, TestCase):
+    redis_keys = [STREAM_KEY, LOCK_KEY]
+
+    async def test_enqueued_records_are_drained_in_order(self):
+        records = [self.record(f"Message {index}") for index in range(5)]
+        for record in records:
+            await persistence.enqueue(record)
+
+        drained = await sync_to_async(persistence.drain_all)(batch_size=2)
+        self.assertEqual(drained, 5)
+        contents = [
+            message.content
+            async for message in Message.objects.filter(user=self.user).order_by(
+                "created_at"
+            )
+        ]
+        self.assertEqual(contents, [record["content"] for record in records])
+        self.assertEqual(get_redis().xlen(STREAM_KEY), 0)
+
+    def test_unacknowledged_entries_are_redelivered_once(self):
+        records = [self.record("one"), self.record("two")]
+        client = get_redis()
+        persistence.ensure_group(client)
+        for record in records:
+            client.xadd(STREAM_KEY, {"data": json.dumps(record)})
+        # A drainer that wrote the first record, then crashed before acking
+        client.xreadgroup(GROUP, persistence.CONSUMER, {STREAM_KEY: ">"}, count=2)
+        persistence.persist_records(records[:1])
+
+        self.assertEqual(persistence.drain(), 2)
+        self.assertEqual(Message.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(self.user_messages(), 2)
+        self.assertEqual(persistence.drain(), 0)
+
+    def test_drain_all_skips_while_another_drainer_runs(self):
+        get_redis().xadd(STREAM_KEY, {"data": json.dumps(self.record())})
+        with get_redis().lock(LOCK_KEY, timeout=10):
+            self.assertEqual(persistence.drain_all(), 0)
+        self.assertEqual(persistence.drain_all(), 1)
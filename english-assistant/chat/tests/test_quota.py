@@ -0,0 +1,113 @@
+import asyncio
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from chat import quota
+from chat.quota import BUCKET_KEY, TurnBudget, WordCounter, WordQuota
+from .utils import RedisTestMixin
+
+USER_ID = "quota-test"
+
+
+class WordCounterTests(SimpleTestCase):
+    def count(self, *pieces) -> int:
+        counter = WordCounter()
+        return sum(counter.feed(piece) for piece in pieces)
+
+    def test_counts_words(self):
+        self.assertEqual(self.count("The present perfect, again."), 4)
+
+    def test_word_split_across_pieces_counts_once(self):
+        self.assertEqual(self.count("The pre", "sent per", "fect ", " is", "\nok"), 5)
+
+    def test_whitespace_is_not_a_word(self):
+        self.assertEqual(self.count("", "  ", "\n\t"), 0)
+
+    def test_word_after_whitespace_piece_is_new(self):
+        self.assertEqual(self.count("one", " ", "two"), 2)
+
+
+@override_settings(CHAT_QUOTA_PERIOD=24 * 60 * 60)
+class WordQuotaTests(RedisTestMixin, SimpleTestCase):
+    redis_keys = [BUCKET_KEY.format(USER_ID)]
+
+    async def test_grants_up_to_the_limit(self):
+        bucket = WordQuota(USER_ID, 100)
+        self.assertEqual(await bucket.take(60), 60)
+        self.assertEqual(await bucket.take(60), 40)
+        self.assertEqual(await bucket.take(1), 0)
+        self.assertLess(bucket.remaining, 1)
+
+    async def test_refund_gives_words_back(self):
+        bucket = WordQuota(USER_ID, 100)
+        await bucket.take(100)
+        await bucket.refund(30)
+        self.assertEqual(await bucket.take(50), 30)
+
+    async def test_refund_never_exceeds_the_limit(self):
+        bucket = WordQuota(USER_ID, 100)
+        await bucket.refund(50)
+        self.assertEqual(await bucket.take(150), 100)
+
+    async def test_concurrent_takes_never_overspend(self):
+        bucket = WordQuota(USER_ID, 10)
+        granted = await asyncio.gather(*(bucket.take(1) for _ in range(25)))
+        self.assertEqual(sum(granted), 10)
+
+    @override_settings(CHAT_QUOTA_PERIOD=1)
+    async def test_bucket_refills_over_the_period(self):
+        bucket = WordQuota(USER_ID, 100)
+        await bucket.take(100)
+        await asyncio.sleep(0.2)
+        # 100 words per second
+        self.assertGreaterEqual(await bucket.take(100), 15)
+
+    async def test_zero_limit_grants_nothing(self):
+        self.assertEqual(await WordQuota(USER_ID, 0).take(10), 0)
+
+    async def test_unavailable_redis_does_not_limit(self):
+        bucket = WordQuota(USER_ID, 10)
+        with mock.patch.object(quota, "get_async_redis", side_effect=OSError):
+            with self.assertLogs("chat.quota", "WARNING"):
+                self.assertEqual(await bucket.take(50), 50)
+
+
+@override_settings(
+    CHAT_QUOTA_ENABLED=True,
+    CHAT_QUOTA_PERIOD=24 * 60 * 60,
+    CHAT_QUOTA_RESERVE_WORDS=10,
+    CHAT_QUOTA_CHUNK_WORDS=5,
+)
+class TurnBudgetTests(RedisTestMixin, SimpleTestCase):
+    redis_keys = [BUCKET_KEY.format(USER_ID)]
+
+    async def test_reserves_more_words_in_chunks(self):
+        budget = TurnBudget(WordQuota(USER_ID, 100))
+        self.assertTrue(await budget.start())
+        self.assertEqual(budget.reserved, 10)
+        self.assertTrue(await budget.spend("one two three " * 4))
+        self.assertEqual(budget.used, 12)
+        self.assertEqual(budget.reserved, 15)
+
+    async def test_finish_refunds_unused_words(self):
+        bucket = WordQuota(USER_ID, 100)
+        budget = TurnBudget(bucket)
+        await budget.start()
+        await budget.spend("just three words")
+        await budget.finish()
+        self.assertEqual(await bucket.take(100), 97)
+
+    async def test_spend_fails_once_the_quota_is_used_up(self):
+        budget = TurnBudget(WordQuota(USER_ID, 12))
+        await budget.start()
+        self.assertTrue(await budget.spend("word " * 12))
+        self.assertFalse(await budget.spend("more"))
+        self.assertTrue(budget.exhausted)
+
+    async def test_start_fails_without_words_left(self):
+        bucket = WordQuota(USER_ID, 20)
+        await bucket.take(20)
+        budget = TurnBudget(bucket)
+        self.assertFalse(await budget.start())
+        self.assertTrue(budget.exhausted)
@@ -0,0 +1,133 @@
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from chat import engagement, rollups
+from chat.models import ChatDailyStat, Message
+from grammar.models import Grammar
+
+
+class RollupTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("learner", "learner@example.com")
+        cls.grammar = Grammar.objects.create(title="Modal verbs", description="")
+        cls.other_grammar = Grammar.objects.create(title="Articles", description="")
+
+    def write(self, grammar=None, days_ago=0, **fields) -> Message:
+        """Write a message the way the write-behind drainer does"""
+        message = Message.objects.create(
+            user=self.user,
+            grammar=grammar or self.grammar,
+            content="A message",
+            sender_type=fields.pop("sender_type", "user"),
+            created_at=timezone.now() - timedelta(days=days_ago),
+            **fields,
+        )
+        rollups.add_messages([message])
+        return message
+
+    def summary(self, **filters) -> dict:
+        return rollups.summarize(self.user, **filters)
+
+    def rows(self) -> list:
+        return list(
+            ChatDailyStat.objects.order_by("day", "grammar_id").values(
+                "grammar_id", "day", *rollups.COUNTERS
+            )
+        )
+
+    def test_counts_written_messages_per_day_and_grammar(self):
+        self.write()
+        self.write(sender_type="ai", message_type="audio")
+        self.write(grammar=self.other_grammar, days_ago=10)
+
+        summary = self.summary()
+        self.assertEqual(summary["total_messages"], 3)
+        self.assertEqual(summary["user_messages"], 2)
+        self.assertEqual(summary["ai_messages"], 1)
+        self.assertEqual(summary["audio_messages"], 1)
+        self.assertEqual(summary["grammar_topics_discussed"], 2)
+        self.assertEqual(summary["recent_activity_7_days"], 2)
+        self.assertEqual(ChatDailyStat.objects.count(), 2)
+
+    def test_filters_by_grammar_and_inclusive_days(self):
+        today = timezone.localdate()
+        self.write()
+        self.write(days_ago=3)
+        self.write(grammar=self.other_grammar, days_ago=3)
+
+        self.assertEqual(self.summary(grammar_id=self.grammar.id)["total_messages"], 2)
+        three_days_ago = today - timedelta(days=3)
+        summary = self.summary(day_from=three_days_ago, day_to=three_days_ago)
+        self.assertEqual(summary["total_messages"], 2)
+        self.assertEqual(self.summary(day_from=today)["total_messages"], 1)
+
+    def test_engagement_and_deletion_update_the_day_of_the_message(self):
+        message = self.write(sender_type="ai", days_ago=2)
+        self.write(sender_type="ai", days_ago=2)
+
+        engagement.apply_deltas(Message.objects.filter(id=message.id), 2, 1)
+        summary = self.summary()
+        self.assertEqual(summary["total_thumbs_up"], 2)
+        self.assertEqual(summary["engagement_score"], 1)
+
+        rollups.remove_messages(Message.objects.filter(id=message.id))
+        summary = self.summary()
+        self.assertEqual(summary["ai_messages"], 1)
+        self.assertEqual(summary["total_thumbs_up"], 0)
+        self.assertEqual(summary["total_thumbs_down"], 0)
+
+    def test_deleted_messages_get_no_engagement(self):
+        self.write(sender_type="ai", deleted_at=timezone.now())
+        rollups.add_engagement(Message.objects.filter(user=self.user), thumb_up=1)
+        self.assertEqual(self.summary()["total_thumbs_up"], 0)
+
+    def test_reconcile_repairs_drift(self):
+        self.write()
+        self.write(days_ago=1, thumb_up=3)
+        self.write(days_ago=20)
+        expected = self.rows()
+        ChatDailyStat.objects.update(user_messages=99, thumb_up=0)
+
+        self.assertEqual(rollups.reconcile(days=7), 2)
+        self.assertEqual(self.rows()[1:], expected[1:])
+        # Days outside the window are left alone
+        self.assertEqual(self.rows()[0]["user_messages"], 99)
+
+        rollups.reconcile()
+        self.assertEqual(self.rows(), expected)
+
+    def test_empty_history(self):
+        summary = self.summary()
+        self.assertEqual(summary["total_messages"], 0)
+        self.assertEqual(summary["grammar_topics_discussed"], 0)
+
+
+class StatisticsViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("viewer", "viewer@example.com")
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = reverse("chat:chat-statistics")
+
+    def test_accepts_days(self):
+        response = self.client.get(
+            self.url, {"date_from": "2024-01-01", "date_to": "2024-01-31"}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["total_messages"], 0)
+
+    def test_rejects_datetimes_and_invalid_dates(self):
+        for value in ("2024-01-01T12:00:00", "2024-01-01 12:00", "yesterday"):
+            with self.subTest(value=value):
+                response = self.client.get(self.url, {"date_from": value})
+                self.assertEqual(response.status_code, 400)
+                self.assertIn("YYYY-MM-DD", response.json()["error"])
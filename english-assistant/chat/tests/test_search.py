@@ -0,0 +1,110 @@
+from unittest import skipUnless
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from chat.models import Message
+from grammar.models import Grammar
+
+
+class SearchTestMixin:
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("searcher", "searcher@example.com")
+        cls.grammar = Grammar.objects.create(title="Passive voice", description="")
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = reverse("chat:chat-history-list", args=[self.grammar.id])
+
+    def write(self, content: str, **fields) -> Message:
+        return Message.objects.create(
+            user=self.user,
+            grammar=self.grammar,
+            content=content,
+            sender_type=fields.pop("sender_type", "ai"),
+            **fields,
+        )
+
+    def search(self, term: str, **params) -> list:
+        response = self.client.get(self.url, {"search": term, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.json()["results"]
+
+    def ids(self, results: list) -> list:
+        return [row["id"] for row in results]
+
+
+class SubstringSearchTests(SearchTestMixin, TestCase):
+    def test_matches_content_and_transcription_ignoring_case(self):
+        text = self.write("The house WAS BUILT in 1900.")
+        audio = self.write(
+            "",
+            sender_type="user",
+            message_type="audio",
+            transcription="When was it built?",
+        )
+        self.write("Unrelated")
+
+        self.assertEqual(set(self.ids(self.search("was built"))), {text.id})
+        self.assertEqual(set(self.ids(self.search("built"))), {text.id, audio.id})
+
+    def test_matches_parts_of_words(self):
+        message = self.write("Passive constructions")
+        self.assertEqual(self.ids(self.search("struct")), [message.id])
+
+    def test_full_text_results_cannot_use_cursors(self):
+        response = self.client.get(
+            self.url, {"search": "built", "search_mode": "fts", "paginate": "cursor"}
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+@skipUnless(connection.vendor == "postgresql", "Full text search needs PostgreSQL")
+class FullTextSearchTests(SearchTestMixin, TestCase):
+    def search(self, term: str, **params) -> list:
+        return super().search(term, search_mode="fts", **params)
+
+    def test_matches_other_forms_of_a_word(self):
+        message = self.write("The teacher explained the passive voice.")
+        self.assertEqual(self.ids(self.search("explain")), [message.id])
+
+    def test_web_search_syntax(self):
+        built = self.write("The bridge was built by engineers.")
+        self.write("The bridge was painted by engineers.")
+        self.assertEqual(self.ids(self.search("bridge -painted")), [built.id])
+        self.assertEqual(self.ids(self.search('"was built"')), [built.id])
+
+    def test_better_matches_rank_first(self):
+        once = self.write("A passive sentence about a letter.")
+        twice = self.write("Passive voice: the passive hides the actor.")
+        results = self.search("passive")
+        self.assertEqual(self.ids(results), [twice.id, once.id])
+        self.assertGreater(results[0]["rank"], results[1]["rank"])
+
+    def test_headline_is_escaped_and_marked(self):
+        self.write("Letters are written by friends & family.")
+        (row,) = self.search("written")
+        self.assertIn("<mark>written</mark>", row["headline"])
+        self.assertIn("&amp;", row["headline"])
+
+    def test_transcription_is_searched_and_highlighted(self):
+        message = self.write(
+            "",
+            sender_type="user",
+            message_type="audio",
+            transcription="Is the cake baked already?",
+        )
+        (row,) = self.search("bake")
+        self.assertEqual(row["id"], message.id)
+        self.assertIn("<mark>baked</mark>", row["headline"])
+
+    def test_trigger_keeps_the_document_up_to_date(self):
+        message = self.write("The window was broken.")
+        Message.objects.filter(id=message.id).update(content="The door was opened.")
+        self.assertEqual(self.search("window"), [])
+        self.assertEqual(self.ids(self.search("door")), [message.id])
@@ -0,0 +1,65 @@
+import asyncio
+import json
+
+from django.test import SimpleTestCase
+
+from chat.streaming import FrameCoalescer
+
+
+class FrameCoalescerTests(SimpleTestCase):
+    def setUp(self):
+        self.frames = []
+
+    async def send(self, text_data):
+        self.frames.append(json.loads(text_data))
+
+    def messages(self):
+        return [frame["message"] for frame in self.frames]
+
+    async def test_first_delta_is_sent_at_once(self):
+        coalescer = FrameCoalescer(self.send, "r1", interval_ms=1000, max_bytes=100)
+        await coalescer.add("Hello")
+        self.assertEqual(
+            self.frames, [{"error": False, "message": "Hello", "id": "r1"}]
+        )
+        coalescer.close()
+
+    async def test_deltas_are_coalesced_until_the_interval(self):
+        coalescer = FrameCoalescer(self.send, "r1", interval_ms=20, max_bytes=100)
+        for part in ("Hello", " wor", "ld", "!"):
+            await coalescer.add(part)
+        self.assertEqual(self.messages(), ["Hello"])
+
+        await asyncio.sleep(0.05)
+        self.assertEqual(self.messages(), ["Hello", " world!"])
+        self.assertEqual(coalescer.frames_sent, 2)
+
+    async def test_full_buffer_is_sent_before_the_interval(self):
+        coalescer = FrameCoalescer(self.send, "r1", interval_ms=1000, max_bytes=6)
+        for part in ("Hi", "abc", "def", "g"):
+            await coalescer.add(part)
+        self.assertEqual(self.messages(), ["Hi", "abcdef"])
+
+        await coalescer.flush()
+        self.assertEqual(self.messages(), ["Hi", "abcdef", "g"])
+
+    async def test_zero_interval_sends_every_delta(self):
+        coalescer = FrameCoalescer(self.send, "r1", interval_ms=0, max_bytes=100)
+        for part in ("a", "b", "c"):
+            await coalescer.add(part)
+        self.assertEqual(self.messages(), ["a", "b", "c"])
+
+    async def test_flush_without_buffer_sends_nothing(self):
+        coalescer = FrameCoalescer(self.send, "r1", interval_ms=1000, max_bytes=100)
+        await coalescer.flush()
+        self.assertEqual(self.frames, [])
+
+    async def test_close_drops_the_buffer_and_the_timer(self):
+        coalescer = FrameCoalescer(self.send, "r1", interval_ms=10, max_bytes=100)
+        await coalescer.add("Hello")
+        await coalescer.add(" world")
+        coalescer.close()
+        self.assertIsNone(coalescer._timer)
+
+        await asyncio.sleep(0.03)
+        self.assertEqual(self.messages(), ["Hello"])
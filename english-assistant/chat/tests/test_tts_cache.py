@@ -0,0 +1,95 @@
+import os
+import tempfile
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from chat import tts_cache
+from chat.models import Message
+from grammar.models import Grammar
+
+
+class TTSCacheDirMixin:
+    def setUp(self):
+        super().setUp()
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        settings_override = override_settings(
+            TTS_CACHE_DIR=cache_dir.name, TTS_CACHE_X_ACCEL_PREFIX=""
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+
+class TTSCacheTests(TTSCacheDirMixin, SimpleTestCase):
+    def test_put_and_get(self):
+        self.assertIsNone(tts_cache.get("Hello"))
+        path = tts_cache.put("Hello", b"audio")
+        self.assertEqual(tts_cache.get("Hello"), path)
+        self.assertEqual(path.read_bytes(), b"audio")
+
+    def test_evicts_least_recently_used(self):
+        paths = [tts_cache.put(f"Text {index}", bytes(100)) for index in range(4)]
+        for age, path in enumerate(reversed(paths)):
+            os.utime(path, (1000 - age, 1000 - age))
+        tts_cache.get("Text 0")
+
+        self.assertEqual(tts_cache.evict(max_bytes=300), 2)
+        self.assertEqual([path.exists() for path in paths], [True, False, False, True])
+
+    def test_evict_below_the_limit(self):
+        tts_cache.put("Hello", bytes(100))
+        self.assertEqual(tts_cache.evict(max_bytes=100), 0)
+
+    def test_audio_evicted_before_it_is_opened_is_synthesized_again(self):
+        path = tts_cache.cache_path("Hello")
+
+        def get_or_synthesize(text, voice=None, model=None):
+            if synthesize.call_count == 2:
+                tts_cache.put(text, b"audio")
+            return path
+
+        with mock.patch.object(
+            tts_cache, "get_or_synthesize", side_effect=get_or_synthesize
+        ) as synthesize:
+            with tts_cache.open_or_synthesize("Hello") as audio_file:
+                self.assertEqual(audio_file.read(), b"audio")
+        self.assertEqual(synthesize.call_count, 2)
+
+
+class MessageAudioViewTests(TTSCacheDirMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("listener", "listener@example.com")
+        grammar = Grammar.objects.create(title="Gerunds", description="")
+        Message.objects.create(
+            user=cls.user,
+            grammar=grammar,
+            content="Swimming is fun.",
+            sender_type="ai",
+            response_id="r-audio",
+        )
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = reverse("chat:message-audio", args=["r-audio"])
+
+    def test_serves_cached_audio(self):
+        tts_cache.put("Swimming is fun.", b"audio")
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), b"audio")
+
+    def test_audio_that_keeps_being_evicted_is_not_found(self):
+        with mock.patch.object(
+            tts_cache,
+            "get_or_synthesize",
+            return_value=tts_cache.cache_path("Swimming is fun."),
+        ):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 404)
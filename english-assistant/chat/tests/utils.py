@@ -0,0 +1,43 @@
+import asyncio
+
+from redis.exceptions import RedisError
+
+from reusable.redis_client import get_redis
+
+_redis_available = None
+
+
+async def settle():
+    """Let scheduled callbacks and woken tasks run"""
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def redis_available() -> bool:
+    global _redis_available
+    if _redis_available is None:
+        try:
+            _redis_available = bool(get_redis().ping())
+        except RedisError:
+            _redis_available = False
+    return _redis_available
+
+
+class RedisTestMixin:
+    """
+    Run against the Redis at REDIS_URL, skipping when it is unreachable.
+    ``redis_keys`` are deleted before and after every test.
+    """
+
+    redis_keys = ()
+
+    def setUp(self):
+        super().setUp()
+        if not redis_available():
+            self.skipTest("Redis is not reachable at REDIS_URL")
+        self.clear_redis()
+        self.addCleanup(self.clear_redis)
+
+    def clear_redis(self):
+        if self.redis_keys:
+            get_redis().delete(*self.redis_keys)
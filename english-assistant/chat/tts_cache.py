@@ -0,0 +1,137 @@
+import hashlib
+import logging
+import os
+import tempfile
+from pathlib import Path
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from reusable.llm_clients import get_client
+
+logger = logging.getLogger(__name__)
+
+
+def cache_key(text: str, voice: str, model: str) -> str:
+    return hashlib.sha256(f"{model}\0{voice}\0{text}".encode()).hexdigest()
+
+
+def cache_path(text: str, voice=None, model=None) -> Path:
+    """Location of the cached audio for ``text``, sharded by hash prefix"""
+    key = cache_key(
+        text, voice or settings.CHAT_TTS_VOICE, model or settings.CHAT_TTS_MODEL
+    )
+    return Path(settings.TTS_CACHE_DIR) / key[:2] / f"{key}.mp3"
+
+
+def get(text: str, voice=None, model=None):
+    """Get the path of cached audio for ``text``, or None"""
+    path = cache_path(text, voice, model)
+    try:
+        # The modification time doubles as the last access time for eviction
+        os.utime(path)
+    except FileNotFoundError:
+        return None
+    return path
+
+
+def write_atomic(path: Path, write):
+    """Write through a temporary file so readers never see partial audio"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def put(text: str, data: bytes, voice=None, model=None) -> Path:
+    """Store synthesized audio for ``text``"""
+    path = cache_path(text, voice, model)
+    write_atomic(path, lambda f: f.write(data))
+    return path
+
+
+def get_or_synthesize(text: str, voice=None, model=None) -> Path:
+    """Get cached audio for ``text``, synthesizing and caching it on a miss"""
+    path = get(text, voice, model)
+    if path is not None:
+        return path
+
+    path = cache_path(text, voice, model)
+    client = get_client("openai")
+    with client.audio.speech.with_streaming_response.create(
+        model=model or settings.CHAT_TTS_MODEL,
+        voice=voice or settings.CHAT_TTS_VOICE,
+        input=text,
+    ) as response:
+
+        def write(f):
+            for chunk in response.iter_bytes(chunk_size=65536):
+                f.write(chunk)
+
+        write_atomic(path, write)
+    return path
+
+
+def open_or_synthesize(text: str, voice=None, model=None):
+    """
+    Open cached audio for ``text``, synthesizing it on a miss. Audio evicted
+    between the lookup and the open is synthesized again; once open, the
+    file stays readable even if it is evicted.
+    """
+    for _ in range(2):
+        path = get_or_synthesize(text, voice, model)
+        try:
+            return open(path, "rb")
+        except FileNotFoundError:
+            logger.info(f"TTS cache file {path.name} was evicted before it was read")
+    raise FileNotFoundError(path)
+
+
+aget = sync_to_async(get, thread_sensitive=False)
+aput = sync_to_async(put, thread_sensitive=False)
+
+
+def evict(max_bytes=None) -> int:
+    """
+    Delete least recently used audio until the cache is below ``max_bytes``
+    (``TTS_CACHE_MAX_BYTES`` by default). Returns the number of deleted files.
+    Writes do not evict, so the limit is soft: the cache can exceed it by
+    whatever is synthesized between two runs of the evict_tts_cache task.
+    """
+    if max_bytes is None:
+        max_bytes = settings.TTS_CACHE_MAX_BYTES
+
+    entries = []
+    total = 0
+    for path in Path(settings.TTS_CACHE_DIR).glob("*/*.mp3"):
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+        total += stat.st_size
+
+    if total <= max_bytes:
+        return 0
+
+    deleted = 0
+    # Stop a little below the limit so evictions do not run on every write
+    target = int(max_bytes * 0.9)
+    for _, size, path in sorted(entries):
+        if total <= target:
+            break
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+        total -= size
+        deleted += 1
+
+    if deleted:
+        logger.info(f"Evicted {deleted} files from the TTS cache")
+    return deleted
@@ -21,8 +21,26 @@ urlpatterns = [
         views.update_message_engagement,
         name="message-engagement",
     ),
+    # Many thumbs up/down clicks in one request
+    path(
+        "message/engagement/batch/",
+        views.batch_message_engagement,
+        name="batch-message-engagement",
+    ),
+    # Narration of an AI message (cached text-to-speech)
+    path(
+        "message/<str:response_id>/audio/",
+        views.message_audio,
+        name="message-audio",
+    ),
     # Chat statistics
     path("statistics/", views.chat_statistics, name="chat-statistics"),
+    # Answer cache hit/miss counters (staff only)
+    path(
+        "answer-cache/statistics/",
+        views.answer_cache_statistics,
+        name="answer-cache-statistics",
+    ),
     # Delete chat history for specific grammar
     path(
         "history/<int:grammar_id>/delete/",
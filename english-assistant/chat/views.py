@@ -1,31 +1,57 @@
+from openai import OpenAIError
 from rest_framework import generics, status, permissions
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
-from rest_framework.pagination import PageNumberPagination
-from django.db.models import Q
+from django.conf import settings
+from django.db import transaction
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
+from django.utils.dateparse import parse_date
 
+from reusable.metrics import render_metrics
+from . import answer_cache, engagement, export, rollups, tasks, tts_cache
 from .models import Message
+from .pagination import ChatHistoryPagination
+from .row_serializers import (
+    ChatHistoryRowSerializer,
+    ChatHistorySearchRowSerializer,
+    MessageRowSerializer,
+)
+from .search import DEFAULT_SEARCH_MODE, SEARCH_MODES, search_messages
 from .serializers import (
     MessageSerializer,
     ChatHistorySerializer,
+    ChatHistorySearchSerializer,
+    BatchEngagementSerializer,
 )
 from grammar.models import Grammar
 
 
-class ChatHistoryPagination(PageNumberPagination):
-    """Custom pagination for chat history"""
+class RowListMixin:
+    """
+    List pages of ``.values()`` rows serialized by ``row_serializer_class``,
+    which renders the same data as ``serializer_class`` in a fraction of
+    the time.
+    """
+
+    row_serializer_class = None
+
+    def get_row_serializer_class(self):
+        return self.row_serializer_class
 
-    page_size = 50
-    page_size_query_param = "page_size"
-    max_page_size = 200
+    def list(self, request, *args, **kwargs):
+        rows = self.get_row_serializer_class()(request.user, request)
+        queryset = self.filter_queryset(self.get_queryset()).values(*rows.fields)
+        page = self.paginate_queryset(queryset)
+        return self.get_paginated_response(rows.serialize(page))
 
 
-class ChatHistoryListView(generics.ListAPIView):
+class ChatHistoryListView(RowListMixin, generics.ListAPIView):
     """List chat history for a specific grammar topic and user"""
 
     serializer_class = ChatHistorySerializer
+    row_serializer_class = ChatHistoryRowSerializer
     pagination_class = ChatHistoryPagination
     permission_classes = [permissions.IsAuthenticated]
 
@@ -48,20 +74,49 @@ class ChatHistoryListView(generics.ListAPIView):
         if sender_type in ["user", "ai"]:
             queryset = queryset.filter(sender_type=sender_type)
 
-        # Search in content and transcription
+        queryset = queryset.order_by("-created_at")
+
+        # Search in content and transcription, ranked in full text mode
         search = self.request.query_params.get("search")
         if search:
-            queryset = queryset.filter(
-                Q(content__icontains=search) | Q(transcription__icontains=search)
+            queryset = search_messages(queryset, search, self.get_search_mode())
+
+        return queryset
+
+    def get_search_mode(self):
+        mode = self.request.query_params.get("search_mode")
+        return mode if mode in SEARCH_MODES else DEFAULT_SEARCH_MODE
+
+    def is_ranked_search(self):
+        return bool(
+            self.request.query_params.get("search") and self.get_search_mode() == "fts"
+        )
+
+    def list(self, request, *args, **kwargs):
+        # Cursors follow created_at and would lose the relevance order
+        if self.is_ranked_search() and self.paginator.is_cursor_request(request):
+            return Response(
+                {"error": "Full text search results are paged by page number only"},
+                status=status.HTTP_400_BAD_REQUEST,
             )
+        return super().list(request, *args, **kwargs)
 
-        return queryset.order_by("-created_at")
+    def get_serializer_class(self):
+        if self.is_ranked_search():
+            return ChatHistorySearchSerializer
+        return ChatHistorySerializer
+
+    def get_row_serializer_class(self):
+        if self.is_ranked_search():
+            return ChatHistorySearchRowSerializer
+        return ChatHistoryRowSerializer
 
 
-class AllChatHistoryView(generics.ListAPIView):
+class AllChatHistoryView(RowListMixin, generics.ListAPIView):
     """List all chat history for the authenticated user"""
 
     serializer_class = MessageSerializer
+    row_serializer_class = MessageRowSerializer
     pagination_class = ChatHistoryPagination
     permission_classes = [permissions.IsAuthenticated]
 
@@ -114,89 +169,172 @@ def update_message_engagement(request, message_id):
 
     action = request.data.get("action")  # 'thumb_up' or 'thumb_down'
 
-    if action == "thumb_up":
-        message.thumb_up += 1
-        message.save(update_fields=["thumb_up", "updated_at"])
+    if action not in engagement.ACTIONS:
         return Response(
-            {
-                "message": "Thumbs up added",
-                "thumb_up": message.thumb_up,
-                "thumb_down": message.thumb_down,
-            }
+            {"error": "Invalid action. Use 'thumb_up' or 'thumb_down'"},
+            status=status.HTTP_400_BAD_REQUEST,
         )
 
-    elif action == "thumb_down":
-        message.thumb_down += 1
-        message.save(update_fields=["thumb_down", "updated_at"])
-        return Response(
-            {
-                "message": "Thumbs down added",
-                "thumb_up": message.thumb_up,
-                "thumb_down": message.thumb_down,
-            }
-        )
+    engagement.record_clicks([(message.id, action)])
 
+    # Buffered clicks are not in the row yet, report them on top of it
+    if settings.CHAT_ENGAGEMENT_BUFFERED:
+        counts = engagement.pending_counts(message.id)
+    else:
+        counts = dict.fromkeys(engagement.ACTIONS, 0)
+        counts[action] = 1
     return Response(
-        {"error": "Invalid action. Use 'thumb_up' or 'thumb_down'"},
-        status=status.HTTP_400_BAD_REQUEST,
+        {
+            "message": (
+                "Thumbs up added" if action == "thumb_up" else "Thumbs down added"
+            ),
+            "thumb_up": message.thumb_up + counts["thumb_up"],
+            "thumb_down": message.thumb_down + counts["thumb_down"],
+        }
+    )
+
+
+@api_view(["POST"])
+@permission_classes([permissions.IsAuthenticated])
+def batch_message_engagement(request):
+    """Apply many thumbs up/down clicks in one request"""
+
+    serializer = BatchEngagementSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    actions = serializer.validated_data["actions"]
+
+    requested_ids = {item["message_id"] for item in actions}
+    owned_ids = set(
+        Message.objects.filter(
+            id__in=requested_ids, user=request.user, deleted_at__isnull=True
+        ).values_list("id", flat=True)
+    )
+    clicks = [
+        (item["message_id"], item["action"])
+        for item in actions
+        if item["message_id"] in owned_ids
+    ]
+    if clicks:
+        engagement.record_clicks(clicks)
+
+    return Response(
+        {
+            "applied": len(clicks),
+            "not_found": sorted(requested_ids - owned_ids),
+        }
     )
 
 
 @api_view(["GET"])
 @permission_classes([permissions.IsAuthenticated])
-def chat_statistics(request):
-    """Get chat statistics for the authenticated user"""
+def message_audio(request, response_id):
+    """Get the narration of an AI message, synthesized once and then cached"""
+
+    message = Message.objects.filter(
+        response_id=response_id,
+        user=request.user,
+        sender_type="ai",
+        deleted_at__isnull=True,
+    ).first()
+    if message is None:
+        return Response(
+            {"error": "Message not found"}, status=status.HTTP_404_NOT_FOUND
+        )
 
-    user = request.user
+    try:
+        if settings.TTS_CACHE_X_ACCEL_PREFIX:
+            path = tts_cache.get_or_synthesize(message.content)
+        else:
+            audio_file = tts_cache.open_or_synthesize(message.content)
+    except OpenAIError as e:
+        print(f"Could not synthesize audio of message {message.id}: {e}")
+        return Response(
+            {"error": "Could not synthesize audio, please try again later"},
+            status=status.HTTP_502_BAD_GATEWAY,
+        )
+    except FileNotFoundError:
+        # Evicted again right after it was synthesized
+        return Response(
+            {"error": "Audio not found, please try again"},
+            status=status.HTTP_404_NOT_FOUND,
+        )
+
+    if settings.TTS_CACHE_X_ACCEL_PREFIX:
+        # Let nginx send the file from disk
+        response = HttpResponse(content_type="audio/mpeg")
+        relative_path = path.relative_to(settings.TTS_CACHE_DIR).as_posix()
+        response["X-Accel-Redirect"] = settings.TTS_CACHE_X_ACCEL_PREFIX + relative_path
+        return response
+
+    # FileResponse uses the server's sendfile support where available
+    return FileResponse(audio_file, content_type="audio/mpeg")
+
+
+def parse_day(value):
+    """
+    Read a YYYY-MM-DD query parameter. Statistics are kept per day, so a
+    datetime is rejected rather than silently cut to its day.
+    """
+    if not value:
+        return None
+    day = parse_date(value)
+    if day is None:
+        raise ValueError(f"Invalid date: {value}, expected YYYY-MM-DD")
+    return day
+
+
+@api_view(["GET"])
+@permission_classes([permissions.IsAuthenticated])
+def chat_statistics(request):
+    """
+    Get chat statistics for the authenticated user, summed from the daily
+    rollups in one query whatever the size of the history. ``date_from`` and
+    ``date_to`` are whole days, both inclusive.
+    """
 
     # Get query parameters for filtering
     grammar_id = request.query_params.get("grammar_id")
-    date_from = request.query_params.get("date_from")
-    date_to = request.query_params.get("date_to")
-
-    # Base queryset
-    queryset = Message.objects.filter(user=user, deleted_at__isnull=True)
-
-    # Apply filters
-    if grammar_id:
-        queryset = queryset.filter(grammar_id=grammar_id)
-    if date_from:
-        queryset = queryset.filter(created_at__gte=date_from)
-    if date_to:
-        queryset = queryset.filter(created_at__lte=date_to)
-
-    # Calculate statistics
-    total_messages = queryset.count()
-    user_messages = queryset.filter(sender_type="user").count()
-    ai_messages = queryset.filter(sender_type="ai").count()
-    text_messages = queryset.filter(message_type="text").count()
-    audio_messages = queryset.filter(message_type="audio").count()
-
-    # Grammar topics discussed
-    grammar_topics = queryset.values("grammar__title", "grammar__id").distinct().count()
-
-    # Engagement metrics
-    total_thumbs_up = sum(msg.thumb_up for msg in queryset)
-    total_thumbs_down = sum(msg.thumb_down for msg in queryset)
-
-    # Recent activity (last 7 days)
-    recent_activity = queryset.filter(
-        created_at__gte=timezone.now() - timezone.timedelta(days=7)
-    ).count()
+    try:
+        day_from = parse_day(request.query_params.get("date_from"))
+        day_to = parse_day(request.query_params.get("date_to"))
+    except ValueError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
     return Response(
-        {
-            "total_messages": total_messages,
-            "user_messages": user_messages,
-            "ai_messages": ai_messages,
-            "text_messages": text_messages,
-            "audio_messages": audio_messages,
-            "grammar_topics_discussed": grammar_topics,
-            "total_thumbs_up": total_thumbs_up,
-            "total_thumbs_down": total_thumbs_down,
-            "engagement_score": total_thumbs_up - total_thumbs_down,
-            "recent_activity_7_days": recent_activity,
-        }
+        rollups.summarize(
+            request.user, grammar_id=grammar_id, day_from=day_from, day_to=day_to
+        )
+    )
+
+
+@api_view(["GET"])
+@permission_classes([permissions.IsAdminUser])
+def answer_cache_statistics(request):
+    """Get hit/miss counters of the first-turn answer cache"""
+    return Response(answer_cache.get_stats())
+
+
+def metrics(request):
+    """
+    Expose chat latency histograms in the Prometheus text format. Values live
+    in Redis, so any WSGI or ASGI process returns the aggregate of all workers.
+    """
+    token = settings.METRICS_TOKEN
+    if token:
+        if request.headers.get("Authorization") != f"Bearer {token}":
+            return HttpResponse(status=403)
+    elif not settings.DEBUG:
+        return HttpResponse(status=404)
+
+    stats = answer_cache.get_stats()
+    extra_lines = [
+        "# HELP chat_answer_cache_requests_total First-turn answer cache lookups",
+        "# TYPE chat_answer_cache_requests_total counter",
+        f'chat_answer_cache_requests_total{{result="hit"}} {stats["hits"]}',
+        f'chat_answer_cache_requests_total{{result="miss"}} {stats["misses"]}',
+    ]
+    return HttpResponse(
+        render_metrics(extra_lines), content_type="text/plain; version=0.0.4"
     )
 
 
@@ -210,10 +348,13 @@ def delete_chat_history(request, grammar_id):
     # Verify grammar exists and user has access
     grammar = get_object_or_404(Grammar, id=grammar_id, deleted_at__isnull=True)
 
-    # Soft delete messages
-    messages_updated = Message.objects.filter(
+    # Soft delete messages, uncounting them from the statistics
+    messages = Message.objects.filter(
         user=user, grammar=grammar, deleted_at__isnull=True
-    ).update(deleted_at=timezone.now())
+    )
+    with transaction.atomic():
+        rollups.remove_messages(messages)
+        messages_updated = messages.update(deleted_at=timezone.now())
 
     return Response(
         {
@@ -223,27 +364,44 @@ def delete_chat_history(request, grammar_id):
     )
 
 
-@api_view(["GET"])
+@api_view(["GET", "POST"])
 @permission_classes([permissions.IsAuthenticated])
 def export_chat_history(request, grammar_id):
-    """Export chat history as JSON for a specific grammar topic"""
+    """
+    Export chat history for a specific grammar topic as JSON, NDJSON or CSV.
+    GET streams the export; POST emails a link to a gzipped file instead,
+    for histories too long to download in one request.
+    """
+
+    export_format = request.query_params.get("export_format", "json")
+    if export_format not in export.EXPORT_FORMATS:
+        return Response(
+            {
+                "error": "export_format must be one of "
+                + ", ".join(export.EXPORT_FORMATS)
+            },
+            status=status.HTTP_400_BAD_REQUEST,
+        )
 
     user = request.user
     grammar = get_object_or_404(Grammar, id=grammar_id, deleted_at__isnull=True)
 
-    messages = (
-        Message.objects.filter(user=user, grammar=grammar, deleted_at__isnull=True)
-        .select_related("user", "grammar")
-        .order_by("created_at")
-    )
-
-    serializer = MessageSerializer(messages, many=True)
+    if request.method == "POST":
+        tasks.export_chat_history.delay(
+            user.id, grammar.id, export_format, request.build_absolute_uri("/")
+        )
+        return Response(
+            {"message": f"The export will be emailed to {user.email}"},
+            status=status.HTTP_202_ACCEPTED,
+        )
 
-    return Response(
-        {
-            "grammar_topic": grammar.title,
-            "export_date": timezone.now().isoformat(),
-            "total_messages": messages.count(),
-            "messages": serializer.data,
-        }
+    response = StreamingHttpResponse(
+        export.streaming_content(
+            request._request, export.render(export_format, user, grammar)
+        ),
+        content_type=export.EXPORT_FORMATS[export_format],
+    )
+    response["Content-Disposition"] = (
+        f'attachment; filename="{export.filename(grammar, export_format)}"'
     )
+    return response
@@ -5,13 +5,17 @@ from channels.routing import ProtocolTypeRouter, URLRouter
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "english-assistant.settings")
 django.setup()
-from chat.routing import websocket_urlpatterns
-from chat.middleware import JWTAuthMiddlewareStack
+# These modules use models and settings, so they can only load after setup()
+from chat.routing import websocket_urlpatterns  # noqa: E402
+from chat.middleware import JWTAuthMiddlewareStack  # noqa: E402
+from reusable.llm_clients import lifespan  # noqa: E402
 
 
 application = ProtocolTypeRouter(
     {
         "http": get_asgi_application(),
         "websocket": JWTAuthMiddlewareStack(URLRouter(websocket_urlpatterns)),
+        # Prewarms the LLM connections of the worker's event loop
+        "lifespan": lifespan,
     }
 )
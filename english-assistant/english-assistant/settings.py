@@ -135,6 +135,8 @@ SECURE_PROXY_SSL_HEADER = ("HTTP_X_FORWARDED_PROTO", "https")
 # OpenAI
 OPENAI_API_KEY = env.str("OPENAI_API_KEY")
 OPENAI_ORG_ID = env.str("OPENAI_ORG_ID")
+# Only set to use an OpenAI-compatible stand-in, e.g. for load tests
+OPENAI_BASE_URL = env.str("OPENAI_BASE_URL", default=None)
 
 # DeepSeek
 DEEPSEEK_API_KEY = env.str("DEEPSEEK_API_KEY")
@@ -144,6 +146,39 @@ DEEPSEEK_BASE_URL = env.str("DEEPSEEK_BASE_URL")
 METIS_BASE_URL = env.str("METIS_BASE_URL")
 METIS_API_KEY = env.str("METIS_API_KEY")
 
+# LLM providers for chat answers, in order of preference, as "backend:model".
+# Backends are openai, deepseek and metis. Hedging races a second provider when
+# the first has sent no token after CHAT_LLM_HEDGE_AFTER_MS (0 disables it).
+CHAT_LLM_PROVIDERS = env.list(
+    "CHAT_LLM_PROVIDERS", default=["openai:gpt-4o-mini", "deepseek:deepseek-chat"]
+)
+CHAT_LLM_HEDGE_AFTER_MS = env.int("CHAT_LLM_HEDGE_AFTER_MS", default=0)
+CHAT_LLM_FIRST_TOKEN_TIMEOUT = env.float("CHAT_LLM_FIRST_TOKEN_TIMEOUT", default=15)
+CHAT_LLM_SLOW_TTFT_MS = env.int("CHAT_LLM_SLOW_TTFT_MS", default=5000)
+CHAT_LLM_BREAKER_FAILURES = env.int("CHAT_LLM_BREAKER_FAILURES", default=3)
+CHAT_LLM_BREAKER_RESET = env.int("CHAT_LLM_BREAKER_RESET", default=30)
+CHAT_LLM_HEALTH_INTERVAL = env.int("CHAT_LLM_HEALTH_INTERVAL", default=30)
+# Ask providers for token usage at the end of each stream, to count the prompt
+# tokens served from their prefix cache. Turn off for providers without it.
+CHAT_LLM_STREAM_USAGE = env.bool("CHAT_LLM_STREAM_USAGE", default=True)
+
+# Shared HTTP pools of the LLM clients. HTTP/2 needs the h2 package. Each
+# worker opens LLM_HTTP_PREWARM_CONNECTIONS connections per backend at startup.
+LLM_HTTP_MAX_CONNECTIONS = env.int("LLM_HTTP_MAX_CONNECTIONS", default=100)
+LLM_HTTP_MAX_KEEPALIVE = env.int("LLM_HTTP_MAX_KEEPALIVE", default=20)
+LLM_HTTP_KEEPALIVE_EXPIRY = env.float("LLM_HTTP_KEEPALIVE_EXPIRY", default=120)
+LLM_HTTP2 = env.bool("LLM_HTTP2", default=False)
+LLM_HTTP_PREWARM_CONNECTIONS = env.int("LLM_HTTP_PREWARM_CONNECTIONS", default=2)
+# Seconds between writes of the sync clients' connection counts to Redis
+LLM_HTTP_METRICS_FLUSH_INTERVAL = env.float(
+    "LLM_HTTP_METRICS_FLUSH_INTERVAL", default=10
+)
+
+# Chat conversation memory (token counts are estimates)
+CHAT_MEMORY_TOKEN_BUDGET = env.int("CHAT_MEMORY_TOKEN_BUDGET", default=2000)
+CHAT_MEMORY_KEEP_TURNS = env.int("CHAT_MEMORY_KEEP_TURNS", default=8)
+CHAT_MEMORY_SUMMARY_TOKENS = env.int("CHAT_MEMORY_SUMMARY_TOKENS", default=300)
+
 
 ASGI_APPLICATION = "english-assistant.asgi.application"
 CHANNEL_LAYERS = {
@@ -155,6 +190,103 @@ CHANNEL_LAYERS = {
     },
 }
 
+# Redis used for shared application state (conversation state, caches, ...)
+REDIS_URL = env.str("REDIS_URL", default="redis://english-assistant_redis:6379/1")
+# Seconds before a Redis connect or command gives up. Blocking stream reads of
+# the message drainer must stay below the socket timeout.
+REDIS_SOCKET_CONNECT_TIMEOUT = env.float("REDIS_SOCKET_CONNECT_TIMEOUT", default=1.0)
+REDIS_SOCKET_TIMEOUT = env.float("REDIS_SOCKET_TIMEOUT", default=5.0)
+
+# Conversation state kept in Redis so reconnects resume the same context
+CHAT_STATE_TTL = env.int("CHAT_STATE_TTL", default=60 * 60 * 24)
+CHAT_STATE_HISTORY_MESSAGES = env.int("CHAT_STATE_HISTORY_MESSAGES", default=8)
+
+# Grammar and prompt cache: in-process LRU in front of a shared Redis tier
+GRAMMAR_CACHE_SIZE = env.int("GRAMMAR_CACHE_SIZE", default=512)
+GRAMMAR_CACHE_LOCAL_TTL = env.int("GRAMMAR_CACHE_LOCAL_TTL", default=60)
+GRAMMAR_CACHE_TTL = env.int("GRAMMAR_CACHE_TTL", default=60 * 60)
+
+# Admission control: LLM streams per worker and per user, and how many turns
+# may wait (round robin across users) before new ones are rejected
+CHAT_MAX_CONCURRENT_TURNS = env.int("CHAT_MAX_CONCURRENT_TURNS", default=32)
+CHAT_MAX_CONCURRENT_TURNS_PER_USER = env.int(
+    "CHAT_MAX_CONCURRENT_TURNS_PER_USER", default=1
+)
+CHAT_ADMISSION_MAX_QUEUE = env.int("CHAT_ADMISSION_MAX_QUEUE", default=64)
+CHAT_ADMISSION_QUEUE_TIMEOUT = env.float("CHAT_ADMISSION_QUEUE_TIMEOUT", default=20)
+CHAT_ADMISSION_RETRY_AFTER = env.int("CHAT_ADMISSION_RETRY_AFTER", default=5)
+
+# Word quotas: each user's bucket holds Profile.ai_word_count_limit words and
+# refills over CHAT_QUOTA_PERIOD seconds. A turn reserves words up front and
+# takes more in chunks while the answer streams.
+CHAT_QUOTA_ENABLED = env.bool("CHAT_QUOTA_ENABLED", default=True)
+CHAT_QUOTA_PERIOD = env.int("CHAT_QUOTA_PERIOD", default=24 * 60 * 60)
+CHAT_QUOTA_RESERVE_WORDS = env.int("CHAT_QUOTA_RESERVE_WORDS", default=100)
+CHAT_QUOTA_CHUNK_WORDS = env.int("CHAT_QUOTA_CHUNK_WORDS", default=50)
+
+# Cache of answers to the first question asked about a grammar topic
+CHAT_ANSWER_CACHE_ENABLED = env.bool("CHAT_ANSWER_CACHE_ENABLED", default=True)
+CHAT_ANSWER_CACHE_SIZE = env.int("CHAT_ANSWER_CACHE_SIZE", default=2048)
+CHAT_ANSWER_CACHE_TTL = env.int("CHAT_ANSWER_CACHE_TTL", default=60 * 60 * 24)
+
+# Streamed answers are coalesced into frames flushed on a time window or size
+CHAT_STREAM_FLUSH_INTERVAL_MS = env.int("CHAT_STREAM_FLUSH_INTERVAL_MS", default=50)
+CHAT_STREAM_FLUSH_BYTES = env.int("CHAT_STREAM_FLUSH_BYTES", default=512)
+
+# Upper bound for voice messages uploaded as binary frames
+CHAT_AUDIO_UPLOAD_MAX_BYTES = env.int(
+    "CHAT_AUDIO_UPLOAD_MAX_BYTES", default=10 * 1024 * 1024
+)
+
+# Voice replies: sentences are narrated concurrently while the answer streams
+CHAT_TTS_MODEL = env.str("CHAT_TTS_MODEL", default="tts-1")
+CHAT_TTS_VOICE = env.str("CHAT_TTS_VOICE", default="alloy")
+CHAT_TTS_CONCURRENCY = env.int("CHAT_TTS_CONCURRENCY", default=3)
+CHAT_TTS_MIN_SENTENCE_CHARS = env.int("CHAT_TTS_MIN_SENTENCE_CHARS", default=20)
+
+# Content-addressed cache of synthesized speech, evicted least recently used.
+# TTS_CACHE_MAX_BYTES is a soft limit enforced by the evict-tts-cache task, the
+# cache grows past it by what is synthesized between two runs.
+# Set the X-Accel prefix to an nginx "internal" location aliased to the cache
+# directory to let nginx serve the files.
+TTS_CACHE_DIR = env.str("TTS_CACHE_DIR", default=os.path.join(STATIC_ROOT, "tts_cache"))
+TTS_CACHE_MAX_BYTES = env.int("TTS_CACHE_MAX_BYTES", default=2 * 1024**3)
+TTS_CACHE_X_ACCEL_PREFIX = env.str("TTS_CACHE_X_ACCEL_PREFIX", default="")
+
+# Chat messages are queued in a Redis stream and written in batches by the
+# drain_message_stream task (or the drain_chat_messages command)
+CHAT_WRITE_BEHIND_BATCH_SIZE = env.int("CHAT_WRITE_BEHIND_BATCH_SIZE", default=500)
+CHAT_WRITE_BEHIND_DRAIN_INTERVAL = env.int(
+    "CHAT_WRITE_BEHIND_DRAIN_INTERVAL", default=2
+)
+CHAT_WRITE_BEHIND_LOCK_TIMEOUT = env.int("CHAT_WRITE_BEHIND_LOCK_TIMEOUT", default=60)
+
+# Thumbs up/down clicks are counted in Redis and flushed to the database by the
+# flush_engagement task. Disable to update the counters on every click.
+CHAT_ENGAGEMENT_BUFFERED = env.bool("CHAT_ENGAGEMENT_BUFFERED", default=True)
+CHAT_ENGAGEMENT_FLUSH_INTERVAL = env.int("CHAT_ENGAGEMENT_FLUSH_INTERVAL", default=10)
+CHAT_ENGAGEMENT_BATCH_MAX = env.int("CHAT_ENGAGEMENT_BATCH_MAX", default=100)
+# WebSocket clicks on a message still in the write-behind stream are retried
+# this many flushes before they are dropped
+CHAT_ENGAGEMENT_FLUSH_RETRIES = env.int("CHAT_ENGAGEMENT_FLUSH_RETRIES", default=30)
+
+# Chat statistics are summed from daily rollups updated on every write. The
+# reconcile_chat_stats task rebuilds the last CHAT_STATS_RECONCILE_DAYS days
+# from the messages every CHAT_STATS_RECONCILE_INTERVAL seconds.
+CHAT_STATS_RECONCILE_DAYS = env.int("CHAT_STATS_RECONCILE_DAYS", default=2)
+CHAT_STATS_RECONCILE_INTERVAL = env.int("CHAT_STATS_RECONCILE_INTERVAL", default=3600)
+
+# Chat history exports are streamed, reading CHAT_EXPORT_CHUNK_SIZE messages
+# at a time. Background exports are gzipped into CHAT_EXPORT_DIR under media
+# storage and deleted after CHAT_EXPORT_TTL seconds.
+CHAT_EXPORT_CHUNK_SIZE = env.int("CHAT_EXPORT_CHUNK_SIZE", default=2000)
+CHAT_EXPORT_DIR = env.str("CHAT_EXPORT_DIR", default="chat_exports")
+CHAT_EXPORT_TTL = env.int("CHAT_EXPORT_TTL", default=48 * 3600)
+
+# Prometheus scrape endpoint at /metrics/. Scrapers send the token as a
+# bearer token; without one the endpoint is only served with DEBUG on.
+METRICS_TOKEN = env.str("METRICS_TOKEN", default="")
+
 
 # Email Configs
 EMAIL_PORT = 587
@@ -172,6 +304,28 @@ CELERY_ACCEPT_CONTENT = ["json"]
 CELERY_TASK_SERIALIZER = "json"
 CELERY_RESULT_SERIALIZER = "json"
 CELERY_TIMEZONE = TIME_ZONE
+CELERY_BEAT_SCHEDULE = {
+    "evict-tts-cache": {
+        "task": "chat.tasks.evict_tts_cache",
+        "schedule": 15 * 60,
+    },
+    "drain-message-stream": {
+        "task": "chat.tasks.drain_message_stream",
+        "schedule": CHAT_WRITE_BEHIND_DRAIN_INTERVAL,
+    },
+    "flush-engagement": {
+        "task": "chat.tasks.flush_engagement",
+        "schedule": CHAT_ENGAGEMENT_FLUSH_INTERVAL,
+    },
+    "reconcile-chat-stats": {
+        "task": "chat.tasks.reconcile_chat_stats",
+        "schedule": CHAT_STATS_RECONCILE_INTERVAL,
+    },
+    "purge-chat-exports": {
+        "task": "chat.tasks.purge_chat_exports",
+        "schedule": 60 * 60,
+    },
+}
 
 
 # JWT Configuration
@@ -1,10 +1,13 @@
 from django.contrib import admin
 from django.urls import path, include
 
+from chat.views import metrics
+
 urlpatterns = [
     path("secret-admin/", admin.site.urls),
     path("api/v1/cht/", include("chat.urls")),
     path("api/v1/usr/", include("user.urls")),
     path("api/v1/gra/", include("grammar.urls")),
     path("api/v1/exp/", include("expression.urls")),
+    path("metrics/", metrics, name="metrics"),
 ]
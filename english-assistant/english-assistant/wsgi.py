@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "english-assistant.settings")
 
 application = get_wsgi_application()
+
+# Open the LLM connections before the first request needs them
+from reusable import llm_clients  # noqa: E402
+
+llm_clients.prewarm()
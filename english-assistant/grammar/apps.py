@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class GrammarConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "grammar"
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,139 @@
+import json
+import logging
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils.dateparse import parse_datetime
+
+from reusable.cache import MISSING, LRUTTLCache
+from reusable.redis_client import get_redis
+from .models import Grammar
+
+logger = logging.getLogger(__name__)
+
+# Bump the version when the prompt layout changes, entries store the prompt
+REDIS_KEY = "grammar:cache:v2:{}"
+
+# System prompts are sent verbatim as the first message of every request, so
+# providers can reuse their cached prefix. Keep them free of per-request data.
+ANSWER_LENGTH = "Keep every answer within 300 tokens."
+
+GENERAL_PROMPT = (
+    "You are an English AI assistant. Help users with grammar, vocabulary, "
+    "pronunciation, and general English language questions. Provide clear "
+    "explanations, examples, and corrections when needed. Always be "
+    "encouraging and supportive in your responses.\n\n"
+    f"{ANSWER_LENGTH}"
+)
+
+# Entries are (grammar, prompt) tuples, or None for ids without a grammar.
+# The local tier has a short TTL because invalidation signals only reach the
+# process that saved the grammar; the Redis tier is cleared for everyone.
+_local_cache = LRUTTLCache(
+    maxsize=settings.GRAMMAR_CACHE_SIZE, ttl=settings.GRAMMAR_CACHE_LOCAL_TTL
+)
+
+
+def build_grammar_prompt(grammar: Grammar) -> str:
+    """Build the system prompt for conversations about ``grammar``"""
+    return (
+        "You are an English AI assistant specializing in the following grammar "
+        "topic:\n\n"
+        f"Grammar Topic: {grammar.title}\n"
+        f"Description: {grammar.description}\n\n"
+        "Please help users with questions related to this grammar topic. Provide "
+        "clear explanations, examples, and corrections when needed. Always be "
+        "encouraging and supportive in your responses.\n\n"
+        f"{ANSWER_LENGTH}"
+    )
+
+
+def dump_entry(entry) -> str:
+    if entry is None:
+        return "null"
+    grammar, prompt = entry
+    return json.dumps(
+        {
+            "id": grammar.id,
+            "title": grammar.title,
+            "description": grammar.description,
+            "created_at": grammar.created_at.isoformat(),
+            "updated_at": grammar.updated_at.isoformat(),
+            "prompt": prompt,
+        }
+    )
+
+
+def load_entry(raw):
+    data = json.loads(raw)
+    if data is None:
+        return None
+    grammar = Grammar(
+        id=data["id"],
+        title=data["title"],
+        description=data["description"],
+        created_at=parse_datetime(data["created_at"]),
+        updated_at=parse_datetime(data["updated_at"]),
+    )
+    grammar._state.adding = False
+    grammar._state.db = "default"
+    return grammar, data["prompt"]
+
+
+def fetch_entry(grammar_id: int):
+    grammar = Grammar.objects.filter(id=grammar_id, deleted_at__isnull=True).first()
+    if grammar is None:
+        return None
+    return grammar, build_grammar_prompt(grammar)
+
+
+def get_grammar_entry(grammar_id: int):
+    """
+    Get ``(grammar, prompt)`` for a non-deleted grammar, or None.
+    Looks in the process cache, then Redis, then the database.
+    """
+    entry = _local_cache.get(grammar_id)
+    if entry is not MISSING:
+        return entry
+
+    key = REDIS_KEY.format(grammar_id)
+    try:
+        raw = get_redis().get(key)
+    except Exception as e:
+        logger.warning(f"Grammar cache read failed for {grammar_id}: {e}")
+        raw = None
+
+    if raw is not None:
+        entry = load_entry(raw)
+    else:
+        entry = fetch_entry(grammar_id)
+        try:
+            get_redis().set(key, dump_entry(entry), ex=settings.GRAMMAR_CACHE_TTL)
+        except Exception as e:
+            logger.warning(f"Grammar cache write failed for {grammar_id}: {e}")
+
+    _local_cache.set(grammar_id, entry)
+    return entry
+
+
+async def aget_grammar_entry(grammar_id: int):
+    """Async version of ``get_grammar_entry``, local hits skip the thread hop"""
+    entry = _local_cache.get(grammar_id)
+    if entry is not MISSING:
+        return entry
+    return await sync_to_async(get_grammar_entry)(grammar_id)
+
+
+def get_cached_grammar(grammar_id: int):
+    """Get a non-deleted Grammar through the cache, or None"""
+    entry = get_grammar_entry(grammar_id)
+    return entry[0] if entry else None
+
+
+def invalidate_grammar(grammar_id: int):
+    """Drop a grammar from both cache tiers"""
+    _local_cache.delete(grammar_id)
+    try:
+        get_redis().delete(REDIS_KEY.format(grammar_id))
+    except Exception as e:
+        logger.warning(f"Grammar cache invalidation failed for {grammar_id}: {e}")
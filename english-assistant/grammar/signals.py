@@ -0,0 +1,12 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import invalidate_grammar
+from .models import Grammar
+
+
+@receiver(post_save, sender=Grammar)
+@receiver(post_delete, sender=Grammar)
+def invalidate_grammar_cache(sender, instance, **kwargs):
+    """Keep cached grammars and prompts in sync with the database"""
+    invalidate_grammar(instance.pk)
@@ -1,8 +1,11 @@
+from django.http import Http404
 from rest_framework import viewsets
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
 
 from . import models, serializers
+from .cache import get_cached_grammar
 
 
 class StandardResultsSetPagination(PageNumberPagination):
@@ -22,3 +25,11 @@ class GrammarViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = serializers.GrammarSerializer
     permission_classes = [IsAuthenticated]
     pagination_class = StandardResultsSetPagination
+
+    def retrieve(self, request, *args, **kwargs):
+        """Serve a single grammar from the grammar cache"""
+        pk = str(kwargs.get("pk", ""))
+        grammar = get_cached_grammar(int(pk)) if pk.isdigit() else None
+        if grammar is None:
+            raise Http404("No Grammar matches the given query.")
+        return Response(self.get_serializer(grammar).data)
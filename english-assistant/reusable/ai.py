@@ -1,16 +1,10 @@
 from typing import Optional
 
-import openai
-from openai import OpenAI
-from django.conf import settings
+from reusable.llm_clients import get_client
 
 
 def query_openai(query: str, model: str = "gpt-4o-mini") -> Optional[str]:
-    client = OpenAI(
-        # This is the default and can be omitted
-        api_key=settings.OPENAI_API_KEY,
-        organization=settings.OPENAI_ORG_ID,
-    )
+    client = get_client("openai")
     result = client.chat.completions.create(
         messages=[
             {
@@ -25,10 +19,9 @@ def query_openai(query: str, model: str = "gpt-4o-mini") -> Optional[str]:
     return result.choices[0].message.content
 
 
-def query_deepseek(query: str) -> str:
-    # Initialize the OpenAI client with DeepSeek's base URL
-    openai.api_key = settings.DEEPSEEK_API_KEY
-    openai.api_base = settings.DEEPSEEK_BASE_URL
+def query_deepseek(query: str) -> Optional[str]:
+    # DeepSeek exposes an OpenAI compatible API
+    client = get_client("deepseek")
 
     # Define the conversation messages
     messages = [
@@ -37,16 +30,14 @@ def query_deepseek(query: str) -> str:
     ]
 
     # Make the API call to DeepSeek's chat completions endpoint
-    response = openai.ChatCompletion.create(
+    response = client.chat.completions.create(
         model="deepseek-chat", messages=messages, stream=False
     )
-
-    # Print the assistant's reply
-    print(response["choices"][0]["message"]["content"])
+    return response.choices[0].message.content
 
 
 def get_answer(query: str) -> str:
-    client = OpenAI(api_key=settings.METIS_API_KEY, base_url=settings.METIS_BASE_URL)
+    client = get_client("metis")
     response = client.chat.completions.create(
         model="gpt-4o", messages=[{"role": "user", "content": query}], max_tokens=100
     )
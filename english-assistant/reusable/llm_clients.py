@@ -0,0 +1,256 @@
+"""
+Process-wide OpenAI-compatible clients.
+
+Every caller shares one client per backend, so requests reuse pooled
+keep-alive connections instead of paying TCP and TLS handshakes each time.
+Async clients are kept per event loop because httpx pools are loop bound.
+Connection reuse is counted through the httpcore trace extension: the reuse
+ratio is ``1 - llm_http_connections_total / llm_http_requests_total``. Sync
+clients add up their counts in process and a background thread writes them to
+Redis every LLM_HTTP_METRICS_FLUSH_INTERVAL seconds, so requests never wait on
+Redis.
+"""
+
+import asyncio
+import atexit
+import logging
+import os
+import threading
+import time
+import weakref
+
+import httpx
+from django.conf import settings
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient, DefaultHttpxClient, OpenAI
+
+from reusable.metrics import Counter, aapply_updates, apply_updates
+
+logger = logging.getLogger(__name__)
+
+requests_total = Counter("llm_http_requests_total", "HTTP requests to LLM providers")
+connections_total = Counter(
+    "llm_http_connections_total", "TCP connections opened to LLM providers"
+)
+tls_handshakes_total = Counter(
+    "llm_http_tls_handshakes_total", "TLS handshakes with LLM providers"
+)
+
+_lock = threading.Lock()
+_clients = {}
+_clients_pid = None
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def backend_options(backend: str) -> dict:
+    """Client options of a backend named in CHAT_LLM_PROVIDERS"""
+    if backend == "openai":
+        return {
+            "api_key": settings.OPENAI_API_KEY,
+            "organization": settings.OPENAI_ORG_ID,
+            "base_url": settings.OPENAI_BASE_URL,
+        }
+    if backend == "deepseek":
+        return {
+            "api_key": settings.DEEPSEEK_API_KEY,
+            "base_url": settings.DEEPSEEK_BASE_URL,
+        }
+    if backend == "metis":
+        return {"api_key": settings.METIS_API_KEY, "base_url": settings.METIS_BASE_URL}
+    raise ValueError(f"Unknown LLM backend: {backend}")
+
+
+def configured_backends() -> list:
+    """Backends this deployment talks to, OpenAI is always used for audio"""
+    backends = ["openai"]
+    for spec in settings.CHAT_LLM_PROVIDERS:
+        backend = spec.split(":", 1)[0]
+        if backend not in backends:
+            backends.append(backend)
+    return backends
+
+
+def http2_enabled() -> bool:
+    if not settings.LLM_HTTP2:
+        return False
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        logger.warning("LLM_HTTP2 is set but h2 is not installed, using HTTP/1.1")
+        return False
+    return True
+
+
+def pool_options() -> dict:
+    return {
+        "limits": httpx.Limits(
+            max_connections=settings.LLM_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.LLM_HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=settings.LLM_HTTP_KEEPALIVE_EXPIRY,
+        ),
+        "http2": http2_enabled(),
+    }
+
+
+def connection_updates(event: str) -> list:
+    if event == "connection.connect_tcp.complete":
+        return connections_total.updates()
+    if event == "connection.start_tls.complete":
+        return tls_handshakes_total.updates()
+    return []
+
+
+class PendingCounts:
+    """Counter increments of this process, flushed to Redis periodically"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = {}
+        self.pid = None
+
+    def add(self, counter: Counter, amount=1):
+        with self.lock:
+            # A forked worker starts with its own counts and flush thread
+            if self.pid != os.getpid():
+                self.pid = os.getpid()
+                self.counts = {}
+                threading.Thread(target=self.run, daemon=True).start()
+            self.counts[counter] = self.counts.get(counter, 0) + amount
+
+    def flush(self):
+        with self.lock:
+            counts, self.counts = self.counts, {}
+        if counts:
+            apply_updates(
+                [
+                    update
+                    for counter, amount in counts.items()
+                    for update in counter.updates(amount)
+                ]
+            )
+
+    def run(self):
+        while True:
+            time.sleep(settings.LLM_HTTP_METRICS_FLUSH_INTERVAL)
+            self.flush()
+
+
+pending_counts = PendingCounts()
+atexit.register(pending_counts.flush)
+
+
+def trace(event: str, info: dict):
+    if event == "connection.connect_tcp.complete":
+        pending_counts.add(connections_total)
+    elif event == "connection.start_tls.complete":
+        pending_counts.add(tls_handshakes_total)
+
+
+async def atrace(event: str, info: dict):
+    updates = connection_updates(event)
+    if updates:
+        # Keep the metrics write off the request's critical path
+        asyncio.ensure_future(aapply_updates(updates))
+
+
+def on_request(request: httpx.Request):
+    request.extensions["trace"] = trace
+    pending_counts.add(requests_total)
+
+
+async def aon_request(request: httpx.Request):
+    request.extensions["trace"] = atrace
+    asyncio.ensure_future(aapply_updates(requests_total.updates()))
+
+
+def get_client(backend: str = "openai") -> OpenAI:
+    """Shared sync client of ``backend``, safe to use from any thread"""
+    global _clients_pid
+    with _lock:
+        # A forked worker must not share sockets with its parent
+        if _clients_pid != os.getpid():
+            _clients.clear()
+            _clients_pid = os.getpid()
+        client = _clients.get(backend)
+        if client is None:
+            http_client = DefaultHttpxClient(
+                event_hooks={"request": [on_request]}, **pool_options()
+            )
+            client = OpenAI(http_client=http_client, **backend_options(backend))
+            _clients[backend] = client
+        return client
+
+
+def get_async_client(backend: str = "openai") -> AsyncOpenAI:
+    """Shared async client of ``backend`` for the running event loop"""
+    clients = _async_clients.setdefault(asyncio.get_running_loop(), {})
+    client = clients.get(backend)
+    if client is None:
+        http_client = DefaultAsyncHttpxClient(
+            event_hooks={"request": [aon_request]}, **pool_options()
+        )
+        client = AsyncOpenAI(http_client=http_client, **backend_options(backend))
+        clients[backend] = client
+    return client
+
+
+def prewarm_backend(backend: str):
+    client = get_client(backend).with_options(timeout=5, max_retries=0)
+    try:
+        client.models.list()
+    except Exception as e:
+        logger.warning(f"Could not prewarm {backend} connections: {e}")
+
+
+def prewarm():
+    """
+    Open connections to every backend in the background, so the first
+    requests of a fresh WSGI or Celery worker skip the handshakes.
+    """
+    if settings.LLM_HTTP_PREWARM_CONNECTIONS <= 0:
+        return
+    for backend in configured_backends():
+        for _ in range(settings.LLM_HTTP_PREWARM_CONNECTIONS):
+            thread = threading.Thread(
+                target=prewarm_backend, args=(backend,), daemon=True
+            )
+            thread.start()
+
+
+async def aprewarm():
+    """Open LLM_HTTP_PREWARM_CONNECTIONS connections per backend on this loop"""
+
+    async def warm(backend: str):
+        client = get_async_client(backend).with_options(timeout=5, max_retries=0)
+        try:
+            await client.models.list()
+        except Exception as e:
+            logger.warning(f"Could not prewarm {backend} connections: {e}")
+
+    # Concurrent requests each need their own connection
+    await asyncio.gather(
+        *(
+            warm(backend)
+            for backend in configured_backends()
+            for _ in range(settings.LLM_HTTP_PREWARM_CONNECTIONS)
+        )
+    )
+
+
+async def aclose():
+    """Close the async clients of the running event loop"""
+    clients = _async_clients.pop(asyncio.get_running_loop(), {})
+    for client in clients.values():
+        await client.close()
+
+
+async def lifespan(scope, receive, send):
+    """ASGI lifespan handler: prewarm on startup, close pools on shutdown"""
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            asyncio.get_running_loop().create_task(aprewarm())
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await aclose()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
@@ -0,0 +1,328 @@
+"""
+Route chat completions over several OpenAI-compatible providers.
+
+Providers are tried in the order of CHAT_LLM_PROVIDERS. Each has a circuit
+breaker that opens after repeated errors or slow first tokens, so traffic
+skips a struggling provider until a health check or a probe request succeeds.
+A request that fails before its first token fails over to the next provider,
+and with CHAT_LLM_HEDGE_AFTER_MS set, a request that has produced no token by
+then is raced against the next provider and the first one to answer wins.
+"""
+
+import asyncio
+import logging
+import time
+import weakref
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from openai import AsyncOpenAI
+
+from reusable.llm_clients import get_async_client
+from reusable.metrics import Counter
+
+logger = logging.getLogger(__name__)
+
+failovers_total = Counter(
+    "llm_failovers_total", "Requests moved to another provider after an error"
+)
+hedges_total = Counter(
+    "llm_hedges_total", "Requests raced against a second provider after a slow start"
+)
+
+
+class ProviderError(Exception):
+    """Raised when no provider could answer a request"""
+
+
+class CircuitBreaker:
+    """
+    Closed: requests flow. Open: requests are refused for ``reset_timeout``
+    seconds. Half open: one probe request is let through, its outcome closes
+    or reopens the breaker.
+    """
+
+    def __init__(self, failure_threshold=None, reset_timeout=None):
+        self.failure_threshold = failure_threshold or settings.CHAT_LLM_BREAKER_FAILURES
+        self.reset_timeout = reset_timeout or settings.CHAT_LLM_BREAKER_RESET
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at < self.reset_timeout:
+            return "open"
+        return "half_open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "open" or self.probing:
+            return False
+        self.probing = True
+        return True
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def record_healthy(self):
+        """
+        A health check reached the provider. That does not prove requests
+        succeed, so an open breaker only goes half open and lets the next
+        request decide; a closed one keeps counting its failures.
+        """
+        if self.state == "open":
+            self.opened_at = time.monotonic() - self.reset_timeout
+
+    def record_cancelled(self):
+        """
+        A request was abandoned before its outcome was known. If it was the
+        half open probe, let the next request probe instead.
+        """
+        self.probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        self.probing = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+
+@dataclass
+class Provider:
+    name: str
+    model: str
+    client: AsyncOpenAI
+    breaker: CircuitBreaker = field(default_factory=CircuitBreaker)
+
+
+def delta_text(chunk) -> str:
+    return "".join(choice.delta.content or "" for choice in chunk.choices)
+
+
+class RoutedStream:
+    """
+    Text deltas of a streamed answer, starting with the first one. When the
+    request asks for usage, ``usage`` is set once the stream is exhausted.
+    """
+
+    def __init__(self, provider: Provider, stream, iterator, first: str, ttft: float):
+        self.provider = provider
+        self.stream = stream
+        self.iterator = iterator
+        self.first = first
+        self.ttft = ttft
+        self.usage = None
+
+    async def __aiter__(self):
+        try:
+            if self.first:
+                yield self.first
+            async for chunk in self.iterator:
+                if chunk.usage:
+                    self.usage = chunk.usage
+                text = delta_text(chunk)
+                if text:
+                    yield text
+        except Exception:
+            self.provider.breaker.record_failure()
+            raise
+        finally:
+            await self.close()
+
+    async def close(self):
+        close = getattr(self.stream, "close", None)
+        if close is not None:
+            await close()
+
+
+class LLMRouter:
+    def __init__(self, providers: list, hedge_after=None, first_token_timeout=None):
+        self.providers = providers
+        if hedge_after is None:
+            hedge_after = settings.CHAT_LLM_HEDGE_AFTER_MS / 1000
+        self.hedge_after = hedge_after
+        self.first_token_timeout = (
+            first_token_timeout or settings.CHAT_LLM_FIRST_TOKEN_TIMEOUT
+        )
+        self.slow_ttft = settings.CHAT_LLM_SLOW_TTFT_MS / 1000
+
+    @property
+    def primary(self) -> Provider:
+        return self.providers[0]
+
+    def candidates(self):
+        """Providers whose breaker lets a request through, in order"""
+        allowed = False
+        for provider in self.providers:
+            if provider.breaker.allow():
+                allowed = True
+                yield provider
+        # With every breaker open, trying is better than failing outright
+        if not allowed:
+            yield from self.providers
+
+    async def open_stream(self, provider: Provider, messages: list, options: dict):
+        """Start a streamed completion and wait for its first text delta"""
+        started = time.monotonic()
+        stream = await provider.client.chat.completions.create(
+            model=provider.model, messages=messages, stream=True, **options
+        )
+        iterator = aiter(stream)
+        try:
+            async for chunk in iterator:
+                text = delta_text(chunk)
+                if text:
+                    break
+            else:
+                text = ""
+        except BaseException:
+            await RoutedStream(provider, stream, iterator, "", 0).close()
+            raise
+        return RoutedStream(
+            provider, stream, iterator, text, time.monotonic() - started
+        )
+
+    async def stream(self, messages: list, **options) -> RoutedStream:
+        """
+        Stream a chat completion from the first healthy provider, failing over
+        before the first token and hedging slow starts.
+        """
+        candidates = self.candidates()
+        pending = {}
+        errors = []
+
+        def launch() -> bool:
+            provider = next(candidates, None)
+            if provider is None:
+                return False
+            attempt = asyncio.wait_for(
+                self.open_stream(provider, messages, options),
+                self.first_token_timeout,
+            )
+            pending[asyncio.ensure_future(attempt)] = (provider, time.monotonic())
+            return True
+
+        launch()
+        hedge_at = time.monotonic() + self.hedge_after if self.hedge_after else None
+        try:
+            while pending:
+                timeout = None
+                if hedge_at is not None:
+                    timeout = max(0, hedge_at - time.monotonic())
+                done, _ = await asyncio.wait(
+                    pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    hedge_at = None
+                    if launch():
+                        asyncio.ensure_future(hedges_total.ainc())
+                    continue
+
+                winner = None
+                for task in done:
+                    provider, _ = pending.pop(task)
+                    try:
+                        result = task.result()
+                    except Exception as e:
+                        logger.warning(f"LLM provider {provider.name} failed: {e}")
+                        provider.breaker.record_failure()
+                        errors.append(e)
+                        continue
+                    if winner is None:
+                        winner = result
+                    else:
+                        await result.close()
+                if winner is not None:
+                    self.settle(winner)
+                    return winner
+
+                if not pending and launch():
+                    asyncio.ensure_future(failovers_total.ainc())
+                    if self.hedge_after:
+                        hedge_at = time.monotonic() + self.hedge_after
+        finally:
+            await self.cancel(pending)
+        raise ProviderError(f"No LLM provider answered: {errors}")
+
+    def settle(self, winner: RoutedStream):
+        """Record the winner's health and count slow starts as failures"""
+        if winner.ttft > self.slow_ttft:
+            winner.provider.breaker.record_failure()
+        else:
+            winner.provider.breaker.record_success()
+
+    async def cancel(self, pending: dict):
+        """Cancel the attempts that lost the race to the first token"""
+        for task, (provider, started) in pending.items():
+            task.cancel()
+            if time.monotonic() - started > self.slow_ttft:
+                provider.breaker.record_failure()
+            else:
+                provider.breaker.record_cancelled()
+        for task in pending:
+            try:
+                result = await task
+            except BaseException:
+                continue
+            await result.close()
+        pending.clear()
+
+    async def complete(self, messages: list, **options) -> str:
+        """Get a whole completion, with the same failover as ``stream``"""
+        response = await self.stream(messages, **options)
+        return "".join([part async for part in response])
+
+    async def check_health(self):
+        """Probe every provider, so open breakers retry before reset_timeout"""
+
+        async def probe(provider: Provider):
+            try:
+                await provider.client.models.list()
+            except Exception as e:
+                logger.warning(f"LLM provider {provider.name} is unhealthy: {e}")
+                provider.breaker.record_failure()
+            else:
+                if provider.breaker.state == "open":
+                    logger.info(f"LLM provider {provider.name} is reachable again")
+                provider.breaker.record_healthy()
+
+        await asyncio.gather(*(probe(provider) for provider in self.providers))
+
+    async def run_health_checks(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            await self.check_health()
+
+
+def build_providers() -> list:
+    providers = []
+    for spec in settings.CHAT_LLM_PROVIDERS:
+        backend, model = spec.split(":", 1)
+        # The router retries on another provider, fail fast instead
+        client = get_async_client(backend).with_options(max_retries=0)
+        providers.append(Provider(name=backend, model=model, client=client))
+    return providers
+
+
+_routers = weakref.WeakKeyDictionary()
+
+
+def get_router() -> LLMRouter:
+    """Router for the running event loop, clients and breakers are shared"""
+    loop = asyncio.get_running_loop()
+    router = _routers.get(loop)
+    if router is None:
+        router = LLMRouter(build_providers())
+        _routers[loop] = router
+        if settings.CHAT_LLM_HEALTH_INTERVAL > 0:
+            router.health_task = loop.create_task(
+                router.run_health_checks(settings.CHAT_LLM_HEALTH_INTERVAL)
+            )
+    return router
@@ -0,0 +1,119 @@
+"""
+Minimal Prometheus-style metrics kept in Redis.
+
+Every process (gunicorn, uvicorn and celery workers) writes into the same Redis
+hashes, so any of them can serve the aggregated values on a metrics endpoint.
+"""
+
+import logging
+
+from reusable.redis_client import get_async_redis, get_redis
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "metrics:"
+
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+REGISTRY = []
+
+
+class Metric:
+    type = ""
+
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self.key = KEY_PREFIX + name
+        REGISTRY.append(self)
+
+    def render(self, values: dict) -> list:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def updates(self, amount=1) -> list:
+        return [("hincrbyfloat", self.key, "value", amount)]
+
+    def inc(self, amount=1):
+        apply_updates(self.updates(amount))
+
+    async def ainc(self, amount=1):
+        await aapply_updates(self.updates(amount))
+
+    def render(self, values: dict) -> list:
+        return [f"{self.name} {float(values.get('value', 0))}"]
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation)
+        self.buckets = tuple(sorted(buckets))
+
+    def updates(self, value: float) -> list:
+        # Buckets are stored non-cumulative and summed up when rendered
+        bucket = next((b for b in self.buckets if value <= b), "+Inf")
+        return [
+            ("hincrby", self.key, f"le:{bucket}", 1),
+            ("hincrby", self.key, "count", 1),
+            ("hincrbyfloat", self.key, "sum", value),
+        ]
+
+    def observe(self, value: float):
+        apply_updates(self.updates(value))
+
+    async def aobserve(self, value: float):
+        await aapply_updates(self.updates(value))
+
+    def render(self, values: dict) -> list:
+        lines = []
+        cumulative = 0
+        for bucket in self.buckets:
+            cumulative += int(values.get(f"le:{bucket}", 0))
+            lines.append(f'{self.name}_bucket{{le="{bucket}"}} {cumulative}')
+        count = int(values.get("count", 0))
+        lines.append(f'{self.name}_bucket{{le="+Inf"}} {count}')
+        lines.append(f"{self.name}_sum {float(values.get('sum', 0))}")
+        lines.append(f"{self.name}_count {count}")
+        return lines
+
+
+def apply_updates(updates: list):
+    try:
+        pipeline = get_redis().pipeline(transaction=False)
+        for command, *args in updates:
+            getattr(pipeline, command)(*args)
+        pipeline.execute()
+    except Exception as e:
+        logger.warning(f"Could not record metrics: {e}")
+
+
+async def aapply_updates(updates: list):
+    """Apply several metric updates in one Redis round trip"""
+    try:
+        pipeline = get_async_redis().pipeline(transaction=False)
+        for command, *args in updates:
+            getattr(pipeline, command)(*args)
+        await pipeline.execute()
+    except Exception as e:
+        logger.warning(f"Could not record metrics: {e}")
+
+
+def render_metrics(extra_lines=()) -> str:
+    """Render every registered metric in the Prometheus text format"""
+    pipeline = get_redis().pipeline(transaction=False)
+    for metric in REGISTRY:
+        pipeline.hgetall(metric.key)
+
+    lines = []
+    for metric, raw in zip(REGISTRY, pipeline.execute()):
+        values = {field.decode(): value.decode() for field, value in raw.items()}
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.type}")
+        lines.extend(metric.render(values))
+    lines.extend(extra_lines)
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,35 @@
+import asyncio
+import weakref
+
+import redis
+import redis.asyncio as aioredis
+from django.conf import settings
+
+_sync_client = None
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def client_options() -> dict:
+    """Fail fast when Redis is unreachable instead of hanging the caller"""
+    return {
+        "socket_connect_timeout": settings.REDIS_SOCKET_CONNECT_TIMEOUT,
+        "socket_timeout": settings.REDIS_SOCKET_TIMEOUT,
+    }
+
+
+def get_redis() -> redis.Redis:
+    """Process-wide Redis client, safe to share between threads"""
+    global _sync_client
+    if _sync_client is None:
+        _sync_client = redis.Redis.from_url(settings.REDIS_URL, **client_options())
+    return _sync_client
+
+
+def get_async_redis() -> aioredis.Redis:
+    """Async Redis client for the running event loop (pools are loop bound)"""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = aioredis.Redis.from_url(settings.REDIS_URL, **client_options())
+        _async_clients[loop] = client
+    return client
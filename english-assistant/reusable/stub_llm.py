@@ -0,0 +1,198 @@
+"""
+A stand-in for the OpenAI API, served as a plain ASGI app.
+
+It answers chat completions (streamed or not), transcriptions, speech and
+model listing with canned data after a configurable time to first token and
+delay between deltas, and fails a share of requests with 500 errors. Point
+OPENAI_BASE_URL, DEEPSEEK_BASE_URL and METIS_BASE_URL at it to load test the
+chat without network access or API costs.
+"""
+
+import asyncio
+import json
+import random
+import time
+import uuid
+
+STUB_ANSWER = (
+    "The present perfect connects the past with the present. We form it with "
+    "have or has and the past participle, for example: I have visited London. "
+    "Use it for experiences, for changes over time and for actions that are "
+    "not finished yet."
+)
+STUB_TRANSCRIPTION = "Can you explain when to use the present perfect?"
+# An MP3 frame header and padding, clients only forward the bytes
+STUB_SPEECH = b"\xff\xf3\x14\xc4" + bytes(400)
+
+
+def split_deltas(text: str) -> list:
+    """Split text into word-sized deltas, like the real API streams them"""
+    words = text.split(" ")
+    return [word + " " for word in words[:-1]] + words[-1:]
+
+
+class StubLLMServer:
+    def __init__(self, ttft=0.3, token_delay=0.02, error_rate=0.0, answer=None):
+        self.ttft = ttft
+        self.token_delay = token_delay
+        self.error_rate = error_rate
+        self.answer = answer or STUB_ANSWER
+        self.requests = 0
+        self.errors = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            while True:
+                message = await receive()
+                if message["type"] == "lifespan.startup":
+                    await send({"type": "lifespan.startup.complete"})
+                elif message["type"] == "lifespan.shutdown":
+                    await send({"type": "lifespan.shutdown.complete"})
+                    return
+        if scope["type"] != "http":
+            return
+
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+
+        self.requests += 1
+        path = scope["path"]
+        if path.endswith("/models"):
+            await self.send_json(
+                send,
+                {
+                    "object": "list",
+                    "data": [
+                        {
+                            "id": "stub",
+                            "object": "model",
+                            "created": 0,
+                            "owned_by": "stub",
+                        }
+                    ],
+                },
+            )
+            return
+        if random.random() < self.error_rate:
+            self.errors += 1
+            await self.send_json(
+                send,
+                {"error": {"message": "Injected stub error", "type": "server_error"}},
+                status=500,
+            )
+            return
+
+        if path.endswith("/chat/completions"):
+            await self.chat_completion(send, json.loads(body or b"{}"))
+        elif path.endswith("/audio/transcriptions"):
+            await asyncio.sleep(self.ttft)
+            await self.send_json(send, {"text": STUB_TRANSCRIPTION})
+        elif path.endswith("/audio/speech"):
+            await asyncio.sleep(self.ttft)
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": 200,
+                    "headers": [(b"content-type", b"audio/mpeg")],
+                }
+            )
+            await send({"type": "http.response.body", "body": STUB_SPEECH})
+        else:
+            await self.send_json(
+                send,
+                {"error": {"message": "Not found", "type": "invalid_request"}},
+                404,
+            )
+
+    async def send_json(self, send, data: dict, status=200):
+        await send(
+            {
+                "type": "http.response.start",
+                "status": status,
+                "headers": [(b"content-type", b"application/json")],
+            }
+        )
+        await send({"type": "http.response.body", "body": json.dumps(data).encode()})
+
+    def usage(self, request: dict, deltas: list) -> dict:
+        prompt = sum(len(str(m.get("content", ""))) for m in request["messages"])
+        return {
+            "prompt_tokens": prompt // 4 + 1,
+            "completion_tokens": len(deltas),
+            "total_tokens": prompt // 4 + 1 + len(deltas),
+            "prompt_tokens_details": {"cached_tokens": 0},
+        }
+
+    async def chat_completion(self, send, request: dict):
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+        model = request.get("model", "stub")
+        deltas = split_deltas(self.answer)
+        await asyncio.sleep(self.ttft)
+
+        if not request.get("stream"):
+            await asyncio.sleep(self.token_delay * len(deltas))
+            await self.send_json(
+                send,
+                {
+                    "id": completion_id,
+                    "object": "chat.completion",
+                    "created": created,
+                    "model": model,
+                    "choices": [
+                        {
+                            "index": 0,
+                            "message": {"role": "assistant", "content": self.answer},
+                            "finish_reason": "stop",
+                        }
+                    ],
+                    "usage": self.usage(request, deltas),
+                },
+            )
+            return
+
+        def event(choices, usage=None) -> dict:
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": choices,
+            }
+            if usage is not None:
+                chunk["usage"] = usage
+            return {
+                "type": "http.response.body",
+                "body": f"data: {json.dumps(chunk)}\n\n".encode(),
+                "more_body": True,
+            }
+
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [(b"content-type", b"text/event-stream")],
+            }
+        )
+        for index, delta in enumerate(deltas):
+            if index:
+                await asyncio.sleep(self.token_delay)
+            await send(
+                event(
+                    [
+                        {
+                            "index": 0,
+                            "delta": {"role": "assistant", "content": delta},
+                            "finish_reason": None,
+                        }
+                    ]
+                )
+            )
+        await send(event([{"index": 0, "delta": {}, "finish_reason": "stop"}]))
+        if (request.get("stream_options") or {}).get("include_usage"):
+            await send(event([], self.usage(request, deltas)))
+        await send({"type": "http.response.body", "body": b"data: [DONE]\n\n"})